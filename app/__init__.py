@@ -49,6 +49,11 @@ def create_app(test_config_obj=None, remove_wsgi_logger=False):
     app.engine = engine
     app.db_session = db_session
 
+    # results of searches, see `app.search.search2.cached_search`
+    from app.search.result_cache import ResultCache
+    app.search_cache = ResultCache(app.config["SEARCH_CACHE_MAX_ROWS"],
+                                   app.config["SEARCH_CACHE_TTL"])
+
     @app.teardown_appcontext
     def shutdown_session(exception=None):
         app.db_session.remove()
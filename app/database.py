@@ -3,5 +3,6 @@ from config import Config
 
 
 engine, db_session, Base = make_database(
-    Config.SQLALCHEMY_DATABASE_URI, sqlalchemy_echo=Config.SQLALCHEMY_ECHO
+    Config.SQLALCHEMY_DATABASE_URI, sqlalchemy_echo=Config.SQLALCHEMY_ECHO,
+    profile=Config.SQLALCHEMY_ENGINE_PROFILE,
 )
@@ -1,9 +1,162 @@
 import logging
-from typing import Tuple, Dict, Any, Optional
+import os
+import sqlite3
+import threading
+from typing import Tuple, Dict, Any, Optional, Callable
 
 import sqlalchemy
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
 from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from app.metrics import metrics
+from app.query_guard import PROGRESS_N_STEPS, install_query_guard
+
+
+DEFAULT_ENGINE_PROFILE = "default"
+
+# Named engine setups for `make_database`.
+#   `read_only` opens the sqlite file through a `mode=ro` uri (and `immutable=1`
+#   if asked, which also skips all locking but hides later imports),
+#   `journal_mode` is persistent, so it's set once on a writable connection,
+#   `pragmas` are applied on every new dbapi connection,
+#   `pool` goes into `create_engine` (sqlite files get a `NullPool` otherwise,
+#   i.e. a fresh connection with a cold page cache on every checkout)
+ENGINE_PROFILES: Dict[str, Dict[str, Any]] = {
+    "default": dict(
+        read_only=False, immutable=False, journal_mode=None,
+        pragmas={}, pool={},
+    ),
+    "serving": dict(
+        read_only=True, immutable=False, journal_mode="WAL",
+        pragmas={
+            "query_only": "ON",
+            "mmap_size": 256 * 2**20,  # 256MB, more than the whole database
+            "cache_size": -64 * 2**10,  # in KiB when negative, so 64MB
+            "temp_store": "MEMORY",
+        },
+        pool=dict(
+            poolclass=QueuePool, pool_size=8, max_overflow=8,
+            connect_args={"check_same_thread": False},
+        ),
+    ),
+}
+
+
+def get_engine_profile(name: Optional[str]) -> Dict[str, Any]:
+    name = name or DEFAULT_ENGINE_PROFILE
+    if name not in ENGINE_PROFILES:
+        raise ValueError(f"unknown engine profile: `{name}` "
+                         f"(known are: {', '.join(ENGINE_PROFILES)})")
+    return ENGINE_PROFILES[name]
+
+
+def is_file_sqlite_uri(sqlalchemy_uri: str) -> bool:
+    url = make_url(sqlalchemy_uri)
+    return (url.get_backend_name() == "sqlite"
+            and url.database not in (None, "", ":memory:")
+            and not url.database.startswith("file:"))
+
+
+def make_read_only_uri(sqlalchemy_uri: str, immutable: bool = False) -> str:
+    """Turn `sqlite:///path.db` into a uri that opens the file read-only"""
+    url = make_url(sqlalchemy_uri)
+    query = {"mode": "ro", "uri": "true"}
+    if immutable:
+        query["immutable"] = "1"
+
+    url = url.set(database=f"file:{url.database}", query=query)
+    return url.render_as_string(hide_password=False)
+
+
+def ensure_journal_mode(sqlalchemy_uri: str, journal_mode: str) -> Optional[str]:
+    """Persistently set journal mode of an existing writable sqlite file"""
+    path = make_url(sqlalchemy_uri).database
+    if not (os.path.exists(path) and os.access(path, os.W_OK)):
+        logging.warning(f"can't set journal_mode={journal_mode} for `{path}`")
+        return None
+
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f"PRAGMA journal_mode={journal_mode}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def add_sqlite_pragmas(engine: sqlalchemy.engine.Engine, pragmas: Dict[str, Any]):
+    """Apply `pragmas` to every new dbapi connection of the `engine`"""
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return set_sqlite_pragmas
+
+
+def add_query_guard(engine: sqlalchemy.engine.Engine,
+                    n_steps: int = PROGRESS_N_STEPS):
+    """Let `app.query_guard.query_budget` interrupt statements of the `engine`,
+    checking the budget each `n_steps` SQLite VM steps"""
+    @event.listens_for(engine, "connect")
+    def set_query_guard(dbapi_connection, connection_record):
+        install_query_guard(dbapi_connection, n_steps)
+
+    return set_query_guard
+
+
+_CACHE_HIT2METRIC = {CACHE_HIT: "sql_compiled_cache.hits",
+                     CACHE_MISS: "sql_compiled_cache.misses"}
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def count_compiled_cache(conn, cursor, statement, parameters, context, executemany):
+    """Count whether statements (of every engine) were compiled or came from
+    SQLAlchemy's compiled cache, see `/api/metrics`"""
+    metric = _CACHE_HIT2METRIC.get(getattr(context, "cache_hit", None))
+    if metric is not None:
+        metrics.incr(metric)
+
+
+def get_data_generation(conn) -> int:
+    """Number of the import the data comes from (sqlite `user_version`)
+
+    In-process caches of derived data compare it to know they are stale."""
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def bump_data_generation(conn) -> int:
+    generation = get_data_generation(conn) + 1
+    conn.exec_driver_sql(f"PRAGMA user_version = {generation:d}")
+    return generation
+
+
+class GenerationCache:
+    """Data derived from an engine's data by `build`, kept per engine
+
+    Rebuilt once the data generation changes, i.e. after an import."""
+    def __init__(self, build: Callable[[Any], Any]) -> None:
+        self.build = build
+        self._engine2cached: Dict[Any, Tuple[int, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, engine: sqlalchemy.engine.Engine) -> Any:
+        with engine.connect() as conn:
+            generation = get_data_generation(conn)
+            cached = self._engine2cached.get(engine)
+            if cached is not None and cached[0] == generation:
+                return cached[1]
+
+            with self._lock:
+                cached = self._engine2cached.get(engine)
+                if cached is None or cached[0] != generation:
+                    cached = (generation, self.build(conn))
+                    self._engine2cached[engine] = cached
+
+        return cached[1]
 
 
 def init_db(Base, engine: sqlalchemy.engine.Engine):
@@ -19,15 +172,31 @@ def make_database(
     sqlalchemy_uri: str, sqlalchemy_echo: str = 'debug',
     sqlalchemy_echo_pool: str = 'debug',
     future: bool = True, session_maker_options: Dict[str, Any] = None,
-    do_init=False
+    do_init=False, profile: Optional[str] = DEFAULT_ENGINE_PROFILE,
 ) -> Tuple[sqlalchemy.engine.Engine, sqlalchemy.orm.scoped_session,
            Optional["Base"]
 ]:
     if session_maker_options is None:
         session_maker_options = dict(autocommit=False, autoflush=False)
 
+    profile_options = get_engine_profile(profile)
+    engine_kwargs = {}
+    if is_file_sqlite_uri(sqlalchemy_uri):
+        if profile_options["journal_mode"]:
+            ensure_journal_mode(sqlalchemy_uri, profile_options["journal_mode"])
+        if profile_options["read_only"]:
+            if do_init:
+                raise ValueError(f"can't init a database with `{profile}` profile")
+            sqlalchemy_uri = make_read_only_uri(
+                sqlalchemy_uri, immutable=profile_options["immutable"])
+        engine_kwargs.update(profile_options["pool"])
+
     engine = create_engine(
-        sqlalchemy_uri, echo=sqlalchemy_echo, future=future)
+        sqlalchemy_uri, echo=sqlalchemy_echo, future=future, **engine_kwargs)
+    if profile_options["pragmas"] and engine.dialect.name == "sqlite":
+        add_sqlite_pragmas(engine, profile_options["pragmas"])
+    if engine.dialect.name == "sqlite":
+        add_query_guard(engine)
 
     if not sqlalchemy_echo:
         logging.getLogger("sqlalchemy").setLevel(logging.ERROR)
@@ -59,6 +228,7 @@ def get_default_database() -> Tuple[
         Config.SQLALCHEMY_DATABASE_URI,
         sqlalchemy_echo=Config.SQLALCHEMY_ECHO,
         sqlalchemy_echo_pool=Config.SQLALCHEMY_ECHO,
+        profile=Config.SQLALCHEMY_ENGINE_PROFILE,
     )
 
     return engine, db_session
@@ -34,6 +34,7 @@ from app.models import (
 import app.database
 
 from app.main import bp
+from app.metrics import metrics
 from app.search.search_form import (
     make_sign_options_for_param,
     make_options_from_values,
@@ -52,9 +53,7 @@ from app.search.query_sqlalchemy import (
 from app.search.search2 import (
     group_rows_by_construction,
 )
-from app.utils import (
-    find_unique
-)
+from app.search.vocabulary import vocabulary_values
 
 # STRIPABLE = "()/[],."
 STRIPABLE = "()"
@@ -63,7 +62,7 @@ STRIPABLE = "()"
 class SimpleSearchForm(FlaskForm):
     _constructions_datalist_id = "construction_values"
     # _construction_values = find_unique(Construction, "formula")
-    _construction_values = find_unique(GeneralInfo, "name")
+    _construction_values = vocabulary_values("construction_names")
     _constructions_datalist = DataList(
         id=_constructions_datalist_id,
         literal_options=_construction_values
@@ -166,3 +165,8 @@ def constructions_list():
 
     return jsonify(dict_results)
 
+
+@bp.route("/api/metrics")
+def metrics_list():
+    """Counters of this process, e.g. `search_cache.hits`"""
+    return jsonify(metrics.snapshot(request.args.get("prefix", "")))
@@ -0,0 +1,33 @@
+"""In-process counters (cache hits, misses...), served by `/api/metrics`
+
+Counters are per process; names are dotted, `<component>.<event>`.
+"""
+from collections import Counter
+import threading
+import typing as T
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self._counters: T.Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def incr(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += n
+
+    def get(self, name: str) -> int:
+        return self._counters[name]
+
+    def snapshot(self, prefix: str = "") -> T.Dict[str, int]:
+        """Counters whose names start with `prefix`"""
+        with self._lock:
+            return {name: value for name, value in sorted(self._counters.items())
+                    if name.startswith(prefix)}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+
+
+metrics = Metrics()
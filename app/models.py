@@ -2,6 +2,7 @@ import typing as T
 from datetime import datetime
 from itertools import chain
 import logging
+import re
 
 from sqlalchemy import (
     Column,
@@ -11,8 +12,9 @@ from sqlalchemy import (
     Boolean,
     ForeignKey,
     Table,
+    Index,
 )
-from sqlalchemy import event
+from sqlalchemy import DDL, column, event, table
 from sqlalchemy.orm import (
     relationship,
     declarative_base,
@@ -32,6 +34,18 @@ CURRENT_STATUS = "настоящее время"
 MAX_FORMULA_LEN = 200
 REPR_CHAR_LIM = 25
 
+# "1890", "1890-1900", "1950-60", "1830-ые", "1950-60-ые"
+YEAR_RANGE_RE = re.compile(
+    r"^\s*(?P<left>\d{1,4})\s*(?:[-‐–—‒―−]\s*(?P<right>\d{1,4}))?"
+    r"\s*(?P<decades>-?[а-яё]+)?\s*$"
+)
+
+
+# glossed formula slots: "N-Gen.Pl", "NP-Dat", "Cop", "V-Pst"
+GLOSS_RE = re.compile(r"(?P<pos>[A-Za-z]+)(?:-(?P<features>[A-Za-z]+(?:\.[A-Za-z]+)*))?")
+GLOSS_CASES = ("nom", "gen", "dat", "acc", "ins", "loc", "voc", "par")
+GLOSS_NUMBERS = ("sg", "pl")
+CYRILLIC_RE = re.compile(r"[а-яёА-ЯЁ]")
 
 # these are known in advance and equal to Russian Constructicon
 UNKNOWN_SYNT_FUNCTION_OF_ANCHOR = "<unknown>"
@@ -79,6 +93,7 @@ class GeneralInfo(Base):
     construction_id = Column(Integer, ForeignKey("construction.id"),
                              primary_key=True)
     name = Column(String(200))
+    name_norm = Column(String(200), index=True)
 
     # project metadata
     supervisor = Column(String(60))
@@ -123,18 +138,22 @@ class GeneralTag(TagMixin, Base):
         return (f'GeneralTag({self.id!r}, {self.name!r}, {self.kind!r})')
 
 
+# association tables are only ever read by their keys, so they are stored
+# clustered by primary key (WITHOUT ROWID) with an index for the reverse side
 construction_to_tags = Table(
     "construction_to_tags",
     Base.metadata,
     Column("construction_id", Integer, ForeignKey("construction.id"), primary_key=True),
-    Column("tag_id", Integer, ForeignKey("tag.id"), primary_key=True),
+    Column("tag_id", Integer, ForeignKey("tag.id"), primary_key=True, index=True),
+    sqlite_with_rowid=False,
 )
 
 change_to_tags = Table(
     "change_to_tags",
     Base.metadata,
     Column("change_id", Integer, ForeignKey("change.id"), primary_key=True),
-    Column("tag_id", Integer, ForeignKey("tag.id"), primary_key=True),
+    Column("tag_id", Integer, ForeignKey("tag.id"), primary_key=True, index=True),
+    sqlite_with_rowid=False,
 )
 
 
@@ -159,6 +178,7 @@ class Construction(ConstructionMixin, Base):
     # #   postgreSQL with regex may work
     # formula = Column(String(200))
     contemporary_meaning = Column(String(200))
+    contemporary_meaning_norm = Column(String(200), index=True)
     variation = Column(String(400))
 
     # TODO: the first is reducible to the latter (NULL => not in constructicon)
@@ -174,6 +194,7 @@ class Construction(ConstructionMixin, Base):
 
     anchor_schema = Column(String(200))
     anchor_ru = Column(String(200))
+    anchor_ru_norm = Column(String(200), index=True)
     anchor_eng = Column(String(200))
 
     # TODO: normalize these into another table
@@ -264,10 +285,10 @@ class Construction(ConstructionMixin, Base):
 class ConstructionVariant(ConstructionMixin, Base):
     __tablename__ = 'construction_variant'
 
-    construction_id = Column(Integer, ForeignKey(Construction.id))
+    construction_id = Column(Integer, ForeignKey(Construction.id), index=True)
     construction = relationship("Construction", back_populates="variants")
                                 # uselist=False)  # One-to-one
-    change_id = Column(Integer, ForeignKey("change.id"))
+    change_id = Column(Integer, ForeignKey("change.id"), index=True)
 
     changes = relationship("Change", back_populates="variants")
                             #  uselist=False)
@@ -289,6 +310,18 @@ class ConstructionVariant(ConstructionMixin, Base):
 
 class FormulaElement(Base, ShallowEqMixin):
     __tablename__ = 'formula_element'
+    __table_args__ = (
+        # token search joins elements of one formula by `order`
+        # and filters by `value_norm`, so the index covers all three
+        Index("ix_formula_element_construction_id_order_value_norm",
+              "construction_id", "order", "value_norm"),
+        Index("ix_formula_element_construction_variant_id_order",
+              "construction_variant_id", "order"),
+        # "any genitive noun" is an equality on these
+        Index("ix_formula_element_pos_case_number", "pos", "case", "number"),
+        Index("ix_formula_element_construction_id_is_lexical",
+              "construction_id", "is_lexical"),
+    )
     _comparable_args = ["value", "order", "depth", "is_optional", "has_variants"]
 
     id = Column(Integer, primary_key=True)
@@ -297,24 +330,89 @@ class FormulaElement(Base, ShallowEqMixin):
     construction_variant_id = Column(Integer, ForeignKey(ConstructionVariant.id))
 
     value = Column(String(100))
+    value_norm = Column(String(100), index=True)
     order = Column(Integer)
     depth = Column(Integer)
 
     is_optional = Column(Boolean, default=False)
     has_variants = Column(Boolean, nullable=True)
 
+    # parsed from `value` (see `parse_features`), casefolded
+    pos = Column(String(20))
+    case = Column(String(10))
+    number = Column(String(10))
+    # a word of the anchor rather than a slot
+    is_lexical = Column(Boolean)
+
     construction = relationship(
         "Construction", back_populates="formula_elements",
     )
     construction_variant = relationship(
         "ConstructionVariant", back_populates="formula_elements",
     )
+    next_links = relationship(
+        "FormulaElementNext", foreign_keys="FormulaElementNext.element_id",
+        back_populates="element", cascade="all, delete-orphan",
+    )
+
+    @staticmethod
+    def parse_features(value: T.Optional[str]) -> T.Dict[str, T.Any]:
+        """`pos`, `case`, `number` of a glossed slot and whether it is lexical
+
+        "N-Gen.Pl" is a slot of `pos` "n", `case` "gen" and `number` "pl",
+        any value with cyrillic letters ("хоть", "сдаться-Pst") is lexical."""
+        features = dict(pos=None, case=None, number=None, is_lexical=False)
+        if not isinstance(value, str):
+            return features
+
+        if CYRILLIC_RE.search(value):
+            features["is_lexical"] = True
+            return features
+
+        match = GLOSS_RE.fullmatch(value)
+        if match is None:
+            return features
+
+        features["pos"] = match["pos"].casefold()
+        for feature in (match["features"] or "").casefold().split("."):
+            if feature in GLOSS_CASES:
+                features["case"] = feature
+            elif feature in GLOSS_NUMBERS:
+                features["number"] = feature
+        return features
 
     def __repr__(self):
         return (f'FormulaElement({self.id!r}, {self.value!r}, '
                 f'{self.order!r}, {self.is_optional!r})')
 
 
+class FormulaElementNext(Base):
+    """An element that may follow another one in its formula
+
+    Besides the next element, the ones reachable by skipping optional spans,
+    filled by the importer (`link_formula_elements`). Token search that skips
+    optional elements follows these links, one primary key lookup per token."""
+    __tablename__ = 'formula_element_next'
+    # rows are clustered by `element_id`, so a lookup also reads `next_value`
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    element_id = Column(Integer, ForeignKey(FormulaElement.id), primary_key=True)
+    next_element_id = Column(Integer, ForeignKey(FormulaElement.id), primary_key=True)
+    # copy of `next_element.value_norm`, saves a join per token
+    next_value = Column(String(100))
+    skips_optional = Column(Boolean, default=False)
+
+    element = relationship(
+        FormulaElement, foreign_keys=[element_id], back_populates="next_links",
+    )
+    next_element = relationship(FormulaElement, foreign_keys=[next_element_id])
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}({self.element_id!r}, '
+                f'{self.next_element_id!r}, {self.next_value!r}, '
+                f'{self.skips_optional!r})')
+
+
 # change_to_next_changes = Table(
 #     "change_to_next_changes",
 #     Base.metadata,
@@ -326,7 +424,10 @@ change_to_previous_changes = Table(
     "change_to_previous_changes",
     Base.metadata,
     Column("change_id", Integer, ForeignKey("change.id"), primary_key=True),
-    Column("previous_change_id", Integer, ForeignKey("change.id"), primary_key=True),
+    # `Change.next_changes` side
+    Column("previous_change_id", Integer, ForeignKey("change.id"), primary_key=True,
+           index=True),
+    sqlite_with_rowid=False,
 )
 
 
@@ -345,7 +446,7 @@ class Change(Base):
     }
 
     id = Column(Integer, primary_key=True)
-    construction_id = Column(Integer, ForeignKey(Construction.id))
+    construction_id = Column(Integer, ForeignKey(Construction.id), index=True)
 
     # TODO: see in Construction, do we want to search by parts of stage?
     stage = Column(String(200))
@@ -370,10 +471,16 @@ class Change(Base):
     )
 
 
-    # TODO: datetime or int?
+    # as given in the data: "1890", "1890-1900", "1950-60-ые"
     first_attested = Column(Integer)
     last_attested = Column(Integer)
 
+    # the same as year ranges, set by `set_year_ranges` on import
+    first_year_lo = Column(Integer, index=True)
+    first_year_hi = Column(Integer, index=True)
+    last_year_lo = Column(Integer, index=True)
+    last_year_hi = Column(Integer, index=True)
+
     first_example = Column(String(500))
     last_example = Column(String(500))
 
@@ -439,22 +546,57 @@ class Change(Base):
         logger.debug(f"unsupported year type: `{year}`")
         return None
 
-    
+    @staticmethod
+    def parse_year_range(
+        year: T.Union[str, int, None]
+    ) -> T.Tuple[T.Optional[int], T.Optional[int]]:
+        """Parse year string into the first and the last year it may mean
+
+        "1950-60" is (1950, 1960), decades ("1950-60-ые") include their last year:
+        (1950, 1969). Unparsable values are (None, None)
+        """
+        if isinstance(year, int):
+            return year, year
+        match = YEAR_RANGE_RE.match(year or "")
+        if match is None:
+            if year and year != '-':
+                logger.debug(f"unsupported year type: `{year}`")
+            return None, None
+
+        left, right = match.group("left"), match.group("right") or match.group("left")
+        lo, hi = int(left), int(right)
+        if len(right) < len(left):
+            # the century is omitted in "1950-60", "1990-05"
+            hi += lo - lo % 10 ** len(right)
+            if hi < lo:
+                hi += 10 ** len(right)
+        lo, hi = min(lo, hi), max(lo, hi)
+        if match.group("decades"):
+            hi += 9
+
+        return lo, hi
+
+    def set_year_ranges(self) -> None:
+        self.first_year_lo, self.first_year_hi = self.parse_year_range(
+            self.first_attested)
+        self.last_year_lo, self.last_year_hi = self.parse_year_range(
+            self.last_attested)
+
     @property
     def first_attested_(self) -> T.Union[int, str]:
-        return self.parse_year(self.first_attested) or self.first_attested
+        return self.first_year_lo or self.first_attested
 
     @property
     def last_attested_(self) -> T.Union[int, str]:
-        return self.parse_year(self.last_attested) or self.last_attested
+        return self.last_year_hi or self.last_attested
 
-    
     @property
     def last_attested_dt_aware(self) -> T.Union[int, str]:
-        year = self.parse_year(self.last_attested) or self.last_attested
-        if isinstance(year, int):
-            return year if year < PRECISE_DATE_UNTIL_YEAR else CURRENT_STATUS
-            
+        year = self.last_year_hi
+        if year is None:
+            return self.last_attested
+        return year if year < PRECISE_DATE_UNTIL_YEAR else CURRENT_STATUS
+
 
     def exist_constraints(self):
         return bool(self.constraints)
@@ -462,13 +604,15 @@ class Change(Base):
     def dates_to_dict(self):
         dates = {}
 
-        for field in ('first_attested', 'last_attested'):
-            year = parse_year(getattr(self, field))
+        for field, year in (('first_attested', self.first_year_lo),
+                            ('last_attested', self.last_year_hi)):
             value = datetime(year, 1, 1) if year else NO_DATE
 
             # dates.setdefault(field, []).append(value)
             dates[field] = value
 
+        return dates
+
     def __repr__(self):
         return (f'Change({self.id!r}, {self.construction_id!r}, '
                 f'{self.stage!r}, {self.level!r}, {self.type_of_change!r} '
@@ -483,8 +627,8 @@ class Constraint(Base):
     id = Column(Integer, primary_key=True)
     # TODO: make a better scheme? make both nullable?
     # null in case constraint is related to construction as a whole
-    change_id = Column(Integer, ForeignKey(Change.id), nullable=True)
-    construction_id = Column(Integer, ForeignKey(Construction.id))
+    change_id = Column(Integer, ForeignKey(Change.id), nullable=True, index=True)
+    construction_id = Column(Integer, ForeignKey(Construction.id), index=True)
 
     element = Column(String(30))
     syntactic = Column(String(300))
@@ -501,6 +645,162 @@ class Constraint(Base):
                 f'{self.semantic!r:.{REPR_CHAR_LIM}})')
 
 
+class ConstructionStats(Base):
+    """Per construction aggregates, filled by `refresh_after_import`
+
+    Search filters by these instead of grouping child tables on every query."""
+    __tablename__ = 'construction_stats'
+
+    construction_id = Column(Integer, ForeignKey(Construction.id),
+                             primary_key=True)
+
+    num_changes = Column(Integer, index=True)
+    # lexical (cyrillic) elements of the main formula
+    anchor_length = Column(Integer, index=True)
+    # min `Change.first_year_lo` / max `Change.last_year_hi`
+    first_attested = Column(Integer, index=True)
+    last_attested = Column(Integer, index=True)
+    duration = Column(Integer, index=True)
+    num_variants = Column(Integer)
+
+    def __repr__(self):
+        return (f'ConstructionStats({self.construction_id!r}, '
+                f'{self.num_changes!r}, {self.anchor_length!r}, '
+                f'{self.first_attested!r}, {self.last_attested!r}, '
+                f'{self.duration!r}, {self.num_variants!r})')
+
+
+# FTS5 index over the texts of a change (and its constraints), rowid is
+# `Change.id`; filled by `refresh_after_import`. The index is of the texts
+# normalized by `normalize_fts_text`, its content (what snippets are made of)
+# is the texts as they are, in `change_fts_source`: ё is a letter of its own
+# for the tokenizer, but folding it keeps the positions of the tokens. They
+# are not a part of the metadata (virtual tables can't be reflected), only
+# created and dropped with it
+FTS_TOKENIZER = "unicode61 remove_diacritics 2"
+CHANGE_FTS_COLUMNS = ("first_example", "last_example", "comment", "sources",
+                      "frequency_trend", "constraints")
+change_fts = table(
+    "change_fts",
+    column("rowid"),
+    *[column(name) for name in CHANGE_FTS_COLUMNS],
+)
+change_fts_source = table(
+    "change_fts_source",
+    column("id"),
+    *[column(name) for name in CHANGE_FTS_COLUMNS],
+)
+CHANGE_FTS_DDL = [
+    f"CREATE TABLE IF NOT EXISTS {change_fts_source.name}("
+    f"id INTEGER PRIMARY KEY, {', '.join(CHANGE_FTS_COLUMNS)})",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {change_fts.name} USING fts5("
+    f"{', '.join(CHANGE_FTS_COLUMNS)}, content='{change_fts_source.name}', "
+    f"content_rowid='id', tokenize='{FTS_TOKENIZER}')",
+]
+
+for _statement in CHANGE_FTS_DDL:
+    event.listen(Base.metadata, "after_create",
+                 DDL(_statement).execute_if(dialect="sqlite"))
+for _name in (change_fts.name, change_fts_source.name):
+    event.listen(Base.metadata, "before_drop", DDL(
+        f"DROP TABLE IF EXISTS {_name}"
+    ).execute_if(dialect="sqlite"))
+
+
+# FTS5 trigram indexes of text columns searched by infix (`%value%`), one per
+# model, rowid is the primary key. Triggers keep them in sync with the rows:
+# trigram tokenizer folds case itself (Cyrillic too), ё is replaced by е
+TRIGRAM_COLUMNS = {
+    Construction: ("formula", "anchor_schema", "anchor_ru", "anchor_eng"),
+    ConstructionVariant: ("formula",),
+    GeneralInfo: ("name",),
+}
+TRIGRAM_MIN_LEN = 3
+
+
+def trigram_table(model) -> T.Any:
+    return table(f"{model.__tablename__}_trigram", column("rowid"),
+                 *[column(name) for name in TRIGRAM_COLUMNS[model]])
+
+
+def _trigram_text(row: str, name: str) -> str:
+    return f"replace(replace({row}.{name}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def make_trigram_ddl(model) -> T.List[str]:
+    """Statements creating the trigram index of `model` and its triggers"""
+    index, base = trigram_table(model).name, model.__tablename__
+    key = model.__table__.primary_key.columns.keys()[0]
+    columns = TRIGRAM_COLUMNS[model]
+
+    def insert(row: str) -> str:
+        return (f"INSERT INTO {index}(rowid, {', '.join(columns)}) VALUES "
+                f"({row}.{key}, "
+                f"{', '.join(_trigram_text(row, name) for name in columns)});")
+
+    delete = f"DELETE FROM {index} WHERE rowid = old.{key};"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5("
+        f"{', '.join(columns)}, tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_ai AFTER INSERT ON {base} "
+        f"BEGIN {insert('new')} END",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_ad AFTER DELETE ON {base} "
+        f"BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_au AFTER UPDATE OF "
+        f"{', '.join(columns)} ON {base} BEGIN {delete} {insert('new')} END",
+    ]
+
+
+for _model in TRIGRAM_COLUMNS:
+    for _statement in make_trigram_ddl(_model):
+        event.listen(Base.metadata, "after_create",
+                     DDL(_statement).execute_if(dialect="sqlite"))
+    event.listen(Base.metadata, "before_drop", DDL(
+        f"DROP TABLE IF EXISTS {trigram_table(_model).name}"
+    ).execute_if(dialect="sqlite"))
+
+
+def fts_source_text(text: T.Optional[str]) -> str:
+    """Text as snippets show it: no `**` marks
+
+    `**` are the highlight marks of examples, snippets add their own"""
+    return (text or "").replace("**", "")
+
+
+def normalize_fts_text(text: T.Optional[str]) -> str:
+    """Text as it is indexed and queried: no `**` marks, ё as е"""
+    return fts_source_text(text).replace("ё", "е").replace("Ё", "Е")
+
+
+SEARCH_NORM_SUFFIX = "_norm"
+# searched text columns: SQLite's `LIKE` only folds the case of ASCII, so
+# search goes by `<column>_norm`, a normalized copy kept by an attribute event
+NORMALIZED_COLUMNS = [
+    GeneralInfo.name,
+    Construction.contemporary_meaning,
+    Construction.anchor_ru,
+    FormulaElement.value,
+]
+
+
+def normalize_search_text(text: T.Optional[str]) -> T.Optional[str]:
+    """Text as it is searched by: casefolded, ё as е"""
+    if text is None:
+        return None
+    return str(text).casefold().replace("ё", "е")
+
+
+def _make_normalized_setter(norm_key: str):
+    def set_normalized(target, value, oldvalue, initiator):
+        setattr(target, norm_key, normalize_search_text(value))
+    return set_normalized
+
+
+for _column in NORMALIZED_COLUMNS:
+    event.listen(_column, "set",
+                 _make_normalized_setter(_column.key + SEARCH_NORM_SUFFIX))
+
+
 # @event.listens_for(Constraint, 'after_insert')
 # def flag_constraints_existence(mapper, connection, target):
 #     construction_id, change_id = Constraint.construction_id, Constraint.change_id
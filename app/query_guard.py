@@ -0,0 +1,118 @@
+"""Budgets of SQLite statements: VM steps, wall-clock time, cancellation
+
+Every connection of `make_database` calls `check_query_budget` by SQLite's
+progress handler (each `PROGRESS_N_STEPS` virtual machine steps by default). Within
+`query_budget(...)` (or `spending(budget)`) statements are interrupted once the budget is spent, or
+when `is_cancelled()` says so (e.g. the client has gone away), and
+`QueryBudgetExceeded` is raised instead of SQLite's "interrupted" error.
+Out of it nothing is counted.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import select
+import socket
+import time
+import typing as T
+
+import sqlalchemy.exc
+
+from app.metrics import metrics
+
+
+PROGRESS_N_STEPS = 10_000
+
+REASON_STEPS = "steps"
+REASON_TIME = "time"
+REASON_CANCELLED = "cancelled"
+
+
+class QueryBudgetExceeded(Exception):
+    def __init__(self, reason: str) -> None:
+        super().__init__(f"query budget exceeded: {reason}")
+        self.reason = reason
+
+
+class QueryBudget:
+    """At most `max_steps` VM steps and `max_seconds` from its start in all,
+    unless `is_cancelled()`; a limit of 0 or None is none"""
+    def __init__(self, max_steps: T.Optional[int] = None,
+                 max_seconds: T.Optional[float] = None,
+                 is_cancelled: T.Optional[T.Callable[[], bool]] = None,
+                 clock: T.Callable[[], float] = time.monotonic) -> None:
+        self.max_steps = max_steps
+        self.max_seconds = max_seconds
+        self.is_cancelled = is_cancelled
+        self.clock = clock
+
+        self.started = clock()
+        self.steps = 0
+        # why it was spent, if it was
+        self.exceeded: T.Optional[str] = None
+
+    def spend(self, n_steps: int) -> bool:
+        """Count `n_steps` more, whether the statement is to be interrupted"""
+        self.steps += n_steps
+        if self.max_steps and self.steps > self.max_steps:
+            self.exceeded = REASON_STEPS
+        elif self.max_seconds and self.clock() - self.started > self.max_seconds:
+            self.exceeded = REASON_TIME
+        elif self.is_cancelled is not None and self.is_cancelled():
+            self.exceeded = REASON_CANCELLED
+        return self.exceeded is not None
+
+
+_current_budget: ContextVar[T.Optional[QueryBudget]] = ContextVar(
+    "query_budget", default=None)
+
+
+def check_query_budget(n_steps: int = PROGRESS_N_STEPS) -> int:
+    """The progress handler (of each `n_steps`): nonzero interrupts the
+    running statement"""
+    budget = _current_budget.get()
+    return int(budget is not None and budget.spend(n_steps))
+
+
+def install_query_guard(dbapi_connection, n_steps: int = PROGRESS_N_STEPS) -> None:
+    dbapi_connection.set_progress_handler(lambda: check_query_budget(n_steps), n_steps)
+
+
+@contextmanager
+def spending(budget: QueryBudget) -> T.Iterator[QueryBudget]:
+    """Statements run within are interrupted once `budget` is spent
+
+    An interrupted statement raises `QueryBudgetExceeded`, counted by the
+    `query_guard.aborted.<reason>` metric. A budget may be spent by parts
+    (e.g. between the batches of a stream)."""
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    except sqlalchemy.exc.OperationalError as e:
+        if budget.exceeded is None:
+            raise
+        metrics.incr(f"query_guard.aborted.{budget.exceeded}")
+        raise QueryBudgetExceeded(budget.exceeded) from e
+    finally:
+        _current_budget.reset(token)
+
+
+def query_budget(max_steps: T.Optional[int] = None,
+                 max_seconds: T.Optional[float] = None,
+                 is_cancelled: T.Optional[T.Callable[[], bool]] = None,
+                 **kwargs) -> T.ContextManager[QueryBudget]:
+    """`spending` a new `QueryBudget`"""
+    return spending(QueryBudget(max_steps, max_seconds, is_cancelled, **kwargs))
+
+
+def is_client_gone(environ: T.Mapping[str, T.Any]) -> bool:
+    """Whether the client closed the connection of a request
+
+    Known by the socket of the development server (`werkzeug.socket`) only:
+    it's readable with nothing to read when closed."""
+    sock = environ.get("werkzeug.socket")
+    if sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        return bool(readable) and not sock.recv(1, socket.MSG_PEEK)
+    except (OSError, ValueError):
+        return True
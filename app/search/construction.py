@@ -8,7 +8,8 @@ import re
 from flask import current_app
 from flask import render_template, abort, request, redirect
 from markupsafe import (
-    Markup
+    Markup,
+    escape,
 )
 from sqlalchemy import (
     select,
@@ -42,28 +43,6 @@ logger.addHandler(logging.StreamHandler())
 # logger.addHandler(logging.NullHandler())
 
 
-def parse_year(year: Union[str, int, None], left_bias=0.0):
-    """Parse year string into datetime
-
-    :param year:
-    :param left_bias:
-    :return:
-    """
-    if not year or year == '-':
-        return None
-    if isinstance(year, int) or year.isnumeric():
-        return year
-    if '-' in year:
-        if year.endswith('-ые'):
-            return int(year.split('-')[0])
-
-        left, right = [int(part) for part in year.split('-')]
-        return int(left + (right-left) * (1-left_bias))
-
-    logger.debug(f"unsupported year type: {year}")
-    return None
-
-
 def prepare_graph_data(changes, skip_empty=True):
     """Update dates and
 
@@ -77,8 +56,8 @@ def prepare_graph_data(changes, skip_empty=True):
         level_data = changes_data.setdefault(change.level, {})
         presence = {}
 
-        for field in ('first_attested', 'last_attested'):
-            year = Change.parse_year(getattr(change, field))
+        for field, year in (('first_attested', change.first_year_lo),
+                            ('last_attested', change.last_year_hi)):
             value = datetime(year, 1, 1) if year else NO_DATE
 
             # level_data = changes_data.setdefault(change.level, {})
@@ -127,6 +106,12 @@ def add_examples_highlight(
     return result
 
 
+@bp.app_template_filter("examples_highlight")
+def examples_highlight(text: str) -> Markup:
+    """Escape `text` and mark its `**highlighted**` parts (as in snippets)"""
+    return Markup(add_examples_highlight(str(escape(text))))
+
+
 @bp.route('/item/<int:index>/')
 @bp.route('/construction/<int:index>/')
 def construction(index: int):
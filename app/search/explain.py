@@ -0,0 +1,158 @@
+"""What a search does: its tree, SQL, query plan, row counts and timings
+
+`explain_search` runs the form the way `/form` does, stage by stage, and
+reports each. Served (to developers) by `/api/search/explain`, and by
+
+    python -m app.search.explain '{"changes": [{"level": "synt"}]}'
+"""
+import argparse
+import contextlib
+import json
+import sys
+import time
+import typing as T
+
+from sqlalchemy import func, select
+
+from app.models import Construction
+
+from app.search.query import canonical_json
+from app.search.query_sqlalchemy import default_sqlquery, estimate_selectivity
+from app.search.selectivity import get_selectivity_stats
+
+
+class Timer:
+    """Seconds spent by stage, `with timer("stage"): ...`"""
+    def __init__(self) -> None:
+        self.timings: T.Dict[str, float] = {}
+
+    @contextlib.contextmanager
+    def __call__(self, stage: str) -> T.Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0.) + time.perf_counter() - start
+
+
+def make_query(form_data: T.Dict, formula_index=None, selectivity=None):
+    query = default_sqlquery(formula_index, selectivity=selectivity)
+    query.parse_form(form_data)
+    return query
+
+
+def split_form(form_data: T.Dict) -> T.Iterator[T.Tuple[str, T.Dict]]:
+    """(name, form) of each subform of `form_data` alone, a change form of
+    `changes` each"""
+    for name, value in form_data.items():
+        if isinstance(value, list):
+            for i, item in enumerate(value):
+                yield f"{name}[{i}]", {name: [item]}
+        elif isinstance(value, dict):
+            yield name, {name: value}
+
+
+def count_constructions(conn, query) -> int:
+    return conn.execute(
+        select(func.count()).select_from(query.query_ids().distinct().subquery())
+    ).scalar()
+
+
+def explain_plan(conn, compiled) -> T.List[T.Dict[str, T.Any]]:
+    """Rows of SQLite's `EXPLAIN QUERY PLAN` of a compiled statement"""
+    params = tuple(compiled.params[key] for key in compiled.positiontup)
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+    return [{"id": row[0], "parent": row[1], "detail": row[3]} for row in rows]
+
+
+def explain_search(
+    engine, form_data: T.Dict, formula_index=None,
+    render: T.Optional[T.Callable[[T.List[T.Mapping]], T.Any]] = None,
+) -> T.Dict[str, T.Any]:
+    """Breakdown of the search by `form_data` (as `SQLQuery.parse_form` takes)
+
+    `tree`, `canonical` form, `sql` with its `params`, query `plan`, `stages`
+    (constructions found by each subform alone and the share of them it was
+    estimated to find, then the rows and the constructions found by all of
+    them) and `timings` (s) of parsing, compilation, execution and rendering
+    (by `render(rows)`, if any)."""
+    selectivity = get_selectivity_stats(engine)
+    timer = Timer()
+    with timer("parse"):
+        query = make_query(form_data, formula_index, selectivity)
+    with timer("compile"):
+        stmt = query.query()
+        # expanding parameters (`IN` lists of ids found by the formula index)
+        # rendered as the placeholders they are executed with
+        compiled = stmt.compile(engine, compile_kwargs={"render_postcompile": True})
+
+    stages = []
+    with engine.connect() as conn:
+        plan = explain_plan(conn, compiled)
+        for name, subform_data in split_form(form_data):
+            subquery = make_query(subform_data, formula_index, selectivity)
+            if subquery.canonical_form().items:
+                estimate = estimate_selectivity(subquery.form, selectivity, Construction)
+                stages.append({"stage": name, "estimated_share": estimate,
+                               "constructions": count_constructions(conn, subquery)})
+
+        with timer("execute"):
+            rows = conn.execute(stmt).mappings().all()
+    stages.append({"stage": "found", "rows": len(rows),
+                   "constructions": len({row["id"] for row in rows})})
+
+    if render is not None:
+        with timer("render"):
+            render(rows)
+
+    return {
+        "tree": query.form.tree(),
+        "canonical": json.loads(canonical_json(query.canonical_form())),
+        "form_hash": query.form_hash(),
+        "sql": str(compiled),
+        "params": [compiled.params[key] for key in compiled.positiontup],
+        "plan": plan,
+        "stages": stages,
+        "timings": timer.timings,
+    }
+
+
+if __name__ == "__main__":
+    from app.database_utils import make_database
+
+    parser = argparse.ArgumentParser(
+        description="Explain the search by a form: its tree, SQL, query plan, "
+                    "row counts and timings, as JSON")
+    parser.add_argument("form", type=str,
+                        help="the form as JSON, e.g. '{\"changes\": [{\"level\": \"synt\"}]}', "
+                             "or @ and a path of a JSON file")
+    parser.add_argument("--database-url", type=str, default=None,
+                        help="an optional sqlalchemy uri to use a different database")
+    parser.add_argument("-o", "--output", type=str, default=None,
+                        help="a path to write the report to instead of stdout "
+                             "(where importing the app prints too)")
+    args = parser.parse_args()
+
+    if args.form.startswith("@"):
+        with open(args.form[1:], encoding="utf-8") as f:
+            form_data = json.load(f)
+    else:
+        form_data = json.loads(args.form)
+
+    # the queries' debug output is not a part of the report
+    with contextlib.redirect_stdout(sys.stderr):
+        from app import create_app
+        from app.search.search2 import render_found
+
+        flask_app = create_app()
+        if args.database_url is not None:
+            flask_app.engine, _, _ = make_database(args.database_url, sqlalchemy_echo=False)
+        with flask_app.test_request_context():
+            report = explain_search(flask_app.engine, form_data, render=render_found)
+
+    report = json.dumps(report, ensure_ascii=False, indent=2, default=str)
+    if args.output is None:
+        print(report)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report)
@@ -0,0 +1,127 @@
+"""Bitmap index of the categorical attributes (facets) of constructions
+
+Every value of a facet has a bitset of the constructions having it: bit `i`
+is the construction `ids[i]`, a bitset is a Python int. Facets of changes or
+tags are had by a construction if any of its changes or tags has the value.
+Filters on facets are ANDs (of facets) of ORs (of a facet's values) of the
+bitsets, and the counts of values in a result set are popcounts.
+
+The index is kept per engine until the data generation changes, as
+`app.search.formula_index` is.
+"""
+import typing as T
+
+from sqlalchemy import select
+
+from app.database_utils import GenerationCache
+from app.models import (
+    MORPHOSYNTAX_TAG,
+    SEMANTICS_TAG,
+    Change,
+    Construction,
+    GeneralInfo,
+    GeneralTag,
+    construction_to_tags,
+)
+
+
+def _tags_of_kind(kind: str):
+    return select(
+        construction_to_tags.c.construction_id, GeneralTag.name
+    ).join_from(construction_to_tags, GeneralTag).where(GeneralTag.kind == kind)
+
+
+# facet: statement selecting (construction id, value)
+FACET2STMT = {
+    "synt_function_of_anchor": select(Construction.id, Construction.synt_function_of_anchor),
+    "in_rus_constructicon": select(Construction.id, Construction.in_rus_constructicon),
+    "status": select(GeneralInfo.construction_id, GeneralInfo.status),
+    "level": select(Change.construction_id, Change.level),
+    "type_of_change": select(Change.construction_id, Change.type_of_change),
+    "subtype_of_change": select(Change.construction_id, Change.subtype_of_change),
+    "morphosyntax_tags": _tags_of_kind(MORPHOSYNTAX_TAG),
+    "semantic_tags": _tags_of_kind(SEMANTICS_TAG),
+}
+
+
+class FacetIndex:
+    def __init__(
+        self, construction_ids: T.Iterable[int],
+        facet2pairs: T.Mapping[str, T.Iterable[T.Tuple[int, T.Any]]],
+    ) -> None:
+        """Index `facet2pairs`: (construction id, value) of every facet
+
+        Values are kept as strings, as they come in requests."""
+        self.ids = sorted(set(construction_ids))
+        self.id2bit = {construction_id: 1 << i
+                       for i, construction_id in enumerate(self.ids)}
+        self.all = (1 << len(self.ids)) - 1
+
+        self.bitsets: T.Dict[str, T.Dict[str, int]] = {}
+        for facet, pairs in facet2pairs.items():
+            value2bitset = self.bitsets.setdefault(facet, {})
+            for construction_id, value in pairs:
+                bit = self.id2bit.get(construction_id)
+                if bit is None or value in (None, ""):
+                    continue
+                value = str(value)
+                value2bitset[value] = value2bitset.get(value, 0) | bit
+
+    @classmethod
+    def from_connection(cls, conn) -> "FacetIndex":
+        return cls(
+            conn.execute(select(Construction.id)).scalars(),
+            {facet: conn.execute(stmt).all() for facet, stmt in FACET2STMT.items()},
+        )
+
+    def bitset(self, construction_ids: T.Iterable[int]) -> int:
+        """Bitset of constructions `construction_ids`, unknown ids are left out"""
+        bitset = 0
+        for construction_id in construction_ids:
+            bitset |= self.id2bit.get(construction_id, 0)
+        return bitset
+
+    def to_ids(self, bitset: int) -> T.List[int]:
+        ids = []
+        while bitset:
+            low = bitset & -bitset
+            ids.append(self.ids[low.bit_length() - 1])
+            bitset ^= low
+        return ids
+
+    def filter(
+        self, facet2values: T.Mapping[str, T.Iterable[str]],
+        bitset: T.Optional[int]=None,
+    ) -> int:
+        """Constructions (of `bitset`) having any of the values of every facet"""
+        bitset = self.all if bitset is None else bitset
+        for facet, values in facet2values.items():
+            if facet not in self.bitsets:
+                raise ValueError(f"unknown facet: {facet}")
+
+            value2bitset = self.bitsets[facet]
+            any_value = 0
+            for value in values:
+                any_value |= value2bitset.get(str(value), 0)
+            bitset &= any_value
+        return bitset
+
+    def counts(self, bitset: T.Optional[int]=None) -> T.Dict[str, T.Dict[str, int]]:
+        """Number of constructions (of `bitset`) with each value of each facet"""
+        bitset = self.all if bitset is None else bitset
+        return {
+            facet: {value: (value_bitset & bitset).bit_count()
+                    for value, value_bitset in value2bitset.items()}
+            for facet, value2bitset in self.bitsets.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+_cache = GenerationCache(FacetIndex.from_connection)
+
+
+def get_facet_index(engine) -> FacetIndex:
+    """The index of `engine`'s data, rebuilt once the data generation changes"""
+    return _cache.get(engine)
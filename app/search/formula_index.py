@@ -0,0 +1,207 @@
+"""Positional inverted index of formula elements
+
+Maps a normalized element value (a term) to its postings: for every formula
+(construction variant) the term occurs in, the positions (`order`) of it.
+A formula query (a list of LIKE patterns, one per element) is answered by
+intersecting postings of consecutive positions, instead of joining
+`formula_element` to itself once per pattern.
+
+The index is built from `formula_element` and kept per engine until the data
+generation (bumped by every import, see `refresh_after_import`) changes.
+"""
+from bisect import bisect_left
+import re
+import typing as T
+
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from app.database_utils import GenerationCache
+from app.models import FormulaElement, FormulaElementNext, normalize_search_text
+
+
+# (construction_variant_id, construction_id) of a formula
+Doc = T.Tuple[T.Optional[int], T.Optional[int]]
+Postings = T.Dict[Doc, T.Set[int]]
+
+LIKE_ANY = "%"
+LIKE_ONE = "_"
+# sorts after any character a term may continue a prefix with
+MAX_CHAR = chr(0x10FFFF)
+PATTERN_CACHE_SIZE = 256
+
+
+def normalize_term(value: str) -> str:
+    return normalize_search_text(value)
+
+
+def like_to_regex(pattern: str) -> T.Pattern:
+    """Compile a LIKE pattern (`%`, `_`) into a regex matching whole terms"""
+    parts = []
+    for char in pattern:
+        if char == LIKE_ANY:
+            parts.append(".*")
+        elif char == LIKE_ONE:
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return re.compile("".join(parts), re.S)
+
+
+class FormulaIndex:
+    def __init__(
+        self, elements: T.Iterable[T.Tuple[str, T.Optional[int], T.Optional[int], int]],
+        links: T.Iterable[T.Tuple[T.Optional[int], T.Optional[int], int, int]] = (),
+    ) -> None:
+        """Index `elements`: (value, construction_variant_id, construction_id, order)
+
+        `links` are (construction_variant_id, construction_id, order, next_order)
+        of `FormulaElementNext`, the positions that may follow a position
+        when optional elements are skipped."""
+        self.postings: T.Dict[str, Postings] = {}
+        # positions of any element, for patterns that match every term
+        self.any_postings: Postings = {}
+        for value, variant_id, construction_id, order in elements:
+            if value is None or order is None:
+                continue
+            doc = (variant_id, construction_id)
+            doc2positions = self.postings.setdefault(normalize_term(value), {})
+            doc2positions.setdefault(doc, set()).add(order)
+            self.any_postings.setdefault(doc, set()).add(order)
+
+        self.next_positions: T.Dict[Doc, T.Dict[int, T.Set[int]]] = {}
+        for variant_id, construction_id, order, next_order in links:
+            doc2next = self.next_positions.setdefault((variant_id, construction_id), {})
+            doc2next.setdefault(order, set()).add(next_order)
+
+        self.terms = sorted(self.postings)
+        # merged postings of recent patterns, the index is never modified
+        self._pattern2postings: T.Dict[str, Postings] = {}
+
+    @classmethod
+    def from_connection(cls, conn) -> "FormulaIndex":
+        next_element = aliased(FormulaElement)
+        links = select(
+            FormulaElement.construction_variant_id, FormulaElement.construction_id,
+            FormulaElement.order, next_element.order,
+        ).join_from(
+            FormulaElement, FormulaElementNext,
+            FormulaElementNext.element_id == FormulaElement.id,
+        ).join(next_element, FormulaElementNext.next_element_id == next_element.id)
+
+        return cls(conn.execute(select(
+            FormulaElement.value_norm, FormulaElement.construction_variant_id,
+            FormulaElement.construction_id, FormulaElement.order,
+        )), conn.execute(links))
+
+    def expand(self, pattern: str) -> T.List[str]:
+        """Terms matching a LIKE `pattern`, prefix patterns by a range of `terms`"""
+        pattern = normalize_term(pattern)
+        prefix, wildcard, rest = pattern.partition(LIKE_ANY)
+
+        if LIKE_ONE not in pattern and rest.strip(LIKE_ANY) == "":
+            if not wildcard:
+                return [pattern] if pattern in self.postings else []
+
+            start = bisect_left(self.terms, prefix)
+            end = bisect_left(self.terms, prefix + MAX_CHAR, lo=start)
+            return self.terms[start:end]
+
+        regex = like_to_regex(pattern)
+        return [term for term in self.terms if regex.fullmatch(term)]
+
+    def lookup(self, pattern: str) -> Postings:
+        """Postings of all the terms matching `pattern`, merged"""
+        if pattern.strip(LIKE_ANY) == "":
+            return self.any_postings
+
+        terms = self.expand(pattern)
+        if len(terms) == 1:
+            return self.postings[terms[0]]
+
+        merged = self._pattern2postings.get(pattern)
+        if merged is None:
+            merged = {}
+            for term in terms:
+                for doc, positions in self.postings[term].items():
+                    merged.setdefault(doc, set()).update(positions)
+
+            if len(self._pattern2postings) >= PATTERN_CACHE_SIZE:
+                self._pattern2postings.clear()
+            self._pattern2postings[pattern] = merged
+        return merged
+
+    def match_phrase(
+        self, patterns: T.Sequence[str], skip_optional: bool = False
+    ) -> T.Dict[Doc, T.List[int]]:
+        """Formulas with elements matching `patterns` at consecutive positions
+
+        With `skip_optional` positions follow `next_positions` instead.
+        Returns the positions each match starts at."""
+        if not patterns:
+            return {}
+
+        postings = [self.lookup(pattern) for pattern in patterns]
+        # candidate formulas have all the patterns, start from the rarest
+        docs = set(min(postings, key=len))
+        for doc2positions in postings:
+            docs &= doc2positions.keys()
+            if not docs:
+                return {}
+
+        if skip_optional:
+            return self._match_linked(postings, docs)
+
+        matches = {}
+        for doc in docs:
+            starts = postings[0][doc]
+            for offset, doc2positions in enumerate(postings[1:], start=1):
+                positions = doc2positions[doc]
+                starts = {start for start in starts if start + offset in positions}
+                if not starts:
+                    break
+            if starts:
+                matches[doc] = sorted(starts)
+
+        return matches
+
+    def _match_linked(
+        self, postings: T.List[Postings], docs: T.Set[Doc]
+    ) -> T.Dict[Doc, T.List[int]]:
+        matches = {}
+        for doc in docs:
+            doc2next = self.next_positions.get(doc, {})
+            # where the match from each start has got to
+            start2ends = {start: {start} for start in postings[0][doc]}
+            for doc2positions in postings[1:]:
+                positions = doc2positions[doc]
+                start2ends = {
+                    start: next_ends
+                    for start, ends in start2ends.items()
+                    if (next_ends := {next_position for end in ends
+                                      for next_position in doc2next.get(end, ())
+                                      if next_position in positions})
+                }
+                if not start2ends:
+                    break
+            if start2ends:
+                matches[doc] = sorted(start2ends)
+
+        return matches
+
+    def search(self, patterns: T.Sequence[str], skip_optional: bool = False) -> T.Set[int]:
+        """Ids of constructions whose main formula matches `patterns`"""
+        return {construction_id
+                for (_, construction_id) in self.match_phrase(patterns, skip_optional)
+                if construction_id is not None}
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+
+_cache = GenerationCache(FormulaIndex.from_connection)
+
+
+def get_formula_index(engine) -> FormulaIndex:
+    """The index of `engine`'s data, rebuilt once the data generation changes"""
+    return _cache.get(engine)
@@ -1,6 +1,8 @@
 import typing as T
 from abc import  ABCMeta, abstractmethod
-from copy import deepcopy
+from copy import copy, deepcopy
+import hashlib
+import json
 from operator import (
     lt,
     gt,
@@ -56,6 +58,21 @@ _CONJUCTION = "Conjunction"
 _CONJUNCTION_COPIES = "ConjunctionCopies"
 _SUBFORM = "SubForm"
 _BETWEEN_COMPARISON = "BetweenComparison"
+_DISJUNCTION = "Disjunction"
+_NEGATION = "Negation"
+
+# form fields that never restrict a search, dropped by canonicalization
+IGNORED_PARAMS = {"csrf_token"}
+# form fields whose values may be logic queries of `app/query_lang/logic_query.peg`
+LOGIC_PARAMS = {"contemporary_meaning", "synt_function_of_anchor"}
+# `|` and `&` of a logic query, or its first value negated (`-`)
+logic_query_re = re.compile(r"[|&]|^\s*-")
+repeated_wildcards_re = re.compile(r"([%*])\1+")
+
+
+def collapse_wildcards(pattern: str) -> str:
+    """`**` matches what `*` does (`%%` what `%` does)"""
+    return repeated_wildcards_re.sub(r"\1", pattern)
 
 
 class QueryMeta(ABCMeta):
@@ -70,6 +87,8 @@ class QueryMeta(ABCMeta):
 
         new_cls = super().__new__(mcls, name, bases, namespace, **kwargs)
         new_cls.REGISTRY = mcls.REGISTRY
+        # what the class is regardless of the backend, e.g. in serializations
+        new_cls.kind = name
         # print(f"added registry to {name}")
 
         mcls.REGISTRY[name] = new_cls
@@ -81,6 +100,59 @@ class QueryMeta(ABCMeta):
         return dict(cls.REGISTRY)
 
 
+class PrefixedQueryMeta(QueryMeta):
+    """Metaclass of a query backend, `<Prefix>QueryMeta` for `<Prefix>*` classes
+
+    The classes are kept in the backend's copy of the registry by their names
+    without the prefix, in place of the base classes they implement."""
+    _was_registry_copied = False
+
+    def __new__(
+        __mcls: type[T.Self], name: str, bases: tuple[type, ...],
+        namespace: dict[str, T.Any], **kwargs: T.Any
+    ) -> T.Self:
+        BASE_REGISTRY = __mcls.REGISTRY
+
+        if not __mcls._was_registry_copied:
+            __mcls.REGISTRY = dict(BASE_REGISTRY)
+            __mcls._was_registry_copied = True
+
+        allowed_base_classes = BASE_REGISTRY.values()
+        allowed_base_classes_names = list(BASE_REGISTRY)
+
+        cls_name = __mcls.__name__
+        parent_cls_name = QueryMeta.__name__
+        maybe_prefix = cls_name.removesuffix(parent_cls_name)
+
+        # print(name, bases, namespace)
+        # print(parent_cls_name, allowed_base_classes_names)
+        print(cls_name, parent_cls_name, maybe_prefix)
+
+        
+        if not any(base_cls in allowed_base_classes for base_cls in bases):
+            raise ValueError(
+                f"classes with this metaclass ({cls_name}) must base one of "
+                f"[{', '.join(allowed_base_classes_names)}]"
+            )
+
+        name_no_prefix = name.removeprefix(maybe_prefix)
+        if (not name.startswith(maybe_prefix)):
+            raise ValueError(
+                f"classes with this metaclass ({cls_name}) must have name that "
+                f"starts with `{maybe_prefix}`"
+            )
+
+        new_cls = super().__new__(__mcls, name, bases, namespace, **kwargs)
+        new_cls.fields_queried = None
+        new_cls.kind = name_no_prefix
+
+        # pop prefixed name from the registry copy and replace the non-prefixed class
+        __mcls.REGISTRY.pop(name)
+        __mcls.REGISTRY[name_no_prefix] = new_cls
+
+        return new_cls
+
+
 class BaseQueryElement(metaclass=QueryMeta):
     """Abstract class for query elements. Defines normal and tree representation"""
     _args = ()  
@@ -116,6 +188,21 @@ class BaseQueryElement(metaclass=QueryMeta):
     def tree(self):
         """Return representation of the object used for tree"""
         return self.__tree_repr__()
+
+    def canonical(self) -> T.Optional["BaseQueryElement"]:
+        """An equivalent element in canonical form, None if it restricts nothing
+
+        Elements aren't modified, a changed one is a (shallow) copy."""
+        return self
+
+    def is_empty(self) -> bool:
+        """Whether it provably matches nothing (e.g. values between 5 and 3),
+        so that there's nothing to look up"""
+        return False
+
+    def to_json(self) -> T.Dict[str, T.Any]:
+        """Serializable representation: `kind` and `_args`"""
+        return {"kind": self.kind, **{arg: getattr(self, arg, None) for arg in self._args}}
     
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, type(self)):
@@ -170,6 +257,19 @@ class Comparison(BaseQueryElement):
     def __tree_repr__(self) -> str:
         """Tree representation of comparison. Defaults to `self.__str__()`"""
         return self.__str__()
+
+    def canonical(self) -> T.Optional["Comparison"]:
+        if self.param in IGNORED_PARAMS or self.value in (None, ""):
+            return None
+        if isinstance(self.value, str) and self.value != self.value.strip():
+            stripped = copy(self)
+            stripped.value = self.value.strip()
+            return stripped.canonical()
+        return self
+
+    def to_json(self) -> T.Dict[str, T.Any]:
+        return {"kind": self.kind, "param": self.param, "op": self.str_op,
+                "value": self.value}
     
 
 class BetweenComparison(BaseQueryElement):
@@ -195,10 +295,23 @@ class BetweenComparison(BaseQueryElement):
     
     def __tree_repr__(self) -> str:
         return self.__str__()
+
+    def canonical(self) -> T.Optional["BetweenComparison"]:
+        if self.value_from in (None, "") and self.value_to in (None, ""):
+            return None
+        return self
+
+    def is_empty(self) -> bool:
+        if self.value_from in (None, "") or self.value_to in (None, ""):
+            return False
+        try:
+            return self.value_from > self.value_to
+        except TypeError:
+            return False
     
 
 class StringPattern(BaseQueryElement):
-    _args = ("param", "value")
+    _args = ("param", "pattern")
 
     def __init__(self, param: str, value: str) -> None:
         super().__init__()
@@ -214,6 +327,14 @@ class StringPattern(BaseQueryElement):
     def __tree_repr__(self) -> str:
         return self.__str__()
 
+    def canonical(self) -> T.Optional["StringPattern"]:
+        pattern = collapse_wildcards(self.pattern.strip())
+        if pattern == self.pattern:
+            return self
+        canonical = copy(self)
+        canonical.pattern = pattern
+        return canonical
+
 
 class BinaryConnective(BaseQueryElement):
     _args = ("items",)
@@ -245,16 +366,72 @@ class BinaryConnective(BaseQueryElement):
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}({self.items.__repr__()})"
 
+    def merge(self, items: T.List[BaseQueryElement]) -> T.List[BaseQueryElement]:
+        """Combine items into fewer equivalent ones, if this connective can"""
+        return items
+
+    def canonical(self) -> T.Optional["BinaryConnective"]:
+        """Items canonical, nested connectives of the same type flattened,
+        duplicates dropped and the rest sorted by their serialization"""
+        items = []
+        for item in self.items:
+            item = item.canonical()
+            if item is None:
+                continue
+            if type(item) is type(self):
+                items.extend(item.items)
+            else:
+                items.append(item)
+
+        key2item = {canonical_json(item): item for item in self.merge(items)}
+        if not key2item:
+            return None
+
+        canonical = copy(self)
+        canonical.items = [key2item[key] for key in sorted(key2item)]
+        return canonical
+
+    def to_json(self) -> T.Dict[str, T.Any]:
+        return {"kind": self.kind, "items": [item.to_json() for item in self.items]}
+
 
 class Conjunction(BinaryConnective):
     """Conjunction (AND & ⋀) in a query. A conjunct is any other query element."""
 
     self_repr = "AND"
 
+    def is_empty(self) -> bool:
+        return any(item.is_empty() for item in self.items)
+
+    def merge(self, items: T.List[BaseQueryElement]) -> T.List[BaseQueryElement]:
+        """`param ≥ a` AND `param ≤ b` is `param` between `a` and `b`"""
+        comparison = self.REGISTRY[_COMPARISON]
+        param2bounds = {}
+        for item in items:
+            if type(item) is comparison and item.str_op in ("ge", "le"):
+                param2bounds.setdefault(item.param, {}).setdefault(item.str_op, []).append(item)
+
+        merged = []
+        for item in items:
+            bounds = param2bounds.get(getattr(item, "param", None), {})
+            if not (len(bounds.get("ge", ())) == 1 and len(bounds.get("le", ())) == 1):
+                merged.append(item)
+            elif item is bounds["ge"][0]:
+                merged.append(self.REGISTRY[_BETWEEN_COMPARISON](
+                    item.param, item.value, bounds["le"][0].value))
+            elif item is not bounds["le"][0]:
+                merged.append(item)
+        return merged
+
+
 class ConjunctionCopies(Conjunction):
     """Conjunction (AND & ⋀) in a query. The conjuncts are distinct instances of a common model."""
 
     self_repr = "AND (distinct instances)"
+
+    def merge(self, items: T.List[BaseQueryElement]) -> T.List[BaseQueryElement]:
+        # each item is of an instance of its own, there's nothing to merge
+        return items
     
 
 class Disjunction(BinaryConnective):
@@ -262,6 +439,44 @@ class Disjunction(BinaryConnective):
 
     self_repr = "OR"
 
+    def is_empty(self) -> bool:
+        return bool(self.items) and all(item.is_empty() for item in self.items)
+
+
+class Negation(BaseQueryElement):
+    """Negation (NOT - ¬) of a query element: what it doesn't match"""
+    _args = ("item",)
+
+    self_repr = "NOT"
+
+    def __init__(self, item: BaseQueryElement) -> None:
+        self.item = item
+
+    def increase_indent(self, times=1):
+        super().increase_indent()
+        self.item.increase_indent(times=times)
+
+    def __tree_repr__(self) -> str:
+        self.increase_indent()
+        return f"{self.self_repr}\n{self.INDENT}{self.item.__tree_repr__()}"
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.item!r})"
+
+    def canonical(self) -> T.Optional["Negation"]:
+        """None if the item restricts nothing, the item itself if negated twice"""
+        item = self.item.canonical()
+        if item is None:
+            return None
+        if type(item) is type(self):
+            return item.item
+        canonical = copy(self)
+        canonical.item = item
+        return canonical
+
+    def to_json(self) -> T.Dict[str, T.Any]:
+        return {"kind": self.kind, "item": self.item.to_json()}
+
 
 class SubForm(BaseQueryElement):
     _args = ("name", "content")
@@ -292,6 +507,41 @@ class SubForm(BaseQueryElement):
         self.content.increase_indent(times=4)
         return f"[{self.name}]:\n{self.INDENT}{self.content.__tree_repr__()}"
 
+    def canonical(self) -> T.Optional["SubForm"]:
+        content = self.content.canonical()
+        if content is None:
+            return None
+        canonical = copy(self)
+        canonical.content = content
+        return canonical
+
+    def is_empty(self) -> bool:
+        return self.content.is_empty()
+
+    def to_json(self) -> T.Dict[str, T.Any]:
+        return {"kind": self.kind, "name": self.name, "content": self.content.to_json()}
+
+
+def canonical_json(element: BaseQueryElement) -> str:
+    """Serialization of `element` that is stable, e.g. to key caches by
+
+    Only canonical elements (see `canonicalize`) equal when their queries do."""
+    return json.dumps(element.to_json(), sort_keys=True, ensure_ascii=False,
+                      separators=(",", ":"), default=str)
+
+
+def canonicalize(element: BaseQueryElement) -> BaseQueryElement:
+    """Canonical form of a query tree, an empty conjunction if nothing is left"""
+    canonical = element.canonical()
+    if canonical is None:
+        return element.REGISTRY[_CONJUCTION]([])
+    return canonical
+
+
+def canonical_hash(element: BaseQueryElement) -> str:
+    """Content hash of the canonical form of a query tree"""
+    return hashlib.sha256(canonical_json(canonicalize(element)).encode()).hexdigest()
+
 
 PrimitiveFormType: T.TypeAlias = T.Dict[str, _VT]
 BasicFormType: T.TypeAlias = T.Union[PrimitiveFormType, T.List[PrimitiveFormType]]
@@ -441,6 +691,32 @@ class BaseQuery(metaclass=QueryMeta):
     def parse_val(self, form_name: str, key: str, val: str) -> BaseQueryElement:
         """Parse a single value. This function may be overriden in child `Query`."""
         return self.REGISTRY[_COMPARISON](key, eq, val)
+
+    def parse_logic_val(self, form_name: str, key: str, val: str) -> BaseQueryElement:
+        """Parse a logic query (`a | b & -c`): a disjunction of conjunctions of
+        values, negated by `-`; each value is parsed by `parse_val`"""
+        disjuncts = []
+        for disjunct in val.split("|"):
+            conjuncts = []
+            for value in disjunct.split("&"):
+                value = value.strip()
+                is_negated = value.startswith("-")
+                value = value.removeprefix("-").strip()
+                if not value:
+                    continue
+                element = self.parse_val(form_name, key, value)
+                conjuncts.append(self.REGISTRY[_NEGATION](element) if is_negated else element)
+            if len(conjuncts) > 1:
+                disjuncts.append(self.REGISTRY[_CONJUCTION](conjuncts))
+            elif conjuncts:
+                disjuncts.append(conjuncts[0])
+
+        if not disjuncts:
+            # nothing but the operators, a value as it is
+            return self.parse_val(form_name, key, val)
+        if len(disjuncts) == 1:
+            return disjuncts[0]
+        return self.REGISTRY[_DISJUNCTION](disjuncts)
     
     def parse_form_name(self, form_name: str) -> str:
         """Replace form name if needed"""
@@ -464,7 +740,11 @@ class BaseQuery(metaclass=QueryMeta):
                 print(f"parsing pair <`{key}`, val>")
                 if isinstance(val, VT) and not is_empty:
                     print(f"val is token: {val}")
-                    element = self.parse_val(form_name, key, val)
+                    if (key in LOGIC_PARAMS and isinstance(val, str)
+                            and logic_query_re.search(val)):
+                        element = self.parse_logic_val(form_name, key, val)
+                    else:
+                        element = self.parse_val(form_name, key, val)
                     elements.append(element)
                 elif isinstance(val, (list, dict)):
                     print(f"val is collection: {val}")
@@ -507,6 +787,18 @@ class BaseQuery(metaclass=QueryMeta):
             print(res.tree())
         return res
 
+    def canonical_form(self) -> BaseQueryElement:
+        """Canonical form of the tree parsed by `parse_form`"""
+        return canonicalize(self.form)
+
+    def form_hash(self) -> str:
+        """Hash of the parsed form, equal for forms making the same query"""
+        return canonical_hash(self.form)
+
+    def is_empty(self) -> bool:
+        """Whether the parsed form provably finds nothing"""
+        return canonicalize(self.form).is_empty()
+
 
 class Query(BaseQuery): ...
 
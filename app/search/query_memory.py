@@ -0,0 +1,676 @@
+"""In-memory query backend: `Mem*` counterparts of the `SQL*` query elements
+
+All the searched tables are loaded once into columns (`MemStore`): integers
+as NumPy arrays, strings interned (codes into a vocabulary of distinct values).
+The tree `MemQuery` parses a form into is evaluated on them directly: every
+element narrows a boolean mask of rows of its subform's table, the way `SQL*`
+elements add conditions to a statement. `MemQuery.query` returns the ids of
+the constructions found, the same ones `SQLQuery` finds.
+
+The store is kept per engine until the data generation changes, as
+`app.search.formula_index` is. Full-text search needs the FTS index and isn't
+supported, `MemQuery` raises `NotImplementedError` for it.
+"""
+from copy import copy
+import operator
+import re
+import typing as T
+
+import numpy as np
+from sqlalchemy import Boolean, Integer, select
+
+from app.database_utils import GenerationCache
+from app.models import (
+    Change,
+    Construction,
+    ConstructionStats,
+    FormulaElement,
+    FormulaElementNext,
+    GeneralInfo,
+    SEARCH_NORM_SUFFIX,
+    normalize_search_text,
+)
+from app.search.formula_index import like_to_regex
+from app.search.query import (
+    _VT,
+    BaseQuery,
+    BaseQueryElement,
+    BetweenComparison,
+    Comparison,
+    Conjunction,
+    ConjunctionCopies,
+    Disjunction,
+    ElementDerivation,
+    Negation,
+    Operators,
+    OperatorsStr,
+    PrefixedQueryMeta,
+    StringPattern,
+    SubForm,
+    ValueBetweenDerivation,
+    collapse_wildcards,
+)
+from app.search.query_sqlalchemy import (
+    MAPPING,
+    SKIP_OPTIONAL_KEY,
+    ComplexFieldDerivation,
+    SQLYearRangeQuery,
+    parse_gloss,
+    process_pattern,
+    tokenize_formula_query,
+)
+
+
+# model: the column of construction ids its rows belong to
+MODEL2CONSTRUCTION_KEY = {
+    Construction: "id",
+    GeneralInfo: "construction_id",
+    Change: "construction_id",
+    FormulaElement: "construction_id",
+    FormulaElementNext: None,
+    ConstructionStats: "construction_id",
+}
+NULL_CODE = -1
+NUMERIC_PREFIX_RE = re.compile(r"\s*[+-]?\d+")
+
+
+class MemColumn:
+    """A column of a `MemTable`, compared to a value into a mask of its rows"""
+    def compare(self, op: T.Callable, value: _VT) -> np.ndarray:
+        raise NotImplementedError(f"method not implemented for `{type(self)}`")
+
+    def between(self, value_from: _VT, value_to: _VT) -> np.ndarray:
+        return self.compare(operator.ge, value_from) & self.compare(operator.le, value_to)
+
+    def like(self, pattern: str) -> np.ndarray:
+        raise NotImplementedError(f"method not implemented for `{type(self)}`")
+
+
+class MemIntColumn(MemColumn):
+    """Integers (and booleans) with a mask of the rows that aren't NULL
+
+    SQLite keeps a value it can't read as a number as text, `texts` are those
+    (`values` has their numeric prefix, as arithmetic casts them)."""
+    def __init__(self, values: np.ndarray, valid: np.ndarray,
+                 texts: T.Optional[T.Dict[int, str]]=None) -> None:
+        self.values = values
+        self.valid = valid
+        self.texts = texts or {}
+
+        self.is_text = np.zeros(len(values), dtype=bool)
+        self.is_text[list(self.texts)] = True
+
+    @classmethod
+    def from_values(cls, values: T.Sequence[T.Any]) -> "MemIntColumn":
+        numbers = np.zeros(len(values), dtype=np.int64)
+        valid = np.zeros(len(values), dtype=bool)
+        texts = {}
+        for i, value in enumerate(values):
+            if isinstance(value, str):
+                texts[i] = value
+                prefix = NUMERIC_PREFIX_RE.match(value)
+                numbers[i] = int(prefix[0]) if prefix else 0
+            elif value is not None:
+                numbers[i] = int(value)
+                valid[i] = True
+        return cls(numbers, valid, texts)
+
+    def compare(self, op: T.Callable, value: _VT) -> np.ndarray:
+        try:
+            # as SQLite does, a numeric string is compared as a number
+            value = float(value)
+        except (TypeError, ValueError):
+            # and any other string sorts after all the numbers
+            rows = self.valid & op(0, 1)
+            for i, text in self.texts.items():
+                rows[i] = op(text, str(value))
+            return rows
+        return (self.valid & op(self.values, value)) | (self.is_text & op(1, 0))
+
+    def __sub__(self, other: "MemIntColumn") -> "MemIntColumn":
+        return MemIntColumn(self.values - other.values,
+                            (self.valid | self.is_text) & (other.valid | other.is_text))
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class MemStrColumn(MemColumn):
+    """Strings interned: `codes` of the rows index `vocabulary`, NULL is -1
+
+    A value is compared to the (few) distinct strings, not to every row."""
+    def __init__(self, codes: np.ndarray, vocabulary: T.List[str]) -> None:
+        self.codes = codes
+        self.vocabulary = vocabulary
+
+    @classmethod
+    def from_values(cls, values: T.Sequence[T.Optional[str]]) -> "MemStrColumn":
+        term2code: T.Dict[str, int] = {}
+        codes = np.array(
+            [NULL_CODE if value is None else term2code.setdefault(str(value), len(term2code))
+             for value in values],
+            dtype=np.int32)
+        return cls(codes, list(term2code))
+
+    def where_terms(self, term_matches: T.Iterable[bool]) -> np.ndarray:
+        """Mask of the rows whose string matches, by matches of `vocabulary`"""
+        # the extra last item is False, for NULL codes (-1)
+        lookup = np.zeros(len(self.vocabulary) + 1, dtype=bool)
+        lookup[:len(self.vocabulary)] = list(term_matches)
+        return lookup[self.codes]
+
+    def compare(self, op: T.Callable, value: _VT) -> np.ndarray:
+        if isinstance(value, bool):
+            value = int(value)
+        value = str(value)
+        return self.where_terms(op(term, value) for term in self.vocabulary)
+
+    def like(self, pattern: str) -> np.ndarray:
+        """Rows matching a LIKE `pattern`, which ignores the case of ASCII only"""
+        regex = re.compile(like_to_regex(pattern).pattern, re.S | re.I | re.A)
+        return self.where_terms(regex.fullmatch(term) is not None
+                                for term in self.vocabulary)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+
+class MemTable:
+    """Rows of a model as columns, in the order of the primary key
+
+    `constructions` are the ids of the constructions the rows belong to,
+    -1 for rows of no construction."""
+    def __init__(self, columns: T.Dict[str, MemColumn], n_rows: int,
+                 construction_key: T.Optional[str]=None) -> None:
+        self.columns = columns
+        self.n_rows = n_rows
+
+        self.constructions = None
+        if construction_key is not None:
+            key = columns[construction_key]
+            self.constructions = np.where(key.valid, key.values, -1)
+
+    @classmethod
+    def from_connection(cls, conn, model,
+                        construction_key: T.Optional[str]=None) -> "MemTable":
+        table = model.__table__
+        rows = conn.execute(select(table).order_by(*table.primary_key.columns)).all()
+
+        columns = {}
+        for i, column in enumerate(table.columns):
+            values = [row[i] for row in rows]
+            if isinstance(column.type, (Integer, Boolean)):
+                columns[column.key] = MemIntColumn.from_values(values)
+            else:
+                columns[column.key] = MemStrColumn.from_values(values)
+        return cls(columns, len(rows), construction_key)
+
+    def get(self, name: str) -> T.Optional[MemColumn]:
+        return self.columns.get(name)
+
+    def __getitem__(self, name: str) -> MemColumn:
+        return self.columns[name]
+
+    def all_rows(self) -> np.ndarray:
+        return np.ones(self.n_rows, dtype=bool)
+
+    def of_constructions(self, construction_ids: np.ndarray) -> np.ndarray:
+        """Mask of the rows of constructions `construction_ids`"""
+        return np.isin(self.constructions, construction_ids)
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+
+class MemStore:
+    """The tables searched by `MemQuery`, loaded into memory"""
+    def __init__(self, tables: T.Dict[T.Any, MemTable]) -> None:
+        self.tables = tables
+
+    @classmethod
+    def from_connection(cls, conn) -> "MemStore":
+        return cls({
+            model: MemTable.from_connection(conn, model, construction_key)
+            for model, construction_key in MODEL2CONSTRUCTION_KEY.items()
+        })
+
+    def __getitem__(self, model) -> MemTable:
+        return self.tables[model]
+
+    def construction_rows(self, construction_ids: T.Iterable[int]) -> T.List[T.Dict]:
+        """Rows of constructions as `SQLQuery` selects them: id, formula, name"""
+        constructions, general_info = self.tables[Construction], self.tables[GeneralInfo]
+        formula, name = constructions["formula"], general_info["name"]
+        id2row = {construction_id: i
+                  for i, construction_id in enumerate(constructions.constructions)}
+
+        rows = []
+        for construction_id in construction_ids:
+            code = formula.codes[id2row[construction_id]]
+            for i in np.flatnonzero(general_info.constructions == construction_id):
+                rows.append({
+                    "id": int(construction_id),
+                    "formula": None if code == NULL_CODE else formula.vocabulary[code],
+                    "name": (None if name.codes[i] == NULL_CODE
+                             else name.vocabulary[name.codes[i]]),
+                })
+        return rows
+
+
+_cache = GenerationCache(MemStore.from_connection)
+
+
+def get_memory_store(engine) -> MemStore:
+    """The store of `engine`'s data, reloaded once the data generation changes"""
+    return _cache.get(engine)
+
+
+class MemQueryMeta(PrefixedQueryMeta):
+    _was_registry_copied = False
+
+
+class MemStringPattern(StringPattern, metaclass=MemQueryMeta):
+    def __init__(self, param: str, value: str, **kwargs) -> None:
+        super().__init__(param, process_pattern(value))
+        self.fields_queried = [param]
+
+    def where(self, table: MemTable) -> np.ndarray:
+        norm_column = table.get(self.param + SEARCH_NORM_SUFFIX)
+        if norm_column is not None:
+            return norm_column.like(normalize_search_text(self.pattern))
+        return table[self.param].like(self.pattern)
+
+    def query(self, rows: np.ndarray, subform: T.Optional["MemSubForm"]=None,
+              query_model: T.Optional["MemQuery"]=None, **kwargs) -> np.ndarray:
+        return rows & self.where(query_model.table(subform))
+
+
+class MemFormulaElementPattern(MemStringPattern):
+    """A formula token, see `SQLFormulaElementPattern`"""
+    def __init__(self, param: str, value: str, **kwargs) -> None:
+        self.features = parse_gloss(value)
+        super().__init__(param, value)
+
+    def where(self, table: MemTable) -> np.ndarray:
+        if self.features is None:
+            return super().where(table)
+
+        rows = table.all_rows()
+        for key, feature in self.features.items():
+            rows &= table[key].compare(operator.eq, feature)
+        return rows
+
+
+class MemTokensQuery(BaseQueryElement, metaclass=MemQueryMeta):
+    """Constructions whose main formula has consecutive elements matching the
+    tokens of `value`, see `SQLTokensQuery`"""
+    _args = ("param", "value", "skip_optional")
+
+    def __init__(self, param: str, value: str, skip_optional: bool=False,
+                 **kwargs) -> None:
+        super().__init__()
+        self.param = param
+        self.value = value
+        self.skip_optional = skip_optional
+
+        self.tokens = [MemFormulaElementPattern("value", pat)
+                       for pat in tokenize_formula_query(value)]
+        self.fields_queried = [param]
+
+    def match(self, store: MemStore) -> np.ndarray:
+        """Ids of the constructions matched"""
+        elements = store[FormulaElement]
+        in_formulas = elements.constructions >= 0
+        if not self.tokens:
+            return np.unique(elements.constructions[in_formulas])
+        if self.skip_optional:
+            return self.match_linked(store, in_formulas)
+
+        # (construction, position) as a single key, a token's positions
+        # shifted to the start of the match are intersected with the others'
+        order: MemIntColumn = elements["order"]
+        in_formulas &= order.valid
+        stride = order.values.max(initial=0) + len(self.tokens) + 1
+        keys = elements.constructions * stride + order.values
+
+        starts = None
+        for i, tok in enumerate(self.tokens):
+            tok_starts = keys[in_formulas & tok.where(elements)] - i
+            starts = tok_starts if starts is None else np.intersect1d(starts, tok_starts)
+        return np.unique(starts // stride)
+
+    def match_linked(self, store: MemStore, in_formulas: np.ndarray) -> np.ndarray:
+        """Follow `FormulaElementNext` links from the first token's elements"""
+        elements, links = store[FormulaElement], store[FormulaElementNext]
+        element_ids = elements["id"].values
+        link_from = links["element_id"].values
+        link_to = links["next_element_id"].values
+        link_to_rows = np.searchsorted(element_ids, link_to)
+
+        # elements the matches have got to
+        reached = element_ids[in_formulas & self.tokens[0].where(elements)]
+        for tok in self.tokens[1:]:
+            if tok.features is None:
+                tok_links = links["next_value"].like(normalize_search_text(tok.pattern))
+            else:
+                tok_links = tok.where(elements)[link_to_rows]
+            reached = np.unique(link_to[tok_links & np.isin(link_from, reached)])
+
+        return np.unique(elements.constructions[np.searchsorted(element_ids, reached)])
+
+    def query(self, rows: np.ndarray, subform: T.Optional["MemSubForm"]=None,
+              query_model: T.Optional["MemQuery"]=None, **kwargs) -> np.ndarray:
+        table = query_model.table(subform)
+        return rows & table.of_constructions(self.match(query_model.store))
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.param, self.value, self.skip_optional})"
+
+    def __str__(self) -> str:
+        return f'{self.param}={[f"{tok.__tree_repr__()}" for tok in self.tokens].__str__()}'
+
+    def __tree_repr__(self) -> str:
+        return self.__str__()
+
+    def canonical(self) -> "MemTokensQuery":
+        value = " ".join(collapse_wildcards(self.value).split())
+        if value == self.value:
+            return self
+        canonical = copy(self)
+        canonical.value = value
+        return canonical
+
+
+class MemSubForm(SubForm, metaclass=MemQueryMeta):
+    """Evaluates its content on the rows of its model of the constructions
+    found so far, returns the constructions left"""
+    def __init__(self, name: str, content: BaseQueryElement) -> None:
+        if not name in MAPPING:
+            raise ValueError(f"model unknown: {name}")
+
+        super().__init__(name, content)
+
+        self.fields_queried = content.fields_queried
+        self.sql_model = MAPPING[name]
+
+    def query(self, rows: np.ndarray, subform: T.Optional["MemSubForm"]=None,
+              query_model: T.Optional["MemQuery"]=None, **kwargs) -> np.ndarray:
+        constructions = query_model.store[Construction]
+        table = query_model.table(self)
+
+        content_rows = table.of_constructions(constructions.constructions[rows])
+        content_rows = self.content.query(content_rows, self, query_model, **kwargs)
+        return rows & constructions.of_constructions(table.constructions[content_rows])
+
+
+class MemConjunction(Conjunction, metaclass=MemQueryMeta):
+    def __init__(self, items: T.List[BaseQueryElement]) -> None:
+        super().__init__(items)
+
+        self.fields_queried = sum([item.fields_queried for item in items], [])
+
+    def query(self, rows: np.ndarray, subform: T.Optional[MemSubForm]=None,
+              query_model: T.Optional["MemQuery"]=None, **kwargs) -> np.ndarray:
+        for item in self.items:
+            rows = item.query(rows, subform, query_model, **kwargs)
+
+        return rows
+
+
+class MemConjunctionCopies(ConjunctionCopies, metaclass=MemQueryMeta):
+    """Each item is matched by a row of its own, see `SQLConjunctionCopies`"""
+    def __init__(self, items: T.List[BaseQueryElement]) -> None:
+        super().__init__(items)
+
+        self.fields_queried = sum([item.fields_queried for item in items], [])
+
+    def query(self, rows: np.ndarray, subform: MemSubForm,
+              query_model: "MemQuery", **kwargs) -> np.ndarray:
+        table = query_model.table(subform)
+        for item in self.items:
+            item_rows = item.query(rows, subform, query_model, **kwargs)
+            rows = rows & table.of_constructions(table.constructions[item_rows])
+
+        return rows
+
+
+class MemDisjunction(Disjunction, metaclass=MemQueryMeta):
+    """Rows matched by any of the items, see `SQLDisjunction`"""
+    def __init__(self, items: T.List[BaseQueryElement]) -> None:
+        super().__init__(items)
+
+        self.fields_queried = sum([item.fields_queried for item in items], [])
+
+    def query(self, rows: np.ndarray, subform: T.Optional[MemSubForm]=None,
+              query_model: T.Optional["MemQuery"]=None, **kwargs) -> np.ndarray:
+        found = np.zeros_like(rows)
+        for item in self.items:
+            found |= item.query(rows, subform, query_model, **kwargs)
+
+        return found
+
+
+class MemNegation(Negation, metaclass=MemQueryMeta):
+    """Rows the item doesn't match (NULLs included), see `SQLNegation`"""
+    def __init__(self, item: BaseQueryElement) -> None:
+        super().__init__(item)
+
+        self.fields_queried = []
+
+    def query(self, rows: np.ndarray, subform: T.Optional[MemSubForm]=None,
+              query_model: T.Optional["MemQuery"]=None, **kwargs) -> np.ndarray:
+        return rows & ~self.item.query(rows, subform, query_model, **kwargs)
+
+
+class MemComparison(Comparison, metaclass=MemQueryMeta):
+    def __init__(self, param: str, op: OperatorsStr | Operators, value: _VT) -> None:
+        super().__init__(param, op, value)
+
+        self.fields_queried = [param]
+
+    def _query(self, column: MemColumn) -> np.ndarray:
+        return column.compare(self.op, self.value)
+
+    def query(self, rows: np.ndarray, subform: T.Optional[MemSubForm]=None,
+              query_model: T.Optional["MemQuery"]=None, **kwargs) -> np.ndarray:
+        table = query_model.table(subform)
+
+        norm_column = table.get(self.param + SEARCH_NORM_SUFFIX)
+        if (norm_column is not None and self.op is operator.eq
+                and isinstance(self.value, str)):
+            return rows & norm_column.compare(
+                operator.eq, normalize_search_text(self.value))
+
+        column = table.get(self.param)
+        if column is None:
+            print(f"skipping {self}")
+            return rows
+        return rows & self._query(column)
+
+
+class MemBetweenComparison(BetweenComparison, metaclass=MemQueryMeta):
+    def __init__(self, param: str, value_from: _VT, value_to: _VT) -> None:
+        super().__init__(param, value_from, value_to)
+
+        self.fields_queried = [param]
+
+    def _query(self, column: MemColumn) -> np.ndarray:
+        return column.between(self.value_from, self.value_to)
+
+    def query(self, rows: np.ndarray, subform: T.Optional[MemSubForm]=None,
+              query_model: T.Optional["MemQuery"]=None, **kwargs) -> np.ndarray:
+        column = query_model.table(subform).get(self.param)
+        if column is None:
+            print(f"skipping {self}")
+            return rows
+        return rows & self._query(column)
+
+
+class MemComplexQuery(BaseQueryElement, metaclass=MemQueryMeta):
+    _args = ("method",)
+
+    def __init__(self, method: T.Union[MemComparison, MemBetweenComparison]) -> None:
+        self.fields_queried = []
+        self.method = method
+
+    def query(self, rows, subform, query_model, **kwargs) -> np.ndarray: ...
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.method!r})"
+
+    def __tree_repr__(self) -> str:
+        return self.__str__()
+
+    def canonical(self) -> T.Optional["MemComplexQuery"]:
+        method = self.method.canonical()
+        if method is None:
+            return None
+        canonical = copy(self)
+        canonical.method = method
+        return canonical
+
+    def to_json(self) -> T.Dict[str, T.Any]:
+        return {"kind": self.kind, "method": self.method.to_json()}
+
+
+class MemStatsQuery(MemComplexQuery):
+    """A comparison on a precomputed `ConstructionStats` column"""
+    stats_column: str
+
+    def query(self, rows: np.ndarray, subform: T.Optional[MemSubForm]=None,
+              query_model: T.Optional["MemQuery"]=None, **kwargs) -> np.ndarray:
+        stats = query_model.store[ConstructionStats]
+        found = stats.constructions[self.method._query(stats[self.stats_column])]
+        return rows & query_model.table(subform).of_constructions(found)
+
+    def __str__(self) -> str:
+        return self.method._str(
+            param=f"{ConstructionStats.__tablename__}.{self.stats_column}")
+
+
+class MemNumChangesQuery(MemStatsQuery):
+    stats_column = "num_changes"
+
+
+class MemAnchorLengthQuery(MemStatsQuery):
+    stats_column = "anchor_length"
+
+
+class MemDurationQuery(MemComplexQuery):
+    def query(self, rows: np.ndarray, subform: T.Optional[MemSubForm]=None,
+              query_model: T.Optional["MemQuery"]=None, **kwargs) -> np.ndarray:
+        table = query_model.table(subform)
+        return rows & self.method._query(table["last_year_hi"] - table["first_year_lo"])
+
+    def __str__(self) -> str:
+        return self.method._str(param="(last_year_hi - first_year_lo)")
+
+
+class MemYearRangeQuery(MemComplexQuery):
+    """Attestation year (a range of years) overlapping the queried years"""
+    PARAM2COLUMNS = SQLYearRangeQuery.PARAM2COLUMNS
+
+    def query(self, rows: np.ndarray, subform: T.Optional[MemSubForm]=None,
+              query_model: T.Optional["MemQuery"]=None, **kwargs) -> np.ndarray:
+        table = query_model.table(subform)
+        lo, hi = [table[column] for column in self.PARAM2COLUMNS[self.method.param]]
+
+        method = self.method
+        if isinstance(method, BetweenComparison):
+            return (rows & hi.compare(operator.ge, method.value_from)
+                    & lo.compare(operator.le, method.value_to))
+        elif method.op in (operator.gt, operator.ge):
+            return rows & method._query(hi)
+        elif method.op in (operator.lt, operator.le):
+            return rows & method._query(lo)
+        return (rows & lo.compare(operator.le, method.value)
+                & hi.compare(operator.ge, method.value))
+
+    def __str__(self) -> str:
+        return self.method._str(
+            param="[{}, {}]".format(*self.PARAM2COLUMNS[self.method.param]))
+
+
+class MemQuery(BaseQuery, metaclass=MemQueryMeta):
+    """Parses forms as `SQLQuery` does, evaluates them on a `MemStore`"""
+    def __init__(
+        self, store: MemStore,
+        form2derivable_fields: T.Optional[T.Dict[str, T.List[ElementDerivation]]]=None,
+        skip_optional: bool=False,
+    ) -> None:
+        super().__init__(form2derivable_fields)
+        self.store = store
+        self.skip_optional = skip_optional
+
+        self.subforms_used: T.List[MemSubForm] = []
+
+    def table(self, subform: T.Optional[MemSubForm]) -> MemTable:
+        """The table elements of `subform` are evaluated on"""
+        if subform is None:
+            return self.store[Construction]
+        return self.store[subform.sql_model]
+
+    def parse(self, form, form_name=None):
+        if isinstance(form, dict) and SKIP_OPTIONAL_KEY in form:
+            self.skip_optional = bool(form.pop(SKIP_OPTIONAL_KEY))
+        return super().parse(form, form_name)
+
+    def parse_val(self, form_name: str, key: str, val: str) -> BaseQueryElement:
+        if form_name == "construction":
+            if key == "formula":
+                return MemTokensQuery(key, val, skip_optional=self.skip_optional)
+            elif key in ("anchor_schema", "anchor_ru"):
+                return MemStringPattern(key, val)
+
+        if form_name == "general_info" and key == "name":
+            return MemStringPattern(key, val)
+
+        if key == "text" and form_name in ("change", "changes", "text"):
+            raise NotImplementedError("full-text search needs the FTS index")
+
+        if form_name == "change" and key == "stage":
+            return MemTokensQuery(key, val, skip_optional=self.skip_optional)
+
+        return super().parse_val(form_name, key, val)
+
+    def parse_form_name(self, form_name: str) -> str:
+        if form_name == "anchor":
+            return "construction"
+
+        return super().parse_form_name(form_name)
+
+    def query(self) -> np.ndarray:
+        """Ids of the constructions found, in order"""
+        constructions = self.store[Construction]
+        # as the base statement of `SQLQuery` joins `GeneralInfo`
+        rows = constructions.of_constructions(self.store[GeneralInfo].constructions)
+
+        rows = self.form.query(rows, None, self)
+        return constructions.constructions[rows]
+
+
+class MemValueBetweenDerivation(ValueBetweenDerivation, metaclass=MemQueryMeta): ...
+
+
+def _between_derivation(param: str) -> MemValueBetweenDerivation:
+    return MemValueBetweenDerivation.from_ends_keys(
+        f"{param}__from", f"{param}__to",
+        comparison_model=MemComparison,
+        comparison_between_model=MemBetweenComparison,
+    )
+
+
+deriv = {
+    "construction": [
+        ComplexFieldDerivation(_between_derivation("num_changes"), MemNumChangesQuery),
+        ComplexFieldDerivation(_between_derivation("anchor_length"), MemAnchorLengthQuery),
+    ],
+    "changes": [
+        ComplexFieldDerivation(_between_derivation("duration"), MemDurationQuery),
+        ComplexFieldDerivation(_between_derivation("first_attested"), MemYearRangeQuery),
+        ComplexFieldDerivation(_between_derivation("last_attested"), MemYearRangeQuery),
+    ]}
+
+
+def default_memquery(store: MemStore, skip_optional: bool=False):
+    return MemQuery(store, deriv, skip_optional=skip_optional)
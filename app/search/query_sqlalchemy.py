@@ -1,15 +1,28 @@
+from copy import copy
+from itertools import chain
+import json
 import typing as T
+import operator
 import re
 
 import sqlalchemy.sql.expression
 from sqlalchemy import (
+    JSON,
+    Float,
     select,
     inspect,
     func,
     or_,
     and_,
     distinct,
+    false,
+    literal,
+    literal_column,
+    except_,
+    intersect,
+    union,
 )
+from sqlalchemy.sql.selectable import CompoundSelect
 from sqlalchemy.orm import (
     aliased,
     joinedload,
@@ -18,6 +31,7 @@ from sqlalchemy.orm import (
     load_only
 )
 import sqlalchemy
+from sqlalchemy.sql.operators import custom_op
 
 from app.models import (
     Construction,
@@ -25,9 +39,25 @@ from app.models import (
     GeneralInfo,
     Constraint,
     FormulaElement,
+    FormulaElementNext,
     ConstructionVariant,
+    ConstructionStats,
+    GLOSS_RE,
+    SEARCH_NORM_SUFFIX,
+    TRIGRAM_COLUMNS,
+    TRIGRAM_MIN_LEN,
+    change_fts,
+    normalize_fts_text,
+    normalize_search_text,
+    trigram_table,
 )
 
+from app.search.formula_index import MAX_CHAR, FormulaIndex
+from app.search.selectivity import (
+    DEFAULT_FULL_TEXT,
+    DEFAULT_RANGE,
+    SelectivityStats,
+)
 from app.search.query import (
     _VT,
     BasicFormType,
@@ -35,7 +65,7 @@ from app.search.query import (
     FormType,
     Operators,
     OperatorsStr,
-    QueryMeta,
+    PrefixedQueryMeta,
     BaseQuery,
     BaseQueryElement,
     SubForm,
@@ -45,8 +75,11 @@ from app.search.query import (
     BinaryConnective,
     Conjunction,
     ConjunctionCopies,
+    Disjunction,
+    Negation,
     ValueWithSignDerivation,
     ValueBetweenDerivation,
+    collapse_wildcards,
     form,
     deriv,
 )
@@ -59,7 +92,11 @@ DBModel: T.TypeAlias = T.Type[T.Union[
 
 INPUT_WILDCARDS = ["*"]
 OUT_WILDCARD = "%"
+OUT_WILDCARDS = (OUT_WILDCARD, "_")
+out_wildcards_re = re.compile(r"|".join(re.escape(wc) for wc in OUT_WILDCARDS))
 input_wildcards_re = re.compile(r"|".join(re.escape(wc) for wc in INPUT_WILDCARDS))
+# form key of the flag letting formula tokens skip optional elements
+SKIP_OPTIONAL_KEY = "skip_optional"
 
 
 MAPPING = {
@@ -68,6 +105,8 @@ MAPPING = {
     "changes": Change,
     # derived
     "anchor": Construction,
+    # full-text search over the texts of changes
+    "text": Change,
 }
 
 _change = {
@@ -86,59 +125,87 @@ def sub_wildcards(s: str):
     return input_wildcards_re.sub(OUT_WILDCARD, s)
 
 
-def tokenize_formula_query(query: str):
-    return [
-        sub_wildcards(tok)
-        for tok in query.split()
-    ]
+def like_normalized(column, pattern: str):
+    """`column`, a normalized copy, is LIKE normalized `pattern`
 
+    A literal prefix of the pattern also becomes a range of `column`, which
+    its index answers; a pattern with no wildcards is an equality."""
+    pattern = normalize_search_text(pattern)
+    wildcard_at = min((i for i, char in enumerate(pattern) if char in OUT_WILDCARDS),
+                      default=None)
+    if wildcard_at is None:
+        return column == pattern
 
-class SQLQueryMeta(QueryMeta):
-    _was_registry_copied = False
+    prefix = pattern[:wildcard_at]
+    if not prefix:
+        return column.like(pattern)
 
-    def __new__(
-        __mcls: type[T.Self], name: str, bases: tuple[type, ...],
-        namespace: dict[str, T.Any], **kwargs: T.Any
-    ) -> T.Self:
-        BASE_REGISTRY = __mcls.REGISTRY
+    in_range = and_(column >= prefix, column < prefix + MAX_CHAR)
+    if pattern == prefix + OUT_WILDCARD:
+        return in_range
+    return and_(in_range, column.like(pattern))
 
-        if not __mcls._was_registry_copied:
-            __mcls.REGISTRY = dict(BASE_REGISTRY)
-            __mcls._was_registry_copied = True
 
-        allowed_base_classes = BASE_REGISTRY.values()
-        allowed_base_classes_names = list(BASE_REGISTRY)
+# one operator for all statements: operators made by `.op()` anew are equal, but
+# hash by identity, so statements using them never hit the compiled cache
+MATCH = custom_op("MATCH")
 
-        cls_name = __mcls.__name__
-        parent_cls_name = __mcls.__bases__[0].__name__
-        maybe_prefix = cls_name.removesuffix(parent_cls_name)
 
-        # print(name, bases, namespace)
-        # print(parent_cls_name, allowed_base_classes_names)
-        print(cls_name, parent_cls_name, maybe_prefix)
+def trigram_prefilter(sql_model: DBModel, param: str, pattern: str):
+    """Rows of `sql_model` whose trigram index has the literal parts of `pattern`
 
-        
-        if not any(base_cls in allowed_base_classes for base_cls in bases):
-            raise ValueError(
-                f"classes with this metaclass ({cls_name}) must base one of "
-                f"[{', '.join(allowed_base_classes_names)}]"
-            )
+    Only a prefilter, the pattern itself is still to be checked. None if
+    `param` is not indexed or no part is long enough to be looked up."""
+    model = inspect(sql_model).mapper.class_
+    if param not in TRIGRAM_COLUMNS.get(model, ()):
+        return None
 
-        name_no_prefix = name.removeprefix(maybe_prefix)
-        if (not name.startswith(maybe_prefix)):
-            raise ValueError(
-                f"classes with this metaclass ({cls_name}) must have name that "
-                f"starts with `{maybe_prefix}`"
-            )
+    parts = [part for part in out_wildcards_re.split(normalize_search_text(pattern))
+             if len(part) >= TRIGRAM_MIN_LEN]
+    if not parts:
+        return None
 
-        new_cls = super().__new__(__mcls, name, bases, namespace, **kwargs)
-        new_cls.fields_queried = None
+    index = trigram_table(model)
+    match = " AND ".join(
+        f'{param} : "{part.replace(chr(34), chr(34) * 2)}"' for part in parts)
+    key = getattr(sql_model, inspect(model).primary_key[0].key)
+    return key.in_(select(index.c.rowid).where(
+        MATCH(literal_column(index.name), match)))
 
-        # pop prefixed name from the registry copy and replace the non-prefixed class
-        __mcls.REGISTRY.pop(name)
-        __mcls.REGISTRY[name_no_prefix] = new_cls
 
-        return new_cls
+def process_pattern(value: str) -> str:
+    """LIKE pattern of a searched value, an infix one if it has no wildcards"""
+    value = sub_wildcards(value)
+    if OUT_WILDCARD not in value:
+        value = f"{OUT_WILDCARD}{value}{OUT_WILDCARD}"
+    return value
+
+
+def tokenize_formula_query(query: str):
+    return [
+        sub_wildcards(tok)
+        for tok in query.split()
+    ]
+
+
+def parse_gloss(value: str) -> T.Optional[T.Dict[str, str]]:
+    """Features of a glossed formula token (`N-Gen*`), None if it isn't one"""
+    core = value.removesuffix(OUT_WILDCARD)
+    match = GLOSS_RE.fullmatch(core)
+    if match is None or not match["features"]:
+        return None
+
+    parsed = FormulaElement.parse_features(core)
+    features = {key: parsed[key] for key in ("pos", "case", "number")
+                if parsed[key] is not None}
+    # every feature must be known, otherwise it is left to the pattern
+    if len(match["features"].split(".")) != len(features) - 1:
+        return None
+    return features
+
+
+class SQLQueryMeta(PrefixedQueryMeta):
+    _was_registry_copied = False
 
 
 # class SQLConjunction(Conjunction, metaclass=SQLQueryMeta): ...
@@ -153,18 +220,57 @@ class SQLStringPattern(StringPattern, metaclass=SQLQueryMeta):
         self.sql_model = sql_model
 
     def process_value(self, value) -> str:
-        value = sub_wildcards(value)
-        if OUT_WILDCARD not in value:
-            value = f"{OUT_WILDCARD}{value}{OUT_WILDCARD}"
-        return value
+        return process_pattern(value)
 
     def query(self, stmt=None, model: T.Optional["SQLSubForm"]=None,
               query_model: T.Optional[BaseQuery] = None, 
               sql_model = None,
               **kwargs):
         sql_model = sql_model or self.sql_model or model.sql_model
+        prefilter = trigram_prefilter(sql_model, self.param, self.pattern)
+        if prefilter is not None:
+            stmt = stmt.where(prefilter)
+
+        norm_column = getattr(sql_model, self.param + SEARCH_NORM_SUFFIX, None)
+        if norm_column is not None:
+            return stmt.where(like_normalized(norm_column, self.pattern))
         return stmt.where(getattr(sql_model, self.param).ilike(self.pattern))
 
+    def selectivity(self, stats: SelectivityStats, sql_model: DBModel) -> float:
+        return pattern_selectivity(stats, self.sql_model or sql_model,
+                                   self.param, self.pattern)
+
+
+
+class SQLFormulaElementPattern(SQLStringPattern):
+    """A formula token, a pattern of `value` unless it is a glossed slot
+
+    A slot with a case or a number (`N-Gen*`, `NP-Dat`) is an equality on the
+    feature columns parsed at import, features it doesn't name are free."""
+    def __init__(self, param: str, value: str, sql_model: DBModel=None, **kwargs) -> None:
+        self.features = self.parse_gloss(value)
+        super().__init__(param, value, sql_model=sql_model)
+
+    parse_gloss = staticmethod(parse_gloss)
+
+    def query(self, stmt=None, model: T.Optional["SQLSubForm"]=None,
+              query_model: T.Optional[BaseQuery] = None,
+              sql_model = None,
+              **kwargs):
+        if self.features is None:
+            return super().query(stmt, model, query_model, sql_model=sql_model, **kwargs)
+
+        sql_model = sql_model or self.sql_model or model.sql_model
+        return stmt.where(*[getattr(sql_model, key) == feature
+                            for key, feature in self.features.items()])
+
+    def selectivity(self, stats: SelectivityStats, sql_model: DBModel) -> float:
+        if self.features is None:
+            return super().selectivity(stats, sql_model)
+        share = 1.
+        for key, feature in self.features.items():
+            share *= stats.eq(self.sql_model or sql_model, key, feature)
+        return share
 
 
 def _make_skip_optional_subquery(cur_elem, distance, model=FormulaElement):
@@ -223,14 +329,56 @@ def format_kwargs(kwargs: T.Dict[str, T.Any], joiner=", ") -> str:
     return joiner.join([f"{name!r}={val!r}" for name, val in kwargs.items()])
 
 
+# (model, number): alias, shared by all the statements
+_alias_pool: T.Dict[T.Tuple[T.Any, int], T.Any] = {}
+
+
+def pooled_alias(sql_model: DBModel, i: int):
+    """The `i`-th alias of `sql_model` from a process-wide pool
+
+    Statements of the same shape are then made of the same aliases: their
+    columns are adapted to an alias once, and SQLAlchemy's compiled cache
+    (keyed by the structure of statements) serves all of them."""
+    alias = _alias_pool.get((sql_model, i))
+    if alias is None:
+        alias = _alias_pool.setdefault((sql_model, i), aliased(sql_model))
+    return alias
+
+
+def primary_key(sql_model: DBModel):
+    """The primary key column of a model or of an alias of it"""
+    return getattr(sql_model, inspect(sql_model).mapper.primary_key[0].key)
+
+
+def estimate_selectivity(element: BaseQueryElement, stats: SelectivityStats,
+                         sql_model: DBModel) -> float:
+    """Estimated share of the rows of `sql_model` `element` matches, 1 if
+    the element can't tell"""
+    selectivity = getattr(element, "selectivity", None)
+    return 1. if selectivity is None else selectivity(stats, sql_model)
+
+
+def pattern_selectivity(stats: SelectivityStats, sql_model: DBModel,
+                        param: str, pattern: str) -> float:
+    pattern = normalize_search_text(pattern)
+    if not out_wildcards_re.search(pattern):
+        return stats.eq(sql_model, param, pattern)
+    return stats.like(sql_model, param, pattern)
+
+
 def make_aliases(
         sql_model: DBModel, n: int,
-        alias_adder: T.Optional[T.Callable[[DBModel], T.Any]]=None
+        alias_adder: T.Optional[T.Callable[[DBModel], T.Any]]=None,
+        query_model: T.Optional["SQLQuery"]=None,
     ) -> T.List[DBModel]:
     """Makes a list of `n` aliases with the model itself used in place of first alias
     
-    This prevents `cartesian product` — proliferation of unneeded columns"""
-    aliases = [aliased(sql_model) for i in range(n-1)]
+    This prevents `cartesian product` — proliferation of unneeded columns.
+    With `query_model` the aliases are pooled ones not yet used in its statement."""
+    if query_model is not None:
+        aliases = query_model.take_aliases(sql_model, n-1)
+    else:
+        aliases = [aliased(sql_model) for i in range(n-1)]
     if alias_adder:
         for alias in aliases:
             alias_adder(alias)
@@ -259,27 +407,75 @@ def get_restriction_maker(of_constr: bool, of_change: bool):
 
 
 class SQLTokensQuery(BaseQueryElement, metaclass=SQLQueryMeta):
-    def __init__(self, param: str, value: str, sql_model: DBModel=None, **kwargs) -> None:
+    """Formulas with consecutive elements matching the tokens of `value`
+
+    By default a self-join of `sql_model` per token; with `formula_index`
+    the matching constructions are looked up in the index instead.
+    With `skip_optional` optional (bracketed) elements may be skipped between
+    tokens: each token is then joined by a `FormulaElementNext` link."""
+    _args = ("param", "value", "skip_optional")
+
+    def __init__(self, param: str, value: str, sql_model: DBModel=None,
+                 formula_index: T.Optional[FormulaIndex]=None,
+                 skip_optional: bool=False, **kwargs) -> None:
         super().__init__()
         self.param = param
         self.value = value
+        self.skip_optional = skip_optional
         
-        tokens = [SQLStringPattern("value", pat) for pat in self.tokenize(value)]
+        tokens = [SQLFormulaElementPattern("value", pat) for pat in self.tokenize(value)]
         self.tokens: T.List[T.Union[SQLStringPattern, SQLComparison]] = tokens
 
-        self.fields_queried = [param]
+        self.fields_queried = [param] if formula_index is None else []
 
         self.sql_model = sql_model
+        self.formula_index = formula_index
     
     def tokenize(self, query: str) -> T.List[str]:
         return tokenize_formula_query(query)
+
+    def query_index(self, stmt):
+        construction_ids = self.formula_index.search(
+            [tok.pattern for tok in self.tokens], skip_optional=self.skip_optional)
+        return stmt.where(Construction.id.in_(sorted(construction_ids)))
+
+    def query_links(self, stmt, sql_model: DBModel,
+                    query_model: T.Optional["SQLQuery"]=None):
+        """Follow `FormulaElementNext` links from the first token's element"""
+        def take_alias(model):
+            if query_model is None:
+                return aliased(model)
+            return query_model.take_aliases(model, 1)[0]
+
+        tokens = self.tokens
+        stmt = tokens[0].query(stmt, sql_model=sql_model)
+
+        element_id = sql_model.id
+        for tok in tokens[1:]:
+            link = take_alias(FormulaElementNext)
+            stmt = stmt.join(link, link.element_id == element_id)
+            if tok.features is None:
+                stmt = stmt.where(like_normalized(link.next_value, tok.pattern))
+            else:
+                next_element = take_alias(FormulaElement)
+                stmt = stmt.join(next_element, next_element.id == link.next_element_id)
+                stmt = tok.query(stmt, sql_model=next_element)
+            element_id = link.next_element_id
+
+        return stmt
     
     def query(self, stmt, model: 'SQLSubForm', query_model: 'SQLQuery', **kwargs):
+        if self.formula_index is not None:
+            return self.query_index(stmt)
+
         tokens = self.tokens
         sql_model = self.sql_model or model.sql_model
+        if self.skip_optional:
+            return self.query_links(stmt, sql_model, query_model)
 
         # restriction_maker = get_restriction_maker(**kwargs)
-        model_aliases = make_aliases(sql_model, len(tokens), query_model.add_sql_model)
+        model_aliases = make_aliases(sql_model, len(tokens), query_model.add_sql_model,
+                                     query_model)
         for i, (tok, aliased_model) in enumerate(zip(tokens, model_aliases)):
             if i != 0:
                 stmt = stmt.where(
@@ -293,9 +489,17 @@ class SQLTokensQuery(BaseQueryElement, metaclass=SQLQueryMeta):
             stmt = tok.query(stmt, sql_model=aliased_model)
 
         return stmt
+
+    def selectivity(self, stats: SelectivityStats, sql_model: DBModel) -> float:
+        """Share of constructions with elements of all the tokens (in any order)"""
+        share = 1.
+        for tok in self.tokens:
+            share *= stats.per_construction(
+                FormulaElement, tok.selectivity(stats, FormulaElement))
+        return share
     
     def __repr__(self) -> str:
-        return f"{self.__class__.__name__}({self.param, self.value})"
+        return f"{self.__class__.__name__}({self.param, self.value, self.skip_optional})"
     
     def __str__(self) -> str:
         return f'{self.param}={[f"{tok.__tree_repr__()}" for tok in self.tokens].__str__()}'
@@ -303,6 +507,93 @@ class SQLTokensQuery(BaseQueryElement, metaclass=SQLQueryMeta):
     def __tree_repr__(self) -> str:
         return self.__str__()
 
+    def canonical(self) -> "SQLTokensQuery":
+        value = " ".join(collapse_wildcards(self.value).split())
+        if value == self.value:
+            return self
+        canonical = copy(self)
+        canonical.value = value
+        return canonical
+
+
+class SQLFullTextQuery(BaseQueryElement, metaclass=SQLQueryMeta):
+    """Changes whose texts (examples, comments, sources...) match all the words
+
+    Adds a `**`-highlighted snippet and the BM25 rank of the match to the
+    results, which are ordered by it. `word*` matches by prefix."""
+    _args = ("param", "value")
+    SNIPPET_LABEL = "text_snippet"
+    RANK_LABEL = "text_rank"
+    SNIPPET_N_TOKENS = 12
+
+    def __init__(self, param: str, value: str, sql_model: DBModel=None, **kwargs) -> None:
+        super().__init__()
+        self.param = param
+        self.value = value
+        self.match = self.make_match(value)
+
+        self.fields_queried = []
+        self.sql_model = sql_model
+
+    @staticmethod
+    def make_match(value: str) -> str:
+        """FTS5 query of the words, quoted so that no word is read as syntax"""
+        phrases = []
+        for word in normalize_fts_text(value).split():
+            is_prefix = word.endswith("*")
+            word = word.rstrip("*").replace('"', '""')
+            if word:
+                phrases.append(f'"{word}"' + ("*" if is_prefix else ""))
+        return " ".join(phrases)
+
+    @staticmethod
+    def _unique_label(stmt, label: str) -> str:
+        taken = set(stmt.selected_columns.keys())
+        i, unique_label = 1, label
+        while unique_label in taken:
+            i += 1
+            unique_label = f"{label}_{i}"
+        return unique_label
+
+    def query(self, stmt, subform: 'SQLSubForm', query_model: 'SQLQuery'=None,
+              **kwargs):
+        sql_model = self.sql_model or subform.sql_model
+        fts = literal_column(change_fts.name)
+
+        matches = select(
+            change_fts.c.rowid,
+            func.bm25(fts, type_=Float).label("rank"),
+            func.snippet(fts, -1, "**", "**", "…", self.SNIPPET_N_TOKENS)
+                .label("snippet"),
+        ).where(MATCH(fts, self.match)).subquery()
+
+        return stmt.join(matches, matches.c.rowid == sql_model.id).add_columns(
+            matches.c.snippet.label(self._unique_label(stmt, self.SNIPPET_LABEL)),
+            matches.c.rank.label(self._unique_label(stmt, self.RANK_LABEL)),
+        ).order_by(matches.c.rank)
+
+    def selectivity(self, stats: SelectivityStats, sql_model: DBModel) -> float:
+        return DEFAULT_FULL_TEXT
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.param!r}, {self.value!r})"
+
+    def __str__(self) -> str:
+        return f"{self.param} MATCH {self.match!r}"
+
+    def __tree_repr__(self) -> str:
+        return self.__str__()
+
+    def canonical(self) -> T.Optional["SQLFullTextQuery"]:
+        if not self.match:
+            return None
+        value = " ".join(self.value.split())
+        if value == self.value:
+            return self
+        canonical = copy(self)
+        canonical.value = value
+        return canonical
+
 
 class SQLSubForm(SubForm, metaclass=SQLQueryMeta):
     def __init__(self, name: str, content: BaseQueryElement) -> None:
@@ -313,6 +604,8 @@ class SQLSubForm(SubForm, metaclass=SQLQueryMeta):
 
         self.fields_queried = content.fields_queried
         self.sql_model = MAPPING[name]
+        # changes of `SQLConjunctionCopies` are semi-joined by the content itself
+        self.is_joined = not isinstance(content, ConjunctionCopies)
 
     def query(self, stmt = None, subform: T.Optional['SQLSubForm']=None, 
               query_model: T.Optional['SQLModel']=None, **kwargs):
@@ -320,6 +613,17 @@ class SQLSubForm(SubForm, metaclass=SQLQueryMeta):
             raise ValueError(f"empty `stmt`")
         return self.content.query(stmt, self, query_model, **kwargs)
 
+    def selectivity(self, stats: SelectivityStats, sql_model: DBModel) -> float:
+        """Share of constructions (semi-joined contents are of them already)"""
+        share = estimate_selectivity(self.content, stats, self.sql_model)
+        if not self.is_joined:
+            return share
+        return stats.per_construction(self.sql_model, share)
+
+    def is_used(self) -> bool:
+        """Whether it has conditions or columns, i.e. its model is to be joined"""
+        return bool(self.fields_queried) or self.canonical() is not None
+
 
 class SQLConjunction(Conjunction, metaclass=SQLQueryMeta):
     def __init__(self, items: T.List[BaseQueryElement]) -> None:
@@ -329,44 +633,138 @@ class SQLConjunction(Conjunction, metaclass=SQLQueryMeta):
 
     def query(self, stmt=None, subform: T.Optional[SQLSubForm]=None,
               query_model: T.Optional[BaseQuery]=None, **kwargs):
-        for item in self.items:
+        items = self.items
+        if query_model is not None:
+            items = query_model.plan(
+                items, Construction if subform is None else subform.sql_model)
+        for item in items:
             stmt = item.query(stmt, subform, query_model, **kwargs)
 
         return stmt
+
+    def selectivity(self, stats: SelectivityStats, sql_model: DBModel) -> float:
+        share = 1.
+        for item in self.items:
+            share *= estimate_selectivity(item, stats, sql_model)
+        return share
     
 
 class SQLConjunctionCopies(ConjunctionCopies, metaclass=SQLQueryMeta):
+    """Conditions on distinct changes of a construction, e.g. of a `ChangeForm` each
+
+    Every group of conditions is a correlated `EXISTS` over the changes of the
+    construction (by the index of `change.construction_id`) rather than a join
+    of a `Change` alias: the rows are not multiplied by the changes of each
+    group, a construction is found once. Columns an item adds (the snippet
+    and the rank of full-text search) come from the group's best match, and
+    `SQLQuery.matched_changes` adds the ids of the changes matched by each."""
+    MATCHED_LABEL = "matched_changes"
+
+    def __init__(self, items: T.List[BaseQueryElement]) -> None:
+        super().__init__(items)
+
+        # the matches are not joined, none of their columns is selected
+        self.fields_queried = []
+
+    def query(self, stmt, subform: SQLSubForm, query_model: 'SQLQuery', **kwargs) -> T.Any:
+        sql_model = subform.sql_model
+        item2matches = {}
+        for item in self.items:
+            alias = query_model.take_aliases(sql_model, 1)[0]
+            subform.sql_model = alias
+            matches = select(alias.id).select_from(alias).where(
+                alias.construction_id == Construction.id)
+            matches = item.query(matches, subform, query_model, **kwargs)
+            item2matches[id(item)] = matches
+
+            for column in list(matches.selected_columns)[1:]:
+                # a scalar subquery is of the first row (by the order of the
+                # item); no `LIMIT 1`, with which SQLite scans the full-text
+                # matches first instead of the changes of the construction
+                label = SQLFullTextQuery._unique_label(stmt, column.key)
+                best_column = matches.with_only_columns(column).scalar_subquery().label(label)
+                stmt = stmt.add_columns(best_column)
+                if column.key == SQLFullTextQuery.RANK_LABEL:
+                    # the best matches first, as with a join
+                    stmt = stmt.order_by(best_column)
+
+            if query_model.matched_changes:
+                matched = matches.with_only_columns(
+                    func.json_group_array(alias.id, type_=JSON)).order_by(None)
+                stmt = stmt.add_columns(matched.scalar_subquery().label(
+                    SQLFullTextQuery._unique_label(stmt, self.MATCHED_LABEL)))
+        subform.sql_model = sql_model
+
+        # SQLite checks the `EXISTS` in order: the most selective first, the
+        # columns (and the aliases) are still of the items in order
+        for item in query_model.plan(self.items, sql_model):
+            stmt = stmt.where(item2matches[id(item)].exists())
+
+        return stmt
+
+    def selectivity(self, stats: SelectivityStats, sql_model: DBModel) -> float:
+        """Share of constructions with a change of each group"""
+        share = 1.
+        for item in self.items:
+            share *= stats.per_construction(
+                sql_model, estimate_selectivity(item, stats, sql_model))
+        return share
+
+
+class SQLDisjunction(Disjunction, metaclass=SQLQueryMeta):
+    """Rows of the subform's model matching any of the items
+
+    Each item is an uncorrelated select of the model's keys, the selects are
+    united by `UNION`: SQLite plans each of them with its own index, which an
+    `OR` of their conditions on one row of the model would prevent."""
     def __init__(self, items: T.List[BaseQueryElement]) -> None:
         super().__init__(items)
 
         self.fields_queried = sum([item.fields_queried for item in items], [])
 
     def query(self, stmt, subform: SQLSubForm, query_model: 'SQLQuery', **kwargs) -> T.Any:
-        items = self.items
+        sql_model = subform.sql_model
+        # the table itself, even if an alias of it is queried
+        table_model = inspect(sql_model).mapper.class_
+        branch_subform = copy(subform)
+        branch_subform.sql_model = table_model
+
+        branches = [
+            item.query(select(primary_key(table_model)).correlate(None),
+                       branch_subform, query_model, **kwargs)
+            for item in self.items
+        ]
+        return stmt.where(primary_key(sql_model).in_(union(*branches)))
+
+    def selectivity(self, stats: SelectivityStats, sql_model: DBModel) -> float:
+        share_none = 1.
+        for item in self.items:
+            share_none *= 1 - estimate_selectivity(item, stats, sql_model)
+        return 1 - share_none
 
-        # print(subform)
 
-        
-        model_aliases = make_aliases(subform.sql_model, len(items),
-                                     query_model.add_sql_model)
-        print(f"{self.__class__.__name__} aliases: {model_aliases}")
-        # below has no effect since _base_statement is already made at this point
-        # for alias in model_aliases:
-        #     print(f"{self.__class__.__name__} adding {alias}")
-        #     query_model.add_sql_model(alias)
-
-
-        # TODO: fix, make better call(back)s
-        # [1:] because this is Change that is already joined in SQLQuery...
-        for alias in model_aliases[1:]:
-            print(f"{self.__class__.__name__} joining {alias}")
-            stmt = stmt.join_from(Construction, alias)
-        
-        for item, alias in zip(items, model_aliases):
-            subform.sql_model = alias
-            stmt = item.query(stmt, subform, orig_model=subform.sql_model, **kwargs)
+class SQLNegation(Negation, metaclass=SQLQueryMeta):
+    """Rows of the subform's model the item doesn't match: `NOT EXISTS` the row
+    matching it (an anti-join by the primary key)
 
-        return stmt
+    Unlike `NOT` of the item's conditions, rows with NULLs are found too."""
+    def __init__(self, item: BaseQueryElement) -> None:
+        super().__init__(item)
+
+        self.fields_queried = []
+
+    def query(self, stmt, subform: SQLSubForm, query_model: 'SQLQuery', **kwargs) -> T.Any:
+        sql_model = subform.sql_model
+        alias = query_model.take_aliases(inspect(sql_model).mapper.class_, 1)[0]
+        negated_subform = copy(subform)
+        negated_subform.sql_model = alias
+
+        matches = select(primary_key(alias)).where(primary_key(alias) == primary_key(sql_model))
+        matches = self.item.query(matches, negated_subform, query_model, **kwargs)
+        return stmt.where(~matches.exists())
+
+    def selectivity(self, stats: SelectivityStats, sql_model: DBModel) -> float:
+        return 1 - estimate_selectivity(self.item, stats, sql_model)
 
 
 def compare_sql_with_op(param, op: Operators, value: _VT):
@@ -393,6 +791,11 @@ class SQLComparison(Comparison, metaclass=SQLQueryMeta):
 
         final_param = self.param
         # final_param = MODEL2RENAMES.get(subform.name, {}).get(param, param)
+        norm_column = getattr(sql_entity, final_param + SEARCH_NORM_SUFFIX, None)
+        if (norm_column is not None and self.op is operator.eq
+                and isinstance(self.value, str)):
+            # case-insensitive, by the index of the normalized copy
+            return stmt.where(norm_column == normalize_search_text(self.value))
         try:
             # return stmt.where(self.op(getattr(sql_entity, final_param), self.value))
             return stmt.where(
@@ -401,9 +804,22 @@ class SQLComparison(Comparison, metaclass=SQLQueryMeta):
         except AttributeError as e:
             print(f"skipping {self}")
             return stmt
+
+    def selectivity(self, stats: SelectivityStats, sql_model: DBModel,
+                    column: T.Optional[str]=None) -> float:
+        column = column or self.param
+        if self.op is operator.eq:
+            return stats.eq(sql_model, column, self.value)
+        if self.op is operator.ne:
+            return 1 - stats.eq(sql_model, column, self.value)
+        if self.op in (operator.gt, operator.ge):
+            return stats.range(sql_model, column, lo=self.value)
+        if self.op in (operator.lt, operator.le):
+            return stats.range(sql_model, column, hi=self.value)
+        return DEFAULT_RANGE
         
 
-class SQLBetweenComparison(BetweenComparison):
+class SQLBetweenComparison(BetweenComparison, metaclass=SQLQueryMeta):
     def __init__(self, param: str, value_from: _VT, value_to: _VT) -> None:
         super().__init__(param, value_from, value_to)
 
@@ -422,15 +838,16 @@ class SQLBetweenComparison(BetweenComparison):
         try:
             # return stmt.where(getattr(sql_entity, final_param).between(value_from, value_to))
             return stmt.where(
-                self._query(
-                    getattr(sql_entity, final_param),
-                    self.value_from, self.value_to
-                )
+                self._query(getattr(sql_entity, final_param))
             )
         except AttributeError as e:
             print(f"skipping {self}")
             return stmt
 
+    def selectivity(self, stats: SelectivityStats, sql_model: DBModel,
+                    column: T.Optional[str]=None) -> float:
+        return stats.range(sql_model, column or self.param, self.value_from, self.value_to)
+
 
 class SQLNumChangesComparison(Comparison):
     def __init__(self, param: str, op: OperatorsStr | Operators, value: _VT) -> None:
@@ -451,6 +868,8 @@ class SQLNumChangesComparison(Comparison):
 
 
 class SQLComplexQuery(BaseQueryElement, metaclass=SQLQueryMeta):
+    _args = ("method",)
+
     def __init__(self, method: SQLComparison) -> None:
         self.fields_queried = []
         self.method = method
@@ -463,6 +882,23 @@ class SQLComplexQuery(BaseQueryElement, metaclass=SQLQueryMeta):
     def __tree_repr__(self) -> str:
         return self.__str__()
 
+    def canonical(self) -> T.Optional["SQLComplexQuery"]:
+        method = self.method.canonical()
+        if method is None:
+            return None
+        canonical = copy(self)
+        canonical.method = method
+        return canonical
+
+    def to_json(self) -> T.Dict[str, T.Any]:
+        return {"kind": self.kind, "method": self.method.to_json()}
+
+    def is_empty(self) -> bool:
+        return self.method.is_empty()
+
+    def selectivity(self, stats: SelectivityStats, sql_model: DBModel) -> float:
+        return DEFAULT_RANGE
+
 
 class ComplexFieldDerivation(ElementDerivation):
     def __init__(
@@ -480,17 +916,27 @@ class ComplexFieldDerivation(ElementDerivation):
         return None
 
 
-class SQLNumChangesQuery(SQLComplexQuery):
+class SQLStatsQuery(SQLComplexQuery):
+    """A comparison on a precomputed `ConstructionStats` column
+
+    `SQLQuery` joins `ConstructionStats` once for all of these."""
+    stats_column: str
+
     def query(self, stmt, subform: SubForm, query_model: BaseQuery, **kwargs) -> T.Any:
-        # assume Construction.id is always selected
-        stmt = stmt.group_by(Construction.formula).having(
-            # self.op(func.count(Construction.changes), self.value)
-            self.method._query(func.count(Construction.changes))
+        return stmt.where(
+            self.method._query(getattr(ConstructionStats, self.stats_column))
         )
-        return stmt
-    
+
+    def selectivity(self, stats: SelectivityStats, sql_model: DBModel) -> float:
+        return self.method.selectivity(stats, ConstructionStats, self.stats_column)
+
     def __str__(self) -> str:
-        return self.method._str(param="count(construction.changes)")
+        return self.method._str(
+            param=f"{ConstructionStats.__tablename__}.{self.stats_column}")
+
+
+class SQLNumChangesQuery(SQLStatsQuery):
+    stats_column = "num_changes"
 
 
 # class SQLNumChangesDerivation(ElementDerivation):
@@ -519,12 +965,12 @@ class SQLDurationComparison(Comparison):
     def query(self, stmt, subform: SubForm, query_model: BaseQuery, **kwargs) -> T.Any:
         sql_model = subform.sql_model
         stmt = stmt.where(
-            self.op((sql_model.last_attested - sql_model.first_attested), self.value) 
+            self.op((sql_model.last_year_hi - sql_model.first_year_lo), self.value) 
         )
         return stmt
 
     def __str__(self) -> str:
-        return f"(last_attested - first_attested) {self.op2sign(self.op)} {self.value}"
+        return f"(last_year_hi - first_year_lo) {self.op2sign(self.op)} {self.value}"
     
 
 class SQLDurationQuery(SQLComplexQuery):
@@ -532,13 +978,52 @@ class SQLDurationQuery(SQLComplexQuery):
         sql_model = subform.sql_model
         stmt = stmt.where(
             self.method._query(
-                sql_model.last_attested - sql_model.first_attested
+                sql_model.last_year_hi - sql_model.first_year_lo
             )
         )
         return stmt
     
     def __str__(self) -> str:
-        return self.method._str(param="(last_attested - first_attested)")
+        return self.method._str(param="(last_year_hi - first_year_lo)")
+
+
+class SQLYearRangeQuery(SQLComplexQuery):
+    """Attestation year (a range of years) overlapping the queried years"""
+    PARAM2COLUMNS = {
+        "first_attested": ("first_year_lo", "first_year_hi"),
+        "last_attested": ("last_year_lo", "last_year_hi"),
+    }
+
+    def query(self, stmt, subform: SubForm, query_model: BaseQuery, **kwargs) -> T.Any:
+        sql_model = subform.sql_model
+        lo, hi = [getattr(sql_model, column)
+                  for column in self.PARAM2COLUMNS[self.method.param]]
+
+        method = self.method
+        if isinstance(method, BetweenComparison):
+            return stmt.where(hi >= method.value_from, lo <= method.value_to)
+        elif method.op in (operator.gt, operator.ge):
+            return stmt.where(method._query(hi))
+        elif method.op in (operator.lt, operator.le):
+            return stmt.where(method._query(lo))
+        return stmt.where(lo <= method.value, hi >= method.value)
+
+    def selectivity(self, stats: SelectivityStats, sql_model: DBModel) -> float:
+        lo, hi = self.PARAM2COLUMNS[self.method.param]
+        method = self.method
+        if isinstance(method, BetweenComparison):
+            return (stats.range(sql_model, hi, lo=method.value_from)
+                    * stats.range(sql_model, lo, hi=method.value_to))
+        elif method.op in (operator.gt, operator.ge):
+            return stats.range(sql_model, hi, lo=method.value)
+        elif method.op in (operator.lt, operator.le):
+            return stats.range(sql_model, lo, hi=method.value)
+        return (stats.range(sql_model, lo, hi=method.value)
+                * stats.range(sql_model, hi, lo=method.value))
+
+    def __str__(self) -> str:
+        return self.method._str(
+            param="[{}, {}]".format(*self.PARAM2COLUMNS[self.method.param]))
 
 
 class SQLDurationDerivation(ElementDerivation):
@@ -560,33 +1045,17 @@ class SQLDurationDerivation2(ComplexFieldDerivation):
         super().__init__(comparison_derivation, result_type)
 
 
-class SQLAnchorLengthQuery(SQLComplexQuery):
-    def query(self, stmt, subform: SubForm, query_model: BaseQuery, **kwargs) -> T.Any:
-        print("stmt before anchor length: ", stmt)
-        
-        label = "anchor_length"
-        # assume Construction.id is always selected
-        subq = select(
-            FormulaElement.construction_id,
-            # FormulaElement.value
-            func.count(FormulaElement.value).label(f"{label}")
-        ).where(
-            FormulaElement.value >= 'А',  # cyrillic A
-        ).group_by(FormulaElement.construction_id).subquery()     
-
-        print("subquery:\n", subq)
-        print("stmt before:\n", stmt)
-        print("count subquery:\n", self.method._query(func.count(subq)))
-
-        stmt = stmt.add_columns(
-            getattr(subq.c, label)
-        ).join(subq).where(
-            self.method._query(getattr(subq.c, label))
-        )
-        return stmt
-    
-    def __str__(self) -> str:
-        return self.method._str(param="count(FormulaElement.value >= 'А')")
+class SQLYearRangeDerivation(ComplexFieldDerivation):
+    def __init__(
+        self, comparison_derivation: ElementDerivation,
+        result_type: T.Optional[T.Type[SQLComplexQuery]]=None
+    ) -> None:
+        result_type = result_type or SQLYearRangeQuery
+        super().__init__(comparison_derivation, result_type)
+
+
+class SQLAnchorLengthQuery(SQLStatsQuery):
+    stats_column = "anchor_length"
     
 
 class SQLAnchorLengthDerivation(ComplexFieldDerivation):
@@ -601,17 +1070,36 @@ class SQLAnchorLengthDerivation(ComplexFieldDerivation):
 
 class SQLQuery(BaseQuery, metaclass=SQLQueryMeta):
     def __init__(
-        self, form2derivable_fields: T.Optional[T.Dict[str, T.List[ElementDerivation]]]=None
+        self, form2derivable_fields: T.Optional[T.Dict[str, T.List[ElementDerivation]]]=None,
+        formula_index: T.Optional[FormulaIndex]=None,
+        skip_optional: bool=False,
+        matched_changes: bool=False,
+        selectivity: T.Optional[SelectivityStats]=None,
     ) -> None:
         super().__init__(form2derivable_fields)
+        # answers construction formula queries instead of `formula_element` joins
+        self.formula_index = formula_index
+        # whether formula tokens may skip optional elements, also set by a form
+        self.skip_optional = skip_optional
+        # whether to select the ids of the changes matched by each group of a form
+        self.matched_changes = matched_changes
+        # statistics to apply the most selective conditions first by, see `plan`
+        self.selectivity = selectivity
 
         self.sql_models_queried: T.Set[DBModel] = set()
         self.sql_models_to_query: T.Set[DBModel] = set()
 
         self.subforms_used: T.List[SQLSubForm] = []
+        # model: number of its pooled aliases taken by the statement being made
+        self.alias_counts: T.Dict[T.Any, int] = {}
+
+    def _make_construction_stmt(self, ids_only: bool=False):
+        """Make statement considered basic — a construction statement 
 
-    def _make_construction_stmt(self):
-        """Make statement considered basic — a construction statement """
+        With `ids_only` there are no columns of `GeneralInfo`, nor its join."""
+        if ids_only:
+            self.sql_models_queried |= {Construction}
+            return select(Construction.id)
         self.sql_models_queried |= {Construction, GeneralInfo}
         return select(
             Construction.id, Construction.formula, GeneralInfo.name
@@ -621,13 +1109,18 @@ class SQLQuery(BaseQuery, metaclass=SQLQueryMeta):
         print(f"attempting to join: {maybe_left} {maybe_right}")
         return stmt.join_from(maybe_left, maybe_right)
 
-    def _make_base_statement(self):
-        stmt = basic_stmt = self._make_construction_stmt()
-        print(basic_stmt)
+    def _make_base_statement(self, ids_only: bool=False):
+        # not printed: that would compile it on every search
+        # models joined are of this statement only
+        self.sql_models_queried = set()
+        stmt = self._make_construction_stmt(ids_only)
 
         # for subform in self.subforms_used:
         print("showing `sql_models_queried`:", self.sql_models_queried)
-        all_models = [subform.sql_model for subform in self.subforms_used] + list(self.sql_models_to_query)
+        # no join of a subform with no conditions nor columns
+        all_models = ([subform.sql_model for subform in self.subforms_used
+                       if subform.is_joined and subform.is_used()]
+                      + list(self.sql_models_to_query))
         print("all models", all_models, sep="\n")
         for sql_model in all_models: 
             if not sql_model in self.sql_models_queried:
@@ -636,7 +1129,7 @@ class SQLQuery(BaseQuery, metaclass=SQLQueryMeta):
                 self.sql_models_queried |= {sql_model}
 
         print("showing fields queried:")
-        for subform in self.subforms_used:
+        for subform in ([] if ids_only else self.subforms_used):
             print(subform.fields_queried)
             reduced_fields = set(subform.fields_queried)
             for field in reduced_fields:
@@ -647,26 +1140,61 @@ class SQLQuery(BaseQuery, metaclass=SQLQueryMeta):
 
         return stmt
     
+    def plan(self, items: T.List[BaseQueryElement],
+             sql_model: DBModel) -> T.List[BaseQueryElement]:
+        """`items` (conditions on rows of `sql_model`) to apply, in order
+
+        Items restricting nothing are dropped, the rest are by estimated
+        selectivity (the most selective first) with `selectivity` stats,
+        in their order otherwise."""
+        items = [item for item in items if item.canonical() is not None]
+        if self.selectivity is None:
+            return items
+        return sorted(items, key=lambda item: estimate_selectivity(
+            item, self.selectivity, sql_model))
+
+    def take_aliases(self, sql_model: DBModel, n: int) -> T.List[DBModel]:
+        """`n` pooled aliases of `sql_model` not yet used in the statement"""
+        start = self.alias_counts.get(sql_model, 0)
+        self.alias_counts[sql_model] = start + n
+        return [pooled_alias(sql_model, i) for i in range(start, start + n)]
+
     def add_sql_model(self, model: DBModel):
         print(f"adding model: {model}")
         print(f"before adding: {self.sql_models_to_query}")
         self.sql_models_to_query |= {model}
         print(f"after adding: {self.sql_models_to_query}")
 
+    def parse(self, form, form_name=None):
+        if isinstance(form, dict) and SKIP_OPTIONAL_KEY in form:
+            # a flag for the whole query rather than a field to filter by
+            self.skip_optional = bool(form.pop(SKIP_OPTIONAL_KEY))
+        return super().parse(form, form_name)
+
     def parse_val(self, form_name: str, key: str, val: str) -> BaseQueryElement:
         if form_name == "construction":
             if key == "formula":
+                if self.formula_index is not None:
+                    return SQLTokensQuery(key, val, formula_index=self.formula_index,
+                                          skip_optional=self.skip_optional)
                 self.sql_models_to_query |= {FormulaElement}
-                return SQLTokensQuery(key, val, sql_model=FormulaElement)
+                return SQLTokensQuery(key, val, sql_model=FormulaElement,
+                                      skip_optional=self.skip_optional)
             elif key in ("anchor_schema", "anchor_ru"):
-                # return SQLStringPattern(key, val)
-                return SQLTokensQuery
+                return SQLStringPattern(key, val)
+
+        if form_name == "general_info" and key == "name":
+            return SQLStringPattern(key, val)
 
-        elif form_name == "change":
+        if key == "text" and form_name in ("change", "changes", "text"):
+            return SQLFullTextQuery(key, val)
+
+        if form_name == "change":
             if key == "stage":
                 # return SQLStringPattern(key, value)
                 self.sql_models_to_query |= {FormulaElement}
-                return SQLTokensQuery(key, val, sql_model=FormulaElement)
+                return SQLTokensQuery(key, val, sql_model=FormulaElement,
+                                      skip_optional=self.skip_optional)
 
         return super().parse_val(form_name, key, val)
     
@@ -681,9 +1209,11 @@ class SQLQuery(BaseQuery, metaclass=SQLQueryMeta):
         if isinstance(
             maybe_derived_field,
             # (SQLNumChangesComparison, SQLNumChangesComparison2)
-            (SQLNumChangesComparison, SQLNumChangesQuery)
+            SQLNumChangesComparison
         ):
             self.add_sql_model(Change)
+        elif isinstance(maybe_derived_field, SQLStatsQuery):
+            self.add_sql_model(ConstructionStats)
 
         return maybe_derived_field
     
@@ -693,12 +1223,69 @@ class SQLQuery(BaseQuery, metaclass=SQLQueryMeta):
 
         return super().parse_form_name(form_name)
 
-    def query(self, stmt=None, subform=None):
+    def query(self, stmt=None, subform=None, ids_only: bool=False):
         if stmt is None:
-            stmt = self._make_base_statement()
+            self.alias_counts = {}
+            if self.is_empty():
+                # nothing is to be looked up: SQLite reads no table for it
+                return self._make_construction_stmt(ids_only).where(false())
+            stmt = self._make_base_statement(ids_only)
             print(f"form query: made base statement")
         
         return self.form.query(stmt, subform, self)
+
+    def query_ids(self):
+        """Statement of the ids of the constructions found only (in no order)"""
+        return self.query(ids_only=True).with_only_columns(Construction.id).order_by(None)
+
+
+class SQLCompoundQuery:
+    """Constructions found by `SQLQuery`s combined by set operations, left to right
+
+    E.g. `SQLCompoundQuery([a, b, c], ["except", "union"])` is `(a EXCEPT b) UNION c`.
+    The queries are id-only selects of one compound statement, so the database
+    computes the combination; `query()` selects as `SQLQuery.query()` does."""
+    OPERATIONS = {"intersect": intersect, "union": union, "except": except_}
+
+    def __init__(self, queries: T.List[SQLQuery], operations: T.List[str]) -> None:
+        if len(operations) != len(queries) - 1:
+            raise ValueError(f"{len(queries)} queries need {len(queries) - 1} operations, "
+                             f"not {len(operations)}")
+        for operation in operations:
+            if operation not in self.OPERATIONS:
+                raise ValueError(f"unknown operation: {operation}")
+
+        self.queries = queries
+        self.operations = operations
+
+    def query_ids(self):
+        """The compound statement of the ids of the constructions found"""
+        # not correlated to a statement this one is a subquery of
+        stmt = self.queries[0].query_ids().correlate(None)
+        for operation, query in zip(self.operations, self.queries[1:]):
+            if isinstance(stmt, CompoundSelect):
+                # SQLite has no parenthesized compound statements
+                stmt = select(stmt.subquery().c.id)
+            stmt = self.OPERATIONS[operation](stmt, query.query_ids().correlate(None))
+        return stmt
+
+    def query(self):
+        return select(
+            Construction.id, Construction.formula, GeneralInfo.name
+        ).join_from(Construction, GeneralInfo).where(Construction.id.in_(self.query_ids()))
+
+    def is_empty(self) -> bool:
+        """Whether the combination provably finds nothing"""
+        is_empty = self.queries[0].is_empty()
+        for operation, query in zip(self.operations, self.queries[1:]):
+            if operation == "intersect":
+                is_empty = is_empty or query.is_empty()
+            elif operation == "union":
+                is_empty = is_empty and query.is_empty()
+        return is_empty
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.queries!r}, {self.operations!r})"
     
 
 class SQLValueBetweenDerivation(ValueBetweenDerivation, metaclass=SQLQueryMeta): ...
@@ -732,7 +1319,7 @@ dur_deriv = SQLDurationDerivation2(
     )
 )
 
-first_attested_deriv = SQLDurationDerivation2(
+first_attested_deriv = SQLYearRangeDerivation(
     SQLValueBetweenDerivation.from_ends_keys(
         "first_attested__from", "first_attested__to",
         comparison_model = SQLComparison,
@@ -740,7 +1327,7 @@ first_attested_deriv = SQLDurationDerivation2(
     )
 )
 
-last_attested_deriv = SQLDurationDerivation2(
+last_attested_deriv = SQLYearRangeDerivation(
     SQLValueBetweenDerivation.from_ends_keys(
         "last_attested__from", "last_attested__to",
         comparison_model = SQLComparison,
@@ -760,5 +1347,69 @@ deriv = {
     ]}
 
 
-def default_sqlquery():
-    return SQLQuery(deriv)
+def default_sqlquery(formula_index: T.Optional[FormulaIndex]=None,
+                     skip_optional: bool=False, matched_changes: bool=False,
+                     selectivity: T.Optional[SelectivityStats]=None):
+    return SQLQuery(deriv, formula_index=formula_index, skip_optional=skip_optional,
+                    matched_changes=matched_changes, selectivity=selectivity)
+
+
+# columns of a construction in every row of `SQLQuery`, the rest are of its matches
+CONSTRUCTION_COLUMNS = ("id", "formula", "name")
+AGGREGATED_ROWS_LABEL = "rows_json"
+
+
+def aggregate_by_construction(found, *criteria):
+    """A row per construction of subquery `found` (of `SQLQuery.query()`)
+
+    The construction's columns come once, the other columns of its rows as
+    a JSON array of objects (`json_group_array`), see `unpack_aggregated`."""
+    def json_value(column):
+        # JSON has 15 digits of a real, the text of 17 is the same double
+        if isinstance(column.type, Float):
+            return func.printf("%!.17g", column)
+        return column
+
+    match_columns = [column for column in found.c if column.key not in CONSTRUCTION_COLUMNS]
+    rows_json = func.json_group_array(func.json_object(
+        *chain.from_iterable((literal(column.key), json_value(column))
+                             for column in match_columns)))
+
+    return select(
+        *[found.c[key] for key in CONSTRUCTION_COLUMNS],
+        rows_json.label(AGGREGATED_ROWS_LABEL),
+    ).where(*criteria).group_by(found.c.id)
+
+
+def unpack_aggregated(
+    found, rows: T.Iterable[T.Mapping], dialect,
+) -> T.Iterator[T.Tuple[int, T.List[T.Dict[str, T.Any]]]]:
+    """(construction id, its rows as `SQLQuery.query()` selects them) of rows
+    of `aggregate_by_construction`
+
+    JSON has the values as the database does, the columns' result
+    processors make them what a row would have (e.g. booleans)."""
+    def of_float_text(processor):
+        def process(value):
+            value = None if value is None else float(value)
+            return value if processor is None else processor(value)
+        return process
+
+    processors = {}
+    for column in found.c:
+        # JSON (e.g. `matched_changes`) is nested as it is, not as text
+        if column.key not in CONSTRUCTION_COLUMNS and not isinstance(column.type, JSON):
+            processor = column.type.result_processor(dialect, None)
+            if isinstance(column.type, Float):
+                processor = of_float_text(processor)
+            if processor is not None:
+                processors[column.key] = processor
+
+    for row in rows:
+        construction = {key: row[key] for key in CONSTRUCTION_COLUMNS}
+        matches = []
+        for match in json.loads(row[AGGREGATED_ROWS_LABEL]):
+            for key, processor in processors.items():
+                match[key] = processor(match[key])
+            matches.append({**construction, **match})
+        yield construction["id"], matches
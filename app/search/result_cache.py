@@ -0,0 +1,91 @@
+"""Bounded LRU cache of search results
+
+Keyed by the canonical query (see `app.search.query.canonical_hash`) and
+checked against the data generation: the first lookup of a newer generation
+(i.e. after an import, see `refresh_after_import`) drops every entry.
+The cache is bounded by the number of result rows its entries hold, and an
+entry expires `ttl` seconds after it is stored.
+"""
+from collections import OrderedDict
+import threading
+import time
+import typing as T
+
+from app.metrics import metrics
+
+
+class ResultCache:
+    def __init__(
+        self, max_rows: int = 20000, ttl: float = 600.0, name: str = "search_cache",
+        clock: T.Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self.name = name
+        self.clock = clock
+
+        # key: (expires at, number of rows, value), least recently used first
+        self._entries: "OrderedDict[T.Hashable, T.Tuple[float, int, T.Any]]" = OrderedDict()
+        self.n_rows = 0
+        self.generation: T.Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _count(self, event: str, n: int = 1) -> None:
+        metrics.incr(f"{self.name}.{event}", n)
+
+    def _check_generation(self, generation: int) -> None:
+        if generation != self.generation:
+            if self._entries:
+                self._count("invalidations")
+            self._entries.clear()
+            self.n_rows = 0
+            self.generation = generation
+
+    def _pop(self, key: T.Hashable) -> None:
+        _, n_rows, _ = self._entries.pop(key)
+        self.n_rows -= n_rows
+
+    def get(self, key: T.Hashable, generation: int) -> T.Optional[T.Any]:
+        with self._lock:
+            self._check_generation(generation)
+
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                self._pop(key)
+                self._count("expirations")
+                entry = None
+
+            if entry is None:
+                self._count("misses")
+                return None
+
+            self._entries.move_to_end(key)
+            self._count("hits")
+            return entry[2]
+
+    def put(self, key: T.Hashable, generation: int, value: T.Any, n_rows: int) -> None:
+        """Store `value` of `n_rows` rows, evicting the least recently used"""
+        # an entry that doesn't fit would evict everything and itself;
+        # `max_rows` 0 disables the cache
+        if n_rows > self.max_rows or self.max_rows <= 0:
+            return
+
+        with self._lock:
+            self._check_generation(generation)
+            if key in self._entries:
+                self._pop(key)
+
+            while self._entries and self.n_rows + n_rows > self.max_rows:
+                self._pop(next(iter(self._entries)))
+                self._count("evictions")
+
+            self._entries[key] = (self.clock() + self.ttl, n_rows, value)
+            self.n_rows += n_rows
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.n_rows = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -14,6 +14,7 @@ from operator import (
 import sqlalchemy.sql.expression
 from sqlalchemy import (
     select,
+    func,
     or_,
     and_
 )
@@ -33,9 +34,12 @@ from app.models import (
     GeneralInfo,
     Constraint,
     FormulaElement,
+    FormulaElementNext,
+    normalize_search_text,
     ConstructionVariant
 )
 from app.search import bp
+from app.search.streaming import group_consecutive_rows, stream_rows, stream_template
 
 
 DBModel = Type[Union[
@@ -80,14 +84,6 @@ def make_basic_formula_query(stmt: sqlalchemy.sql.expression.Select,
     return stmt.where(getattr(model, column).like(f"%{value}%"))
 
 
-def _make_skip_optional_subquery(cur_elem, distance, model=FormulaElement):
-    return select(model.id).where(
-        FormulaElement.construction_id == cur_elem.construction_id,
-        FormulaElement.is_optional == True,
-        cur_elem.order == FormulaElement.order + distance,
-    )
-
-
 def make_byelem_formula_query(
     stmt: sqlalchemy.sql.expression.Select,
     model: Type[FormulaElement], value: str,
@@ -103,32 +99,20 @@ def make_byelem_formula_query(
     elements = value.split(' ')
     print(elements)
 
-    element_tables = [aliased(FormulaElement) for i in range(len(elements))]
-
-    # params = {}
-
-    stmt = stmt.where(getattr(model, 'id') == element_tables[0].construction_id)
-
-    for i, element_value in enumerate(elements):
-        cur_elem_table = element_tables[i]
-
-        # TODO: опционально пропускать при поиске по элементам те, что в скобках
-        # TODO: asterisk instead of element
-        if i != 0:
-            stmt = stmt.where(
-                cur_elem_table.construction_id == element_tables[0].construction_id,
-                or_(
-                    cur_elem_table.order == element_tables[i-1].order + 1,
-                    and_(
-                        cur_elem_table.order == element_tables[i-1].order + 2,
-                        _make_skip_optional_subquery(cur_elem_table, 1).exists()
-                    )
-                )
-            )
-
-        # params[f'gloss{i}'] = value  # or text(value)
-        corrected_val = element_value.replace('*', '%')
-        stmt = stmt.where(getattr(cur_elem_table, 'value').ilike(corrected_val))
+    first_table = aliased(FormulaElement)
+    stmt = stmt.where(getattr(model, 'id') == first_table.construction_id,
+                      first_table.value_norm.like(
+                          normalize_search_text(elements[0].replace('*', '%'))))
+
+    # optional (bracketed) elements are skipped by following the links
+    # the importer made, see `FormulaElementNext`
+    element_id = first_table.id
+    for element_value in elements[1:]:
+        link = aliased(FormulaElementNext)
+        corrected_val = normalize_search_text(element_value.replace('*', '%'))
+        stmt = stmt.where(link.element_id == element_id,
+                          link.next_value.like(corrected_val))
+        element_id = link.next_element_id
 
     return stmt
 
@@ -246,31 +230,17 @@ class BaseQuery:
         first_table = FormulaElement
 
         stmt = cur_stmt.where(formula_of_model.id == first_table.construction_id,
-                              first_table.value.ilike(first_element))
-
-        remaining_elements = elements[1:]
-        element_tables = (
-            [first_table]
-            + [aliased(FormulaElement) for _ in range(len(remaining_elements))]
-        )
-
-        for i, element_value in enumerate(remaining_elements):
-            cur_elem_table = element_tables[i]
-
-            # TODO: опционально пропускать при поиске по элементам те, что в скобках
-            # TODO: asterisk instead of element
-            stmt = stmt.where(
-                cur_elem_table.construction_id == first_table.construction_id,
-                or_(
-                    cur_elem_table.order == element_tables[i - 1].order + 1,
-                    and_(
-                        cur_elem_table.order == element_tables[i - 1].order + 2,
-                        _make_skip_optional_subquery(cur_elem_table, 1).exists()
-                    ))
-            )
-
-            # params[f'gloss{i}'] = value  # or text(value)
-            stmt = stmt.where(getattr(cur_elem_table, 'value').ilike(element_value))
+                              first_table.value_norm.like(
+                                  normalize_search_text(first_element)))
+
+        # optional (bracketed) elements are skipped by following the links
+        # the importer made, see `FormulaElementNext`
+        element_id = first_table.id
+        for element_value in elements[1:]:
+            link = aliased(FormulaElementNext)
+            stmt = stmt.where(link.element_id == element_id,
+                              link.next_value.like(normalize_search_text(element_value)))
+            element_id = link.next_element_id
 
         return stmt
 
@@ -523,15 +493,19 @@ def group_rows_by_construction(rows: List[Dict]) -> Dict:
     return row_id2data
 
 
+def reduce_construction_rows(results: List) -> List:
+    """A construction's rows, only the first one if they are just id and formula"""
+    one_res = results[0]
+    if len(one_res) == 2 and "id" in one_res and "formula" in one_res:
+        return [one_res]
+    return results
+
+
 def reduce_rows(rows: Dict):
     final_res = {}
     for constr_id, results in rows.items():
         print(constr_id, results)
-        one_res = results[0]
-        if len(one_res) == 2 and "id" in one_res and "formula" in one_res:
-            final_res[constr_id] = [one_res]
-        else:
-            final_res[constr_id] = results
+        final_res[constr_id] = reduce_construction_rows(results)
 
     return final_res
 
@@ -591,6 +565,34 @@ def search():
 
     stmt = build_query(query_args)
 
+    changes_queried = any(field in query_args for field in [
+        'change-1-stage', 'change-1-stage-abs', 'change-1-level',
+        'change-1-type_of_change', 'change-1-duration_sign'
+    ])
+
+    if query_args.get('stream'):
+        # all the results, rendered as they are fetched
+        found = stmt.subquery("found")
+        with current_app.engine.connect() as conn:
+            n_constructions = conn.execute(
+                select(func.count(found.c.id.distinct()))).scalar()
+        rows = stream_rows(current_app.engine, select(found).order_by(found.c.id))
+
+        return stream_template(
+            'search.html',
+            title='Поиск: результаты',
+            year=datetime.now().year,
+            meaning_values=meaning_values,
+            synt_functions_anchor=synt_functions_anchor,
+            types_of_change=types_of_change,
+            form_input=request.form,
+            results=((constr_id, reduce_construction_rows(results))
+                     for constr_id, results in group_consecutive_rows(rows)),
+            n_constructions=n_constructions,
+            query=query_args,
+            changes_queried=changes_queried
+        )
+
     with current_app.engine.connect() as conn:
         results = conn.execute(stmt).mappings().all()
 
@@ -606,11 +608,6 @@ def search():
     print(row_id2data)
     print("formula" in query_args, query_args, sep="\n")
 
-    changes_queried = any(field in query_args for field in [
-        'change-1-stage', 'change-1-stage-abs', 'change-1-level',
-        'change-1-type_of_change', 'change-1-duration_sign'
-    ])
-
     return render_template(
         'search.html',
         title='Поиск: результаты',
@@ -3,6 +3,7 @@ import typing as T
 from typing import Tuple, List, Dict, Union, Type, Optional
 
 from datetime import datetime
+from functools import wraps
 from itertools import chain
 import logging
 from operator import (
@@ -15,6 +16,7 @@ from operator import (
 import sqlalchemy.sql.expression
 from sqlalchemy import (
     select,
+    func,
     or_,
     and_
 )
@@ -28,8 +30,10 @@ from sqlalchemy.orm import (
 import wtforms
 import wtforms.validators
 from flask import current_app
-from flask import render_template, abort, request, redirect
+from flask import render_template, abort, request, redirect, jsonify
 from flask_wtf import FlaskForm
+from itsdangerous import BadSignature, URLSafeSerializer
+import numpy as np
 
 from app.models import (
     Construction,
@@ -37,11 +41,20 @@ from app.models import (
     GeneralInfo,
     Constraint,
     FormulaElement,
+    FormulaElementNext,
+    normalize_search_text,
     ConstructionVariant,
     DBModel,
     Model2Field2Val
 )
 import app.database
+from app.database_utils import get_data_generation
+from app.query_guard import (
+    QueryBudget,
+    QueryBudgetExceeded,
+    is_client_gone,
+    query_budget,
+)
 from app.search import bp
 from app.search.search_form import (
     make_sign_options_for_param,
@@ -52,13 +65,31 @@ from app.search.search_form import (
     BootstrapStringField,
     BootstrapIntegerField,
 )
+from app.search.explain import explain_search
+from app.search.facets import get_facet_index
+from app.search.formula_index import get_formula_index
+from app.search.selectivity import get_selectivity_stats
+from app.search.vocabulary import vocabulary_values
+from app.search.query_memory import (
+    default_memquery,
+    get_memory_store,
+)
+from app.search.query import canonical_json
+from app.search.streaming import (
+    STREAM_YIELD_PER,
+    group_consecutive_rows,
+    stream_json,
+    stream_rows,
+    stream_template,
+)
 from app.search.query_sqlalchemy import (
+    aggregate_by_construction,
     default_sqlquery,
+    unpack_aggregated,
+    SQLCompoundQuery,
+    SQLFullTextQuery,
     SQLQuery,
 )
-from app.utils import (
-    find_unique
-)
 
 
 logger = logging.getLogger(f"diachronicon.{__name__}")
@@ -95,14 +126,6 @@ def make_basic_formula_query(stmt: sqlalchemy.sql.expression.Select,
     return stmt.where(getattr(model, column).like(f"%{value}%"))
 
 
-def _make_skip_optional_subquery(cur_elem, distance, model=FormulaElement):
-    return select(model.id).where(
-        FormulaElement.construction_id == cur_elem.construction_id,
-        FormulaElement.is_optional == True,
-        cur_elem.order == FormulaElement.order + distance,
-    )
-
-
 def make_byelem_formula_query(
     stmt: sqlalchemy.sql.expression.Select,
     model: Type[FormulaElement], value: str,
@@ -118,32 +141,20 @@ def make_byelem_formula_query(
     elements = value.split(' ')
     print(elements)
 
-    element_tables = [aliased(FormulaElement) for i in range(len(elements))]
-
-    # params = {}
-
-    stmt = stmt.where(getattr(model, 'id') == element_tables[0].construction_id)
-
-    for i, element_value in enumerate(elements):
-        cur_elem_table = element_tables[i]
-
-        # TODO: опционально пропускать при поиске по элементам те, что в скобках
-        # TODO: asterisk instead of element
-        if i != 0:
-            stmt = stmt.where(
-                cur_elem_table.construction_id == element_tables[0].construction_id,
-                or_(
-                    cur_elem_table.order == element_tables[i-1].order + 1,
-                    and_(
-                        cur_elem_table.order == element_tables[i-1].order + 2,
-                        _make_skip_optional_subquery(cur_elem_table, 1).exists()
-                    )
-                )
-            )
-
-        # params[f'gloss{i}'] = value  # or text(value)
-        corrected_val = element_value.replace('*', '%')
-        stmt = stmt.where(getattr(cur_elem_table, 'value').ilike(corrected_val))
+    first_table = aliased(FormulaElement)
+    stmt = stmt.where(getattr(model, 'id') == first_table.construction_id,
+                      first_table.value_norm.like(
+                          normalize_search_text(elements[0].replace('*', '%'))))
+
+    # optional (bracketed) elements are skipped by following the links
+    # the importer made, see `FormulaElementNext`
+    element_id = first_table.id
+    for element_value in elements[1:]:
+        link = aliased(FormulaElementNext)
+        corrected_val = normalize_search_text(element_value.replace('*', '%'))
+        stmt = stmt.where(link.element_id == element_id,
+                          link.next_value.like(corrected_val))
+        element_id = link.next_element_id
 
     return stmt
 
@@ -172,7 +183,7 @@ def make_duration_query(stmt, model, _, params_values):
     logger.info(f"op and value are: {op} {duration_value}")
     return stmt.where(
         # op(model.last_attested - model.first_attested, duration_value)
-        op(getattr(model, "last_attested") - getattr(model, "first_attested"),
+        op(getattr(model, "last_year_hi") - getattr(model, "first_year_lo"),
            duration_value)
     )
 
@@ -261,31 +272,17 @@ class BaseQuery:
         first_table = FormulaElement
 
         stmt = cur_stmt.where(formula_of_model.id == first_table.construction_id,
-                              first_table.value.ilike(first_element))
-
-        remaining_elements = elements[1:]
-        element_tables = (
-            [first_table]
-            + [aliased(FormulaElement) for _ in range(len(remaining_elements))]
-        )
-
-        for i, element_value in enumerate(remaining_elements):
-            cur_elem_table = element_tables[i]
-
-            # TODO: опционально пропускать при поиске по элементам те, что в скобках
-            # TODO: asterisk instead of element
-            stmt = stmt.where(
-                cur_elem_table.construction_id == first_table.construction_id,
-                or_(
-                    cur_elem_table.order == element_tables[i - 1].order + 1,
-                    and_(
-                        cur_elem_table.order == element_tables[i - 1].order + 2,
-                        _make_skip_optional_subquery(cur_elem_table, 1).exists()
-                    ))
-            )
-
-            # params[f'gloss{i}'] = value  # or text(value)
-            stmt = stmt.where(getattr(cur_elem_table, 'value').ilike(element_value))
+                              first_table.value_norm.like(
+                                  normalize_search_text(first_element)))
+
+        # optional (bracketed) elements are skipped by following the links
+        # the importer made, see `FormulaElementNext`
+        element_id = first_table.id
+        for element_value in elements[1:]:
+            link = aliased(FormulaElementNext)
+            stmt = stmt.where(link.element_id == element_id,
+                              link.next_value.like(normalize_search_text(element_value)))
+            element_id = link.next_element_id
 
         return stmt
 
@@ -523,8 +520,8 @@ def build_query(
         # TODO: remove once searching many is supported
         break
 
-    print("final select is:",
-          stmt.compile(compile_kwargs={"literal_binds": True}), sep="\n")
+    # the SQL and the plan of a search: `app.search.explain`
+    print("final select is:", stmt, sep="\n")
 
     return stmt
 
@@ -658,10 +655,14 @@ class ConstructionForm(FlaskForm):
     formula = BootstrapStringField(
         label="Формула", name="formula",
     )
+    skip_optional = BootstrapBooleanField(
+        label="Пропускать необязательные элементы", name="skip_optional",
+        description="элементы формулы в скобках могут отсутствовать",
+    )
 
     _meaning_datalist_id = "meaning_values"
     # _meaning_values = safe_get(Construction.contemporary_meaning.unique) or MEANING_VALUES
-    _meaning_values = find_unique(Construction, "contemporary_meaning")
+    _meaning_values = vocabulary_values("meanings")
     _meaning_datalist = DataList(
         id=_meaning_datalist_id,
         literal_options=_meaning_values)
@@ -763,7 +764,7 @@ class ChangeForm(FlaskForm):
     # should be changed into select with multiple options
     _type_of_change_datalist_id = "types_of_change_values"
     # _types_of_change = safe_get(Change.type_of_change.unique) or TYPES_OF_CHANGE
-    _types_of_change = find_unique(Change, "type_of_change")
+    _types_of_change = vocabulary_values("types_of_change")
     _types_of_change_datalist = DataList(
         id=_type_of_change_datalist_id,
         literal_options=_types_of_change
@@ -776,7 +777,7 @@ class ChangeForm(FlaskForm):
 
     _subtype_of_change_datalist_id = "subtypes_of_change_values"
     # _types_of_change = safe_get(Change.type_of_change.unique) or TYPES_OF_CHANGE
-    _subtypes_of_change = find_unique(Change, "subtype_of_change")
+    _subtypes_of_change = vocabulary_values("subtypes_of_change")
     _subtypes_of_change_datalist = DataList(
         id=_subtype_of_change_datalist_id,
         literal_options=_subtypes_of_change
@@ -787,6 +788,9 @@ class ChangeForm(FlaskForm):
                        list=_subtype_of_change_datalist_id)
     )
 
+    text = BootstrapStringField(
+        label="Текст примеров, комментариев, ограничений", name="text")
+
     # _duration_sign_options, selected = make_sign_options_for_param("Длительность")
     # duration_sign = BoostrapSelectField(
     #     _duration_sign_options[0][1], name="duration_sign", 
@@ -832,8 +836,15 @@ class SingleForm(FlaskForm):
     anchor = wtforms.FormField(AnchorForm)
     changes = wtforms.FieldList(wtforms.FormField(ChangeForm), min_entries=3)
 
+SET_OPERATION_CHOICES = [("intersect", "и"), ("union", "или"), ("except", "но не")]
+
+
 class SearchForm(FlaskForm):
     forms = wtforms.FieldList(wtforms.FormField(SingleForm), min_entries=2)
+    # `operations-<i>` combines the constructions found so far with `forms-<i+1>`
+    operations = wtforms.FieldList(
+        wtforms.SelectField(choices=SET_OPERATION_CHOICES, default="intersect"),
+        min_entries=1)
     # submit = wtforms.SubmitField()
 
 
@@ -873,50 +884,485 @@ def search():
             query=request.args,
         )
 
+
+FACET_ARG_PREFIX = "facet-"
+CURSOR_SALT = "search-cursor"
+
+
+def get_facet_filters(args) -> Dict[str, List[str]]:
+    """Values of facets selected by `facet-<facet>` request arguments"""
+    return {key.removeprefix(FACET_ARG_PREFIX): args.getlist(key)
+            for key in args if key.startswith(FACET_ARG_PREFIX)}
+
+
+def get_page_size(args) -> int:
+    """`page_size` request argument, within `SEARCH_MAX_PAGE_SIZE`"""
+    page_size = args.get("page_size", type=int) or current_app.config["SEARCH_PAGE_SIZE"]
+    return max(1, min(page_size, current_app.config["SEARCH_MAX_PAGE_SIZE"]))
+
+
+def make_cursor(form_hash: str, after: Union[int, List], n_before: int) -> str:
+    """Signed cursor of the page after construction `after` of the query (its
+    id, or its [rank, id], see `search_page`)
+
+    `n_before` is the number of constructions on the pages before."""
+    serializer = URLSafeSerializer(current_app.config["SECRET_KEY"], salt=CURSOR_SALT)
+    return serializer.dumps([form_hash, after, n_before])
+
+
+def read_cursor(
+    cursor: Optional[str], form_hash: str,
+) -> Tuple[Optional[Union[int, List]], int]:
+    """(construction `after`, `n_before`) of the cursor, aborts on a forged one
+    or one of another query"""
+    if not cursor:
+        return None, 0
+
+    serializer = URLSafeSerializer(current_app.config["SECRET_KEY"], salt=CURSOR_SALT)
+    try:
+        cursor_hash, after, n_before = serializer.loads(cursor)
+    except (BadSignature, ValueError, TypeError):
+        abort(400, "invalid cursor")
+    if cursor_hash != form_hash:
+        abort(400, "cursor of another query")
+    return after, n_before
+
+
+def parse_search_form(form_data: Dict, matched_changes: bool = False) -> SQLQuery:
+    """`SQLQuery` of a `SingleForm`'s data"""
+    formula_index = None
+    if current_app.config.get("FORMULA_SEARCH_BACKEND") == "index":
+        formula_index = get_formula_index(current_app.engine)
+
+    query = default_sqlquery(formula_index, matched_changes=matched_changes,
+                             selectivity=get_selectivity_stats(current_app.engine))
+    # query.parse_form(form.data, do_extra_processing=True)
+    query.parse_form(form_data)
+    print("parsed form")
+    logger.info(f"query {query.form_hash()}: {canonical_json(query.canonical_form())}")
+    return query
+
+
+def cached_search(key: Tuple, search: T.Callable[[], T.Any],
+                  n_rows: T.Callable[[T.Any], int]) -> T.Any:
+    """`search()`, cached in `app.search_cache` by `key` (and the backend and
+    the database) until the data generation changes"""
+    key = (str(current_app.engine.url), current_app.config.get("SEARCH_BACKEND")) + key
+    with current_app.engine.connect() as conn:
+        generation = get_data_generation(conn)
+
+    found = current_app.search_cache.get(key, generation)
+    if found is None:
+        found = search()
+        current_app.search_cache.put(key, generation, found, n_rows=n_rows(found))
+    return found
+
+
+def memory_search_ids(form_data: Dict) -> Optional[np.ndarray]:
+    """Sorted ids found by the memory backend, if it's on and can search"""
+    if current_app.config.get("SEARCH_BACKEND") != "memory":
+        return None
+
+    store = get_memory_store(current_app.engine)
+    mem_query = default_memquery(store)
+    try:
+        mem_query.parse_form(form_data)
+    except NotImplementedError as e:
+        logger.info(f"memory backend can't search, searching by sql: {e}")
+        return None
+    return np.unique(mem_query.query())
+
+
+def narrow_found(found, only_ids: Optional[List[int]]) -> List:
+    """Conditions keeping only the constructions `only_ids` of `found`"""
+    return [] if only_ids is None else [found.c.id.in_(only_ids)]
+
+
+def count_found(found, narrowing: List):
+    """Statement counting the constructions of subquery `found`"""
+    return select(func.count(found.c.id.distinct())).where(*narrowing)
+
+
+# rank of constructions found without a full-text match (e.g. by another
+# branch of a disjunction): after all the matches
+NO_TEXT_RANK = float("inf")
+
+
+def best_text_rank(rows: List[Dict]) -> float:
+    ranks = [row[SQLFullTextQuery.RANK_LABEL] for row in rows
+             if row[SQLFullTextQuery.RANK_LABEL] is not None]
+    return min(ranks, default=NO_TEXT_RANK)
+
+
+def best_text_rank_column(found):
+    """Best full-text rank of a construction of subquery `found`, grouped by it"""
+    return func.coalesce(func.min(found.c[SQLFullTextQuery.RANK_LABEL]), NO_TEXT_RANK)
+
+
+class SearchPage(T.NamedTuple):
+    rows: List[Dict]
+    results_by_constr: Dict
+    # constructions found on all the pages
+    total: int
+    # the last construction of the page, if there are more: its id, or
+    # [best rank, id] if the text is searched
+    next_after: Optional[Union[int, List]]
+
+
+def search_page(
+    query: SQLQuery, form_data: Dict, after: Optional[Union[int, List]] = None,
+    page_size: int = 50, only_ids: Optional[List[int]] = None,
+) -> SearchPage:
+    """The rows of the `page_size` constructions after `after`
+
+    Keyset pagination: by id, or, if the text is searched, by the best
+    full-text rank of a construction and id, so the best matches come first
+    over all the pages. A construction is never split between pages, the
+    rows of a page come aggregated by construction (a row of each), and the
+    total is counted by a separate query. `only_ids` (e.g. of facets)
+    narrows what is found."""
+    if query.is_empty():
+        return SearchPage([], {}, 0, None)
+
+    def search() -> SearchPage:
+        ids = memory_search_ids(form_data)
+        if ids is not None:
+            if only_ids is not None:
+                ids = np.intersect1d(ids, only_ids)
+            total = len(ids)
+            if after is not None:
+                ids = ids[ids > after]
+            page_ids = ids[:page_size + 1].tolist()
+            rows = get_memory_store(current_app.engine).construction_rows(
+                page_ids[:page_size])
+            results_by_constr = group_rows_by_construction(rows)
+        else:
+            found = query.query().subquery("found")
+            print("made stmt")
+            print(query.form.tree())
+
+            narrowing = narrow_found(found, only_ids)
+            page_stmt = aggregate_by_construction(found, *narrowing)
+            is_ranked = SQLFullTextQuery.RANK_LABEL in found.c
+            if is_ranked:
+                best_rank = best_text_rank_column(found)
+                if after is not None:
+                    after_rank, after_id = after
+                    page_stmt = page_stmt.having(or_(
+                        best_rank > after_rank,
+                        and_(best_rank == after_rank, found.c.id > after_id)))
+                page_stmt = page_stmt.order_by(best_rank, found.c.id)
+            else:
+                if after is not None:
+                    page_stmt = page_stmt.where(found.c.id > after)
+                page_stmt = page_stmt.order_by(found.c.id)
+            page_stmt = page_stmt.limit(page_size + 1)
+
+            with current_app.engine.connect() as conn:
+                constructions = list(unpack_aggregated(
+                    found, conn.execute(page_stmt).mappings(), conn.dialect))
+                total = conn.execute(
+                    count_found(found, narrow_found(found, only_ids))).scalar()
+
+            page_ids = [[best_text_rank(rows_), construction_id] if is_ranked
+                        else construction_id for construction_id, rows_ in constructions]
+            constructions = constructions[:page_size]
+            results_by_constr = dict(constructions)
+            rows = [row for _, rows_ in constructions for row in rows_]
+
+        next_after = page_ids[page_size - 1] if len(page_ids) > page_size else None
+        return SearchPage(rows, results_by_constr, total, next_after)
+
+    only_key = None if only_ids is None else tuple(only_ids)
+    after_key = tuple(after) if isinstance(after, list) else after
+    return cached_search(("page", query.form_hash(), only_key, after_key, page_size),
+                         search, n_rows=lambda page: len(page.rows))
+
+
+def search_ids(query: SQLQuery, form_data: Dict) -> List[int]:
+    """Ids of all the constructions found, sorted"""
+    if query.is_empty():
+        return []
+
+    def search() -> List[int]:
+        ids = memory_search_ids(form_data)
+        if ids is not None:
+            return ids.tolist()
+
+        found = query.query().subquery("found")
+        with current_app.engine.connect() as conn:
+            return conn.execute(
+                select(found.c.id).distinct().order_by(found.c.id)).scalars().all()
+
+    return cached_search(("ids", query.form_hash()), search, n_rows=len)
+
+
+def stream_found(
+    query: Union[SQLQuery, SQLCompoundQuery], form_data: Optional[Dict],
+    only_ids: Optional[List[int]] = None, budget: Optional[QueryBudget] = None,
+) -> Tuple[int, T.Iterator[Tuple[int, List[Dict]]]]:
+    """The number of constructions found, and the constructions (by id) with
+    their rows, fetched and grouped while they are consumed
+
+    `query` may be a `SQLCompoundQuery` too, with no `form_data`. Fetching
+    the rows spends `budget`: they end when it's spent."""
+    if query.is_empty():
+        return 0, iter(())
+
+    # the memory backend has no rows of changes
+    ids = (None if form_data is None or query.matched_changes
+           else memory_search_ids(form_data))
+    if ids is not None:
+        if only_ids is not None:
+            ids = np.intersect1d(ids, only_ids)
+        store = get_memory_store(current_app.engine)
+        rows = (row for start in range(0, len(ids), STREAM_YIELD_PER)
+                for row in store.construction_rows(ids[start:start + STREAM_YIELD_PER].tolist()))
+        return len(ids), group_consecutive_rows(rows)
+
+    found = query.query().subquery("found")
+    narrowing = narrow_found(found, only_ids)
+    with current_app.engine.connect() as conn:
+        total = conn.execute(count_found(found, narrowing)).scalar()
+
+    stmt = aggregate_by_construction(found, *narrowing)
+    if SQLFullTextQuery.RANK_LABEL in found.c:
+        # the best matches first, as on pages
+        stmt = stmt.order_by(best_text_rank_column(found))
+    stmt = stmt.order_by(found.c.id)
+    return total, unpack_aggregated(
+        found, stream_rows(current_app.engine, stmt, budget=budget),
+        current_app.engine.dialect)
+
+
+def search_budget() -> T.ContextManager[QueryBudget]:
+    """Budget of the statements of a search request (`SEARCH_QUERY_MAX_*`),
+    cancelled when the client goes away"""
+    environ = request.environ
+    return query_budget(current_app.config.get("SEARCH_QUERY_MAX_STEPS"),
+                        current_app.config.get("SEARCH_QUERY_MAX_SECONDS"),
+                        is_cancelled=lambda: is_client_gone(environ))
+
+
+def stream_budget() -> QueryBudget:
+    """Budget of fetching streamed results: of VM steps only, as a client may
+    read them for long"""
+    return QueryBudget(current_app.config.get("SEARCH_QUERY_MAX_STEPS"))
+
+
+def guarded_search(view):
+    """The view's statements run within `search_budget`"""
+    @wraps(view)
+    def guarded_view(*args, **kwargs):
+        with search_budget():
+            return view(*args, **kwargs)
+
+    return guarded_view
+
+
+@bp.errorhandler(QueryBudgetExceeded)
+def refine_query(e: QueryBudgetExceeded):
+    """The search took too long: the form again, asking to refine it"""
+    logger.warning(f"search aborted: {e}")
+    if request.path.startswith("/api/"):
+        return jsonify({"error": "the query is too expensive, refine it",
+                        "reason": e.reason}), 422
+    return render_template("search_2.html", _form=SingleForm(), refine_query=True)
+
+
+def get_only_ids(args) -> Optional[List[int]]:
+    """Constructions of the facets selected by request arguments, if any"""
+    facet_filters = get_facet_filters(args)
+    if not facet_filters:
+        return None
+
+    facet_index = get_facet_index(current_app.engine)
+    try:
+        return facet_index.to_ids(facet_index.filter(facet_filters))
+    except ValueError as e:
+        abort(400, str(e))
+
+
 @bp.route('/form', methods=["POST"])
+@guarded_search
 def receive():
+    """Results of the search form, by pages; all of them, streamed, with `stream`
+
+    Fields of a `SearchForm` (`forms-<i>-...`) search by its forms combined,
+    see `parse_compound_form`: all the results, streamed."""
+    if any(key.startswith("forms-") for key in request.form):
+        budget = stream_budget()
+        total, constructions = stream_found(parse_compound_form(SearchForm()), None,
+                                            get_only_ids(request.values), budget)
+        return stream_template(
+            "search_2.html", _form=SingleForm(), results_by_constr=constructions,
+            use_constr=True, total=total, n_before=0, stream_budget=budget,
+        )
+
     form = SingleForm()
     print("in receive")
     print(form.is_submitted(), form.validate_on_submit())
 
     print(form.data)
 
-    query = default_sqlquery()
-    # query.parse_form(form.data, do_extra_processing=True)
-    query.parse_form(form.data)
+    only_ids = get_only_ids(request.values)
+    query = parse_search_form(form.data)
+    if request.values.get("stream"):
+        budget = stream_budget()
+        total, constructions = stream_found(query, form.data, only_ids, budget)
+        return stream_template(
+            "search_2.html", _form=form, results_by_constr=constructions,
+            use_constr=True, total=total, n_before=0, stream_budget=budget,
+        )
 
-    print("parsed form")
-    stmt = query.query()
-    print("made stmt")
+    form_hash = query.form_hash()
+    after, n_before = read_cursor(request.values.get("cursor"), form_hash)
+    page_size = get_page_size(request.values)
+    page = search_page(query, form.data, after, page_size, only_ids)
 
-    print(query.form.tree())
-    print(stmt)
-    print(stmt.compile(compile_kwargs={"literal_binds": True}))
+    next_cursor = None
+    if page.next_after is not None:
+        next_cursor = make_cursor(form_hash, page.next_after,
+                                  n_before + len(page.results_by_constr))
 
-    with current_app.engine.connect() as conn:
-        _results = conn.execute(stmt)
-        # return 0
-        results = _results.mappings().all()
-
-    # for res in results:
+    # for res in page.rows:
     #     print(res)
 
-    results_by_constr = group_rows_by_construction(results)
-    print(results_by_constr)
-
     return render_template(
-        "search_2.html", _form=form, results=results, 
-        results_by_constr=results_by_constr, use_constr=True
+        "search_2.html", _form=form, results=page.rows,
+        results_by_constr=page.results_by_constr, use_constr=True,
+        total=page.total, n_before=n_before, page_size=page_size,
+        next_cursor=next_cursor,
     )
 
 
+@bp.route('/api/search', methods=["POST"])
+@guarded_search
+def search_json():
+    """All the results of the search form as JSON, streamed:
+    `{"total": ..., "constructions": [{"id": ..., "rows": [...]}, ...]}`
+
+    With `matched_changes` the rows have the ids of the changes matched by
+    each of the change forms (`matched_changes`, `matched_changes_2`...).
+    Results cut by the query budget end with `"partial": <reason>`."""
+    form = SingleForm()
+    query = parse_search_form(form.data, bool(request.values.get("matched_changes")))
+    budget = stream_budget()
+    total, constructions = stream_found(query, form.data, get_only_ids(request.values),
+                                        budget)
+    return stream_constructions_json(total, constructions, budget)
+
+
+def stream_constructions_json(total: int, constructions: T.Iterable,
+                              budget: QueryBudget):
+    return stream_json(
+        {"total": total}, "constructions",
+        ({"id": construction_id, "rows": [dict(row) for row in rows]}
+         for construction_id, rows in constructions),
+        tail=lambda: {"partial": budget.exceeded} if budget.exceeded else {},
+    )
+
+
+def parse_compound_form(form: SearchForm) -> SQLCompoundQuery:
+    """`SQLCompoundQuery` of the filled forms of a `SearchForm`
+
+    An empty form finds everything: intersected it changes nothing and is
+    skipped, united or subtracted (or found so far by empty forms only and
+    then united or subtracted) it's an error."""
+    def entry_index(entry) -> int:
+        # entries are named by the indices of the request, `forms-2`
+        return int(entry.name.rsplit("-", 1)[-1])
+
+    index2operation = {entry_index(entry): entry.data for entry in form.operations}
+    queries, operations = [], []
+    for i, single_form in enumerate(form.forms):
+        query = parse_search_form(single_form.data)
+        operation = index2operation.get(entry_index(single_form) - 1) or "intersect"
+        is_empty = not query.canonical_form().items
+        if i and (is_empty or not queries) and operation != "intersect":
+            abort(400, f"an empty form finds everything, it can only be intersected, "
+                       f"not combined by {operation!r}")
+        if is_empty:
+            continue
+        if queries:
+            operations.append(operation)
+        queries.append(query)
+
+    if not queries:
+        abort(400, "all the forms are empty")
+    try:
+        return SQLCompoundQuery(queries, operations)
+    except ValueError as e:
+        abort(400, str(e))
+
+
+@bp.route('/api/search/compound', methods=["POST"])
+@guarded_search
+def search_compound_json():
+    """All the constructions found by the forms of `SearchForm` combined
+    (`forms-<i>-...`, `operations-<i>`: intersect, union or except), as JSON
+    of `search_json`; one compound statement finds them"""
+    form = SearchForm()
+    budget = stream_budget()
+    total, constructions = stream_found(parse_compound_form(form), None,
+                                        get_only_ids(request.values), budget)
+    return stream_constructions_json(total, constructions, budget)
+
+
+def render_found(rows: List[Dict]) -> str:
+    """Results of `rows` (of `SQLQuery.query()`) as `/form` renders them"""
+    results_by_constr = group_rows_by_construction(rows)
+    return render_template(
+        "_simple_search_result.html", results=rows, results_by_constr=results_by_constr,
+        use_constr=True, total=len(results_by_constr), n_before=0)
+
+
+@bp.route('/api/search/explain', methods=["POST"])
+@guarded_search
+def explain_search_json():
+    """Tree, SQL, query plan, row counts and timings of the search by the form
+    (fields of `/form`, or JSON as `SQLQuery.parse_form` takes), see
+    `app.search.explain`; in debug mode or with `SEARCH_EXPLAIN_ENABLED` only"""
+    if not (current_app.debug or current_app.config.get("SEARCH_EXPLAIN_ENABLED")):
+        abort(404)
+
+    form_data = request.get_json() if request.is_json else SingleForm().data
+    formula_index = None
+    if current_app.config.get("FORMULA_SEARCH_BACKEND") == "index":
+        formula_index = get_formula_index(current_app.engine)
+    return jsonify(explain_search(current_app.engine, form_data, formula_index,
+                                  render=render_found))
+
+
+@bp.route('/api/facets', methods=["GET", "POST"])
+@guarded_search
+def facet_counts():
+    """Counts of the values of every facet among the constructions found
+
+    POST searches by the form as `/form` does, GET counts all the
+    constructions; either can be narrowed by `facet-<facet>` arguments."""
+    facet_index = get_facet_index(current_app.engine)
+
+    found = None
+    if request.method == "POST":
+        form = SingleForm()
+        found = facet_index.bitset(search_ids(parse_search_form(form.data), form.data))
+    try:
+        found = facet_index.filter(get_facet_filters(request.values), found)
+    except ValueError as e:
+        abort(400, str(e))
+
+    return jsonify({"total": found.bit_count(), "facets": facet_index.counts(found)})
+
+
 class SimpleSearchForm(FlaskForm):
-    _construction_values = find_unique(Construction, "formula")
-    _construction_options, _selected = make_options_from_values(
-        _construction_values, "конструкцию")
+    _construction_values = vocabulary_values("construction_formulas")
+    # the explanation only, the values are added per form
+    _construction_options, _selected = make_options_from_values([], "конструкцию")
     formula = BoostrapSelectField(
         _construction_options[0][1], name="formula", 
-        choices=_construction_options,
+        choices=lambda: make_options_from_values(
+            SimpleSearchForm._construction_values(), "конструкцию")[0],
         render_kw=dict(selected=_selected))
     
     # submit = wtforms.SubmitField()
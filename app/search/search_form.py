@@ -40,11 +40,15 @@ def html_to_file(html, filename="search_form.html"):
 
 
 class DataList:
-    """datalist widget for html rendering"""
+    """datalist widget for html rendering
+
+    `literal_options` may be a callable, called on each rendering"""
     option_attrs2required = {"label": False, "value": True, "selected": False}
 
     def __init__(
-        self, id: str, literal_options: T.List[T.Union[int, str]] = None,
+        self, id: str,
+        literal_options: T.Union[T.List[T.Union[int, str]],
+                                 T.Callable[[], T.List[T.Union[int, str]]]] = None,
         with_attr_options: T.List[T.Dict[str, T.Union[str, int]]] = None,
     ):
         self.id = id
@@ -78,7 +82,10 @@ class DataList:
                 atrrs_str = widgets_html_params(**opt)
                 option_htmls.append(f"<option {atrrs_str}></option>")
         else:
-            for opt in self.literal_options:
+            literal_options = self.literal_options
+            if callable(literal_options):
+                literal_options = literal_options()
+            for opt in literal_options:
                 option_htmls.append(f'<option value="{opt}"></option>')
 
         # opening recieves indent in parent `str.join()`
@@ -283,6 +290,9 @@ class BootstrapCheckWidget:
         # if field.render_kw:
         #     attrs.update(field.render_kw)
         attrs = make_default_attrs(self, field, **kwargs)
+        if field.data:
+            # stays checked when the submitted form is shown again
+            attrs["checked"] = "checked"
         input_ = self.input_template.format(input_attrs=partial_order_html_params(attrs))
 
         outer_div_attrs = partial_order_html_params({"class": self.outer_div_class})
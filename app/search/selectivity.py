@@ -0,0 +1,266 @@
+"""Statistics to estimate the selectivity of search conditions by
+
+The share of rows a condition matches comes from histograms of the columns
+searched by values (`HISTOGRAM_COLUMNS`), from counts of the values of the
+columns searched by patterns (`PATTERN_COLUMNS`) or from `sqlite_stat1`
+(rows per value of indexed columns, made by `ANALYZE` in
+`refresh_after_import`); `SQLQuery` applies the most selective conditions
+first. Conditions without statistics get defaults close to SQLite's own
+guesses.
+"""
+from bisect import bisect_left, bisect_right
+import re
+import typing as T
+
+import sqlalchemy.exc
+from sqlalchemy import func, inspect, select, text
+
+from app.database_utils import GenerationCache
+from app.models import Change, Construction, ConstructionStats, FormulaElement
+
+
+DEFAULT_EQ = 0.1
+DEFAULT_RANGE = 1 / 3
+# a LIKE pattern with a literal prefix, any other one
+DEFAULT_PREFIX = 0.1
+DEFAULT_PATTERN = 0.25
+DEFAULT_FULL_TEXT = 0.05
+
+# columns compared to values or ranges and not indexed, or indexed but
+# skewed, e.g. `level` of changes
+HISTOGRAM_COLUMNS = {
+    Construction: ("in_rus_constructicon", "synt_function_of_anchor"),
+    Change: ("level", "type_of_change", "first_year_lo", "first_year_hi",
+             "last_year_lo", "last_year_hi"),
+    ConstructionStats: ("num_changes", "anchor_length", "first_attested",
+                        "last_attested", "duration"),
+}
+HISTOGRAM_BOUNDS = 100
+# at most this many distinct values are counted each
+MAX_FREQUENCIES = 100
+
+# (normalized) columns searched by LIKE patterns, e.g. formula tokens
+PATTERN_COLUMNS = {
+    FormulaElement: ("value_norm",),
+}
+# the most frequent values counted each, the rest in all
+MAX_PATTERN_VALUES = 5000
+
+LIKE_WILDCARDS = {"%": ".*", "_": "."}
+
+
+def table_name(sql_model) -> str:
+    """Table of a model or of an alias of it"""
+    return inspect(sql_model).mapper.local_table.name
+
+
+class ColumnHistogram:
+    """Rows of a column: counts of its values (if there are few) and
+    equi-depth bounds of the non-NULL ones"""
+    def __init__(self, n_rows: int, frequencies: T.Optional[T.Dict[T.Any, int]],
+                 bounds: T.List[T.Any], n_not_null: int) -> None:
+        self.n_rows = n_rows
+        self.frequencies = frequencies
+        self.bounds = bounds
+        self.n_not_null = n_not_null
+
+    @classmethod
+    def from_connection(cls, conn, column) -> "ColumnHistogram":
+        counts = conn.execute(
+            select(column, func.count()).group_by(column).limit(MAX_FREQUENCIES + 1)
+        ).all()
+        frequencies = dict(counts) if len(counts) <= MAX_FREQUENCIES else None
+
+        # the first value of each of equal parts of the values, and the last one
+        tiles = select(
+            column.label("value"),
+            func.ntile(HISTOGRAM_BOUNDS).over(order_by=column).label("tile"),
+        ).where(column.is_not(None)).subquery()
+        bounds = conn.execute(
+            select(func.min(tiles.c.value)).group_by(tiles.c.tile).order_by(tiles.c.tile)
+        ).scalars().all()
+        n_rows, n_not_null, last = conn.execute(
+            select(func.count(), func.count(column), func.max(column))
+        ).one()
+        if bounds:
+            bounds.append(last)
+        return cls(n_rows, frequencies, bounds, n_not_null)
+
+    def eq(self, value) -> T.Optional[float]:
+        if self.frequencies is None or not self.n_rows:
+            return None
+        return self.frequencies.get(value, 0) / self.n_rows
+
+    def range(self, lo=None, hi=None) -> T.Optional[float]:
+        """Share of the rows between `lo` and `hi` (either is open if None)"""
+        if not self.bounds or not self.n_rows:
+            return None
+        try:
+            start = 0 if lo is None else bisect_left(self.bounds, lo)
+            end = len(self.bounds) if hi is None else bisect_right(self.bounds, hi)
+        except TypeError:
+            # e.g. a string compared to numbers
+            return None
+        share = max(0, end - start) / len(self.bounds)
+        return share * self.n_not_null / self.n_rows
+
+
+def like_regex(pattern: str) -> "re.Pattern":
+    """Regular expression of a LIKE pattern (of a normalized value)"""
+    return re.compile("".join(LIKE_WILDCARDS.get(char) or re.escape(char)
+                              for char in pattern), re.DOTALL)
+
+
+def is_any(pattern: str) -> bool:
+    """Whether a LIKE pattern matches any value, e.g. `%`"""
+    return bool(pattern) and not pattern.strip("%")
+
+
+class ValueCounts:
+    """Rows of a column by value: of the most frequent values each, of the
+    rest in all"""
+    def __init__(self, n_rows: int, counts: T.Dict[str, int], n_other: int) -> None:
+        self.n_rows = n_rows
+        self.counts = counts
+        self.n_other = n_other
+
+    @classmethod
+    def from_connection(cls, conn, column) -> "ValueCounts":
+        n_rows, n_not_null = conn.execute(select(func.count(), func.count(column))).one()
+        counts = dict(conn.execute(
+            select(column, func.count().label("n")).where(column.is_not(None))
+            .group_by(column).order_by(text("n DESC")).limit(MAX_PATTERN_VALUES)
+        ).all())
+        return cls(n_rows, counts, n_not_null - sum(counts.values()))
+
+    def eq(self, value) -> T.Optional[float]:
+        if not self.n_rows or (value not in self.counts and self.n_other):
+            return None
+        return self.counts.get(value, 0) / self.n_rows
+
+    def like(self, pattern: str) -> T.Optional[float]:
+        """Share of the rows matching `pattern` (of normalized text)"""
+        if not self.n_rows:
+            return None
+        regex = like_regex(pattern)
+        n_matched = sum(count for value, count in self.counts.items()
+                        if regex.fullmatch(value))
+        # values not counted match as often as counted ones
+        n_counted = self.n_rows - self.n_other
+        if self.n_other and n_counted:
+            n_matched += self.n_other * n_matched / n_counted
+        return n_matched / self.n_rows
+
+
+class SelectivityStats:
+    """Row counts of tables, rows per value of indexed columns, histograms,
+    counts of values searched by patterns"""
+    def __init__(self, n_rows: T.Dict[str, int],
+                 rows_per_value: T.Dict[T.Tuple[str, str], float],
+                 histograms: T.Dict[T.Tuple[str, str], ColumnHistogram],
+                 value_counts: T.Optional[T.Dict[T.Tuple[str, str], ValueCounts]] = None,
+                 ) -> None:
+        self._n_rows = n_rows
+        self.rows_per_value = rows_per_value
+        self.histograms = histograms
+        self.value_counts = value_counts or {}
+
+    @classmethod
+    def from_connection(cls, conn) -> "SelectivityStats":
+        n_rows, rows_per_value = {}, {}
+        if conn.dialect.name == "sqlite":
+            try:
+                stat_rows = conn.execute(
+                    text("SELECT tbl, idx, stat FROM sqlite_stat1")).all()
+            except sqlalchemy.exc.OperationalError:
+                # never analyzed
+                stat_rows = []
+            for table, index, stat in stat_rows:
+                counts = [int(count) for count in stat.split()[:2]]
+                n_rows[table] = counts[0]
+                if index is None or len(counts) < 2:
+                    continue
+                columns = conn.exec_driver_sql(f'PRAGMA index_info("{index}")').all()
+                if columns:
+                    key = (table, columns[0][2])
+                    rows_per_value[key] = min(counts[1], rows_per_value.get(key, counts[1]))
+
+        histograms = {}
+        for sql_model, columns in HISTOGRAM_COLUMNS.items():
+            for column in columns:
+                histogram = ColumnHistogram.from_connection(conn, getattr(sql_model, column))
+                histograms[(table_name(sql_model), column)] = histogram
+                n_rows[table_name(sql_model)] = histogram.n_rows
+
+        value_counts = {}
+        for sql_model, columns in PATTERN_COLUMNS.items():
+            for column in columns:
+                counts = ValueCounts.from_connection(conn, getattr(sql_model, column))
+                value_counts[(table_name(sql_model), column)] = counts
+                n_rows[table_name(sql_model)] = counts.n_rows
+
+        return cls(n_rows, rows_per_value, histograms, value_counts)
+
+    def n_rows(self, sql_model) -> T.Optional[int]:
+        return self._n_rows.get(table_name(sql_model))
+
+    def eq(self, sql_model, column: str, value) -> float:
+        """Share of the rows of `sql_model` with `column` = `value`"""
+        table = table_name(sql_model)
+        histogram = self.histograms.get((table, column))
+        share = None if histogram is None else histogram.eq(value)
+        if share is not None:
+            return share
+        counts = (self.value_counts.get((table, column))
+                  or self.value_counts.get((table, column + "_norm")))
+        share = None if counts is None else counts.eq(value)
+        if share is not None:
+            return share
+
+        n_rows = self._n_rows.get(table)
+        # by the normalized copy, if the column has one
+        rows = (self.rows_per_value.get((table, column))
+                or self.rows_per_value.get((table, column + "_norm")))
+        if n_rows and rows:
+            return min(1., rows / n_rows)
+        if n_rows and column == "id":
+            return 1 / n_rows
+        return DEFAULT_EQ
+
+    def range(self, sql_model, column: str, lo=None, hi=None) -> float:
+        """Share of the rows of `sql_model` with `column` between `lo` and `hi`"""
+        histogram = self.histograms.get((table_name(sql_model), column))
+        share = None if histogram is None else histogram.range(lo, hi)
+        if share is not None:
+            return share
+        return DEFAULT_RANGE if lo is None or hi is None else DEFAULT_RANGE ** 2
+
+    def like(self, sql_model, column: str, pattern: str) -> float:
+        """Share of the rows of `sql_model` with `column` LIKE `pattern`
+        (of its normalized copy, if the column has one)"""
+        if is_any(pattern):
+            return 1.
+        table = table_name(sql_model)
+        counts = (self.value_counts.get((table, column + "_norm"))
+                  or self.value_counts.get((table, column)))
+        share = None if counts is None else counts.like(pattern)
+        if share is not None:
+            return share
+        if pattern[0] not in LIKE_WILDCARDS:
+            return DEFAULT_PREFIX
+        return DEFAULT_PATTERN
+
+    def per_construction(self, sql_model, share: float) -> float:
+        """Share of constructions with a row of `sql_model` of a `share` of them"""
+        n_rows, n_constructions = self.n_rows(sql_model), self.n_rows(Construction)
+        if not n_rows or not n_constructions or n_rows <= n_constructions:
+            return share
+        return 1 - (1 - share) ** (n_rows / n_constructions)
+
+
+_cache = GenerationCache(SelectivityStats.from_connection)
+
+
+def get_selectivity_stats(engine) -> SelectivityStats:
+    """Statistics of `engine`'s data, reloaded once the data generation changes"""
+    return _cache.get(engine)
@@ -0,0 +1,89 @@
+"""Streaming of large search results
+
+Rows are fetched from the cursor in batches (`stream_rows`), grouped by
+construction as they come (`group_consecutive_rows`, so they are to be
+ordered by construction) and rendered by a template or written as JSON
+while the response is sent: neither the time to the first byte nor the
+memory of a response depends on the number of results.
+"""
+from itertools import groupby
+import json
+import logging
+from operator import itemgetter
+import typing as T
+
+from flask import Response, current_app, stream_with_context
+
+from app.query_guard import QueryBudget, QueryBudgetExceeded, spending
+
+
+logger = logging.getLogger(f"diachronicon.{__name__}")
+
+
+STREAM_YIELD_PER = 500
+# template output is sent by this many pieces at once
+TEMPLATE_BUFFER_SIZE = 20
+
+
+def stream_rows(engine, stmt, yield_per: int = STREAM_YIELD_PER,
+                budget: T.Optional[QueryBudget] = None) -> T.Iterator:
+    """Mappings of the rows of `stmt`, fetched `yield_per` at a time
+
+    The connection is open until the rows are exhausted or the generator
+    is closed (e.g. when a client goes away). Fetching spends `budget`, if
+    any: once it's spent the rows end (its `exceeded` says why)."""
+    if budget is None:
+        budget = QueryBudget()
+    with engine.connect() as conn:
+        try:
+            with spending(budget):
+                result = conn.execution_options(stream_results=True).execute(stmt)
+            batches = result.mappings().partitions(yield_per)
+            while True:
+                with spending(budget):
+                    batch = next(batches, None)
+                if batch is None:
+                    break
+                yield from batch
+        except QueryBudgetExceeded as e:
+            logger.warning(f"streamed rows cut: {e}")
+
+
+def group_consecutive_rows(
+    rows: T.Iterable[T.Mapping], key: str = "id"
+) -> T.Iterator[T.Tuple[T.Any, T.List[T.Mapping]]]:
+    """(construction id, its rows) of rows ordered by construction
+
+    The streaming `group_rows_by_construction`: only one construction's rows
+    are kept at a time."""
+    for construction_id, group in groupby(rows, key=itemgetter(key)):
+        yield construction_id, list(group)
+
+
+def stream_template(template_name: str, **context) -> Response:
+    """`render_template` rendered while the response is sent
+
+    Iterables in `context` (e.g. of `group_consecutive_rows`) are consumed
+    as the template gets to them."""
+    current_app.update_template_context(context)
+    stream = current_app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(TEMPLATE_BUFFER_SIZE)
+    return Response(stream_with_context(stream), mimetype="text/html")
+
+
+def stream_json(head: T.Dict[str, T.Any], key: str, items: T.Iterable,
+                tail: T.Optional[T.Callable[[], T.Dict[str, T.Any]]] = None) -> Response:
+    """JSON object of `head` and an array `key` of `items`, written by items
+
+    `tail()` (after the items are written) adds the fields after the array."""
+    def generate():
+        opening = json.dumps({**head, key: []}, ensure_ascii=False)
+        # the array is last, so the object ends with `[]}`
+        yield opening[:-2]
+        for i, item in enumerate(items):
+            yield ("," if i else "") + json.dumps(item, ensure_ascii=False, default=str)
+        closing = json.dumps(tail() if tail is not None else {},
+                             ensure_ascii=False, default=str)
+        yield "]" + ("," + closing[1:] if closing != "{}" else "}")
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
@@ -0,0 +1,129 @@
+"""Values suggested by the search forms: meanings, types of change, formulas...
+
+Loaded on first use rather than when the forms are defined, so the app
+starts without a database, and reloaded once the data generation changes,
+i.e. after an import. With `VOCABULARY_PATH` configured they are read from
+a JSON file instead (reread when it changes), made by
+
+    python -m app.search.vocabulary -o vocabulary.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import typing as T
+
+from flask import current_app
+from sqlalchemy import select
+
+from app.database_utils import GenerationCache
+from app.models import Change, Construction, GeneralInfo
+
+
+# name: (model, column) of its values
+VOCABULARY_FIELDS = {
+    "meanings": (Construction, "contemporary_meaning"),
+    "types_of_change": (Change, "type_of_change"),
+    "subtypes_of_change": (Change, "subtype_of_change"),
+    "construction_formulas": (Construction, "formula"),
+    "construction_names": (GeneralInfo, "name"),
+}
+
+
+class Vocabulary:
+    """Sorted distinct non-NULL values of each of `VOCABULARY_FIELDS`"""
+    def __init__(self, values: T.Dict[str, T.List[str]]) -> None:
+        self.values = values
+
+    @classmethod
+    def from_connection(cls, conn) -> "Vocabulary":
+        values = {}
+        for name, (sql_model, field) in VOCABULARY_FIELDS.items():
+            column = getattr(sql_model, field)
+            values[name] = conn.execute(
+                select(column).distinct().where(column.is_not(None)).order_by(column)
+            ).scalars().all()
+        return cls(values)
+
+    @classmethod
+    def from_json(cls, path: str) -> "Vocabulary":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def to_json(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.values, f, ensure_ascii=False, indent=2)
+
+    def __getitem__(self, name: str) -> T.List[str]:
+        return self.values.get(name, [])
+
+
+_cache = GenerationCache(Vocabulary.from_connection)
+
+
+def get_vocabulary(engine) -> Vocabulary:
+    """The vocabulary of `engine`'s data, reloaded once the data generation changes"""
+    return _cache.get(engine)
+
+
+_path2loaded: T.Dict[str, T.Tuple[float, Vocabulary]] = {}
+_lock = threading.Lock()
+
+
+def load_vocabulary(path: str) -> Vocabulary:
+    """The vocabulary of a JSON file, reread once the file is modified"""
+    mtime = os.stat(path).st_mtime
+    loaded = _path2loaded.get(path)
+    if loaded is None or loaded[0] != mtime:
+        with _lock:
+            loaded = (mtime, Vocabulary.from_json(path))
+            _path2loaded[path] = loaded
+    return loaded[1]
+
+
+def current_vocabulary() -> Vocabulary:
+    """The vocabulary of the current app: of `VOCABULARY_PATH` if configured,
+    of its database otherwise"""
+    path = current_app.config.get("VOCABULARY_PATH")
+    if path:
+        return load_vocabulary(path)
+    return get_vocabulary(current_app.engine)
+
+
+def vocabulary_values(name: str) -> T.Callable[[], T.List[str]]:
+    """Values of `name` in the current app's vocabulary, when called; to
+    pass as options of forms defined before there is an app"""
+    assert name in VOCABULARY_FIELDS, f"unknown vocabulary: {name}"
+
+    def values() -> T.List[str]:
+        return current_vocabulary()[name]
+
+    return values
+
+
+if __name__ == "__main__":
+    from app.database_utils import make_database
+
+    parser = argparse.ArgumentParser(
+        description="Dump the values suggested by the search forms as JSON, "
+                    "to be served by setting `VOCABULARY_PATH`")
+    parser.add_argument("-o", "--output", type=str, required=True,
+                        help="a path of the JSON file to write")
+    parser.add_argument("--database-url", type=str, default=None,
+                        help="an optional sqlalchemy uri to use a different database")
+    args = parser.parse_args()
+
+    # importing the app prints a lot
+    with contextlib.redirect_stdout(sys.stderr):
+        from app import create_app
+
+        flask_app = create_app()
+        engine = flask_app.engine
+        if args.database_url is not None:
+            engine, _, _ = make_database(args.database_url, sqlalchemy_echo=False)
+        vocabulary = get_vocabulary(engine)
+
+    vocabulary.to_json(args.output)
+    print({name: len(values) for name, values in vocabulary.values.items()})
@@ -8,7 +8,7 @@ from app.models import *
 
 # basedir = os.path.abspath(os.path.dirname(__file__))
 basedir = Path("./tmp/")
-SQLALCHEMY_TEST_DATABASE_URI = 'sqlite:///' + str(Path(basedir) / 'test_diachronicon.db').
+SQLALCHEMY_TEST_DATABASE_URI = 'sqlite:///' + str(Path(basedir) / 'test_diachronicon.db')
 
 
 @pytest.fixture
@@ -69,3 +69,17 @@ def init_db(empty_db_engine):
 
     return empty_db_engine
 
+
+
+@pytest.fixture(scope="module")
+def synthetic_db_engine(tmp_path_factory):
+    """A file database with synthetic constructions and planner statistics"""
+    from benchmarks.synthetic_db import make_synthetic_database
+    from app.update_db.update import refresh_after_import
+
+    path = tmp_path_factory.mktemp("synthetic") / "synthetic.db"
+    engine = make_synthetic_database(f"sqlite:///{path}", 60)
+    refresh_after_import(engine)
+
+    yield engine
+    engine.dispose()
@@ -0,0 +1,42 @@
+from collections import Counter
+
+import pytest
+
+from app.search.query_sqlalchemy import (
+    aggregate_by_construction,
+    default_sqlquery,
+    unpack_aggregated,
+)
+from app.search.search2 import group_rows_by_construction
+
+
+def make_query(form):
+    query = default_sqlquery()
+    query.parse_form(form)
+    return query.query()
+
+
+@pytest.mark.parametrize("form", [
+    {"construction": {"formula": "NP*"}},
+    # a boolean column
+    {"construction": {"in_rus_constructicon": True}},
+    {"changes": [{"level": "synt"}, {"type_of_change": "source"}]},
+    {"changes": [{"first_attested__from": 1800, "duration__from": 20}]},
+    # real ranks and snippets
+    {"changes": [{"text": "прес*"}]},
+])
+def test_same_rows_as_flat(synthetic_db_engine, form):
+    with synthetic_db_engine.connect() as conn:
+        flat = conn.execute(make_query(form)).mappings().all()
+
+        found = make_query(form).subquery("found")
+        aggregated = conn.execute(aggregate_by_construction(found)).mappings().all()
+        unpacked = dict(unpack_aggregated(found, aggregated, conn.dialect))
+
+    # a row per construction
+    assert len(aggregated) == len(unpacked)
+    expected = group_rows_by_construction(flat)
+    assert unpacked.keys() == expected.keys()
+    for construction_id, rows in unpacked.items():
+        assert (Counter(tuple(row.items()) for row in rows)
+                == Counter(tuple(dict(row).items()) for row in expected[construction_id]))
@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+from app.search.query import (
+    BetweenComparison,
+    Comparison,
+    Conjunction,
+    ConjunctionCopies,
+    SubForm,
+    canonical_hash,
+    canonical_json,
+    canonicalize,
+)
+from app.search.query_memory import default_memquery
+from app.search.query_sqlalchemy import default_sqlquery
+
+
+def form_hash(form):
+    query = default_sqlquery()
+    query.parse_form(form)
+    return query.form_hash()
+
+
+@pytest.mark.parametrize("form,same_as", [
+    ({"construction": {"formula": "NP*", "anchor_ru": "хоть"}},
+     {"construction": {"anchor_ru": "хоть", "formula": "NP*"}}),
+    ({"construction": {"formula": "  не   NP**  ", "csrf_token": "abc"},
+      "anchor": {"anchor_ru": "", "csrf_token": "abc"}, "csrf_token": "abc"},
+     {"construction": {"formula": "не NP*"}}),
+    ({"changes": [{"level": "synt"}, {"level": "synt"}, {"type_of_change": ""}]},
+     {"changes": [{"level": "synt"}]}),
+    ({"changes": [{"level": "synt"}, {"type_of_change": "source"}]},
+     {"changes": [{"type_of_change": "source"}, {"level": "synt"}]}),
+    ({"construction": {"num_changes__from": 2, "num_changes__to": 4}},
+     {"construction": {"num_changes__to": 4, "num_changes__from": 2}}),
+    ({"construction": {"contemporary_meaning": "Minimizer | -Negation"}},
+     {"construction": {"contemporary_meaning": " -Negation|Minimizer "}}),
+])
+def test_same_hash(form, same_as):
+    assert form_hash(form) == form_hash(same_as)
+
+
+@pytest.mark.parametrize("form,other", [
+    ({"construction": {"formula": "не NP*"}},
+     {"construction": {"formula": "не NP*", "skip_optional": True}}),
+    ({"construction": {"num_changes__from": 2}},
+     {"construction": {"num_changes__to": 2}}),
+    ({"changes": [{"level": "synt", "type_of_change": "source"}]},
+     {"changes": [{"level": "synt"}, {"type_of_change": "source"}]}),
+])
+def test_different_hash(form, other):
+    assert form_hash(form) != form_hash(other)
+
+
+def test_merge_between():
+    tree = Conjunction([Comparison("year", "le", 1900), Comparison("level", "eq", "synt"),
+                        Comparison("year", "ge", 1800)])
+
+    assert canonicalize(tree).items == [
+        BetweenComparison("year", 1800, 1900), Comparison("level", "eq", "synt")]
+
+
+def test_no_merge_in_copies():
+    tree = ConjunctionCopies([Comparison("year", "le", 1900),
+                              Comparison("year", "ge", 1800)])
+
+    assert len(canonicalize(tree).items) == 2
+
+
+def test_empty():
+    tree = Conjunction([SubForm("changes", ConjunctionCopies([
+        Conjunction([Comparison("csrf_token", "eq", "abc")])]))])
+
+    assert canonicalize(tree) == Conjunction([])
+    assert canonical_hash(tree) == canonical_hash(Conjunction([]))
+
+
+def test_not_modified():
+    tree = Conjunction([Comparison("level", "eq", " synt "), Comparison("b", "eq", 1)])
+    canonicalize(tree)
+
+    assert tree.items[0].value == " synt "
+    assert tree.items[0].param == "level"
+
+
+def test_json_same_for_backends():
+    form = {"construction": {"formula": "NP*", "anchor_length__from": 2},
+            "changes": [{"level": "synt"}]}
+    sql_query = default_sqlquery()
+    sql_query.parse_form(form)
+    mem_query = default_memquery(store=None)
+    mem_query.parse_form(form)
+
+    serialized = canonical_json(sql_query.canonical_form())
+    assert json.loads(serialized)["kind"] == "Conjunction"
+    assert serialized == canonical_json(mem_query.canonical_form())
+
+
+def test_canonical_finds_the_same(synthetic_db_engine):
+    form = {"construction": {"formula": " NP**  Cop"},
+            "changes": [{"level": "synt"}, {"level": "synt"}]}
+    query, canonical_query = default_sqlquery(), default_sqlquery()
+    query.parse_form(form)
+    canonical_query.parse_form(form)
+    canonical_query.form = canonical_query.canonical_form()
+    with synthetic_db_engine.connect() as conn:
+        found = {row.id for row in conn.execute(query.query())}
+        canonical_found = {row.id for row in conn.execute(canonical_query.query())}
+
+    assert found
+    assert canonical_found == found
@@ -0,0 +1,122 @@
+import pytest
+
+from sqlalchemy import event
+
+from app import create_app
+from app.search.query_sqlalchemy import SQLCompoundQuery, default_sqlquery
+from config import TestConfig
+
+
+A = {"construction": {"contemporary_meaning": "Minimizer | Negation"}}
+B = {"changes": [{"level": "synt"}]}
+C = {"anchor": {"synt_function_of_anchor": "Subject"}}
+
+
+def make_query(form):
+    query = default_sqlquery()
+    query.parse_form(form)
+    return query
+
+
+def ids(engine, query):
+    with engine.connect() as conn:
+        return {row.id for row in conn.execute(query.query())}
+
+
+@pytest.fixture
+def app(synthetic_db_engine):
+    app = create_app(test_config_obj=TestConfig)
+    app.config["WTF_CSRF_ENABLED"] = False
+    app.engine = synthetic_db_engine
+    return app
+
+
+@pytest.mark.parametrize("operations,combine", [
+    (["intersect", "intersect"], lambda a, b, c: a & b & c),
+    (["union", "union"], lambda a, b, c: a | b | c),
+    (["except", "union"], lambda a, b, c: (a - b) | c),
+    (["union", "except"], lambda a, b, c: (a | b) - c),
+    (["except", "intersect"], lambda a, b, c: (a - b) & c),
+])
+def test_same_as_separate(synthetic_db_engine, operations, combine):
+    a, b, c = [ids(synthetic_db_engine, make_query(form)) for form in (A, B, C)]
+    compound = SQLCompoundQuery([make_query(form) for form in (A, B, C)], operations)
+
+    assert ids(synthetic_db_engine, compound) == combine(a, b, c)
+
+
+def test_one_statement(synthetic_db_engine):
+    compound = SQLCompoundQuery([make_query(A), make_query(B)], ["except"])
+    statements = []
+
+    def collect(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(synthetic_db_engine, "before_cursor_execute", collect)
+    try:
+        found = ids(synthetic_db_engine, compound)
+    finally:
+        event.remove(synthetic_db_engine, "before_cursor_execute", collect)
+
+    assert found
+    assert len(statements) == 1
+    assert "EXCEPT" in statements[0]
+
+
+def test_bad_operations():
+    with pytest.raises(ValueError):
+        SQLCompoundQuery([make_query(A), make_query(B)], [])
+    with pytest.raises(ValueError):
+        SQLCompoundQuery([make_query(A), make_query(B)], ["xor"])
+
+
+def test_api(app, synthetic_db_engine):
+    client = app.test_client()
+    data = {"forms-0-construction-contemporary_meaning": "Minimizer | Negation",
+            # an empty form in between is skipped
+            "forms-2-changes-0-level": "synt",
+            "operations-1": "except"}
+
+    response = client.post("/api/search/compound", data=data)
+    assert response.is_streamed
+    found = response.json
+
+    expected = ids(synthetic_db_engine, make_query(A)) - ids(synthetic_db_engine, make_query(B))
+    assert found["total"] == len(expected)
+    assert {construction["id"] for construction in found["constructions"]} == expected
+
+    assert client.post("/api/search/compound", data={}).status_code == 400
+    bad_operation = {**data, "operations-1": "xor"}
+    assert client.post("/api/search/compound", data=bad_operation).status_code == 400
+
+
+@pytest.mark.parametrize("data", [
+    # `A UNION everything`, `A EXCEPT everything`
+    {"forms-0-changes-0-level": "synt", "forms-1-construction-formula": "",
+     "operations-0": "union"},
+    {"forms-0-changes-0-level": "synt", "forms-1-construction-formula": "",
+     "operations-0": "except"},
+    # `everything UNION B`, also after intersecting an empty form
+    {"forms-0-construction-formula": "", "forms-1-changes-0-level": "synt",
+     "operations-0": "union"},
+    {"forms-0-construction-formula": "", "forms-1-construction-formula": "",
+     "forms-2-changes-0-level": "synt", "operations-1": "except"},
+])
+def test_empty_operand(app, data):
+    assert app.test_client().post("/api/search/compound", data=data).status_code == 400
+
+
+def test_empty_intersected(app, synthetic_db_engine):
+    data = {"forms-0-construction-formula": "", "forms-1-changes-0-level": "synt",
+            "forms-2-construction-formula": "", "operations-0": "intersect"}
+    found = app.test_client().post("/api/search/compound", data=data).json
+    assert found["total"] == len(ids(synthetic_db_engine, make_query(B)))
+
+
+def test_form_page(app, synthetic_db_engine):
+    data = {"forms-0-construction-contemporary_meaning": "Minimizer | Negation",
+            "forms-1-changes-0-level": "synt", "operations-0": "union"}
+    response = app.test_client().post("/form", data=data)
+
+    expected = ids(synthetic_db_engine, make_query(A)) | ids(synthetic_db_engine, make_query(B))
+    assert f"Найдено конструкций: {len(expected)}" in response.text
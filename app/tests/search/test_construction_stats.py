@@ -0,0 +1,80 @@
+import pytest
+
+from sqlalchemy import func, select
+
+from app.models import (
+    Change,
+    ConstructionStats,
+    FormulaElement,
+)
+from app.search.query_sqlalchemy import default_sqlquery
+
+
+def search_ids(engine, form):
+    query = default_sqlquery()
+    query.parse_form(form)
+    with engine.connect() as conn:
+        return {row.id for row in conn.execute(query.query())}
+
+
+def test_stats_match_child_tables(synthetic_db_engine):
+    with synthetic_db_engine.connect() as conn:
+        stats = {row.construction_id: row
+                 for row in conn.execute(select(ConstructionStats))}
+        num_changes = dict(conn.execute(
+            select(Change.construction_id, func.count())
+            .group_by(Change.construction_id)
+        ).all())
+        anchor_length = dict(conn.execute(
+            select(FormulaElement.construction_id, func.count())
+            .where(FormulaElement.is_lexical == True)
+            .group_by(FormulaElement.construction_id)
+        ).all())
+
+    assert stats
+    for construction_id, row in stats.items():
+        assert row.num_changes == num_changes.get(construction_id, 0)
+        assert row.anchor_length == anchor_length.get(construction_id, 0)
+        if row.duration is not None:
+            assert row.duration == row.last_attested - row.first_attested
+
+
+@pytest.mark.parametrize("field", ["num_changes", "anchor_length"])
+@pytest.mark.parametrize("value_from,value_to", [(2, None), (None, 3), (1, 4)])
+def test_stats_filters(synthetic_db_engine, field, value_from, value_to):
+    form = {"construction": {f"{field}__from": value_from,
+                             f"{field}__to": value_to}}
+
+    with synthetic_db_engine.connect() as conn:
+        expected_stmt = select(ConstructionStats.construction_id)
+        column = getattr(ConstructionStats, field)
+        if value_from is not None:
+            expected_stmt = expected_stmt.where(column >= value_from)
+        if value_to is not None:
+            expected_stmt = expected_stmt.where(column <= value_to)
+        expected = set(conn.execute(expected_stmt).scalars())
+
+    assert search_ids(synthetic_db_engine, form) == expected
+
+
+@pytest.mark.parametrize("field", ["first_attested", "last_attested"])
+@pytest.mark.parametrize("value_from,value_to", [(1800, None), (None, 1850),
+                                                 (1800, 1850)])
+def test_year_range_filters(synthetic_db_engine, field, value_from, value_to):
+    """Constructions with a change whose year range overlaps the queried one"""
+    form = {"changes": [{f"{field}__from": value_from,
+                         f"{field}__to": value_to}]}
+
+    prefix = field.split("_")[0]
+    lo = getattr(Change, f"{prefix}_year_lo")
+    hi = getattr(Change, f"{prefix}_year_hi")
+    with synthetic_db_engine.connect() as conn:
+        expected_stmt = select(Change.construction_id)
+        if value_from is not None:
+            expected_stmt = expected_stmt.where(hi >= value_from)
+        if value_to is not None:
+            expected_stmt = expected_stmt.where(lo <= value_to)
+        expected = set(conn.execute(expected_stmt).scalars())
+
+    assert expected
+    assert search_ids(synthetic_db_engine, form) == expected
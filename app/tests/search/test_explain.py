@@ -0,0 +1,81 @@
+import pytest
+
+from app import create_app
+from app.search.explain import explain_search
+from app.search.formula_index import get_formula_index
+from app.search.query_sqlalchemy import default_sqlquery
+from config import TestConfig
+
+
+FORM = {"construction": {"formula": "NP*"},
+        "changes": [{"level": "synt"}, {"first_attested__from": 1800}]}
+
+
+def count_found(engine, form, formula_index=None):
+    query = default_sqlquery(formula_index)
+    query.parse_form(form)
+    with engine.connect() as conn:
+        return len({row["id"] for row in conn.execute(query.query()).mappings()})
+
+
+def test_explain_search(synthetic_db_engine):
+    rendered = []
+    report = explain_search(synthetic_db_engine, FORM, render=rendered.append)
+
+    assert "[changes]" in report["tree"] and "[construction]" in report["tree"]
+    assert report["params"] and report["sql"].count("?") == len(report["params"])
+    assert any("USING" in row["detail"] for row in report["plan"])
+    assert set(report["timings"]) == {"parse", "compile", "execute", "render"}
+
+    stages = {stage["stage"]: stage for stage in report["stages"]}
+    assert list(stages) == ["construction", "changes[0]", "changes[1]", "found"]
+    assert stages["construction"]["constructions"] == count_found(
+        synthetic_db_engine, {"construction": FORM["construction"]})
+    assert stages["found"]["constructions"] == count_found(synthetic_db_engine, FORM)
+    rows, = rendered
+    assert len(rows) == stages["found"]["rows"]
+
+
+def test_explain_formula_index(synthetic_db_engine):
+    # ids found by the index are an expanding `IN` parameter
+    form = {"construction": {"formula": "ни капли *"}}
+    formula_index = get_formula_index(synthetic_db_engine)
+    report = explain_search(synthetic_db_engine, form, formula_index)
+
+    assert "POSTCOMPILE" not in report["sql"]
+    assert report["sql"].count("?") == len(report["params"])
+    assert report["plan"]
+    assert report["stages"][-1]["constructions"] == count_found(
+        synthetic_db_engine, form, formula_index) > 0
+
+
+@pytest.fixture
+def app(synthetic_db_engine):
+    app = create_app(test_config_obj=TestConfig)
+    app.config["WTF_CSRF_ENABLED"] = False
+    app.engine = synthetic_db_engine
+    return app
+
+
+def test_api_explain(app, synthetic_db_engine):
+    client = app.test_client()
+    data = {"construction-formula": "NP*", "changes-0-level": "synt"}
+    assert client.post("/api/search/explain", data=data).status_code == 404
+
+    app.config["SEARCH_EXPLAIN_ENABLED"] = True
+    by_form = client.post("/api/search/explain", data=data).json
+    by_json = client.post("/api/search/explain", json={
+        "construction": {"formula": "NP*"}, "changes": [{"level": "synt"}]}).json
+
+    assert by_form["form_hash"] == by_json["form_hash"]
+    assert by_form["stages"][-1] == by_json["stages"][-1]
+    assert "render" in by_form["timings"]
+
+
+def test_api_explain_formula_index(app):
+    app.config["SEARCH_EXPLAIN_ENABLED"] = True
+    app.config["FORMULA_SEARCH_BACKEND"] = "index"
+    response = app.test_client().post(
+        "/api/search/explain", json={"construction": {"formula": "ни капли *"}})
+    assert response.status_code == 200
+    assert response.json["stages"][-1]["constructions"] > 0
@@ -0,0 +1,77 @@
+import pytest
+
+from sqlalchemy import func, select
+
+from app import create_app
+from app.models import Change, Construction
+from app.search.facets import FacetIndex, get_facet_index
+from config import TestConfig
+
+
+@pytest.fixture
+def facet_index():
+    return FacetIndex([1, 2, 3, 5], {
+        "level": [(1, "synt"), (1, "morph"), (2, "synt"), (3, None), (5, "lex")],
+        "in_rus_constructicon": [(1, True), (2, False), (3, True), (5, True)],
+    })
+
+
+def test_bitsets(facet_index):
+    assert facet_index.bitsets["level"] == {"synt": 0b0011, "morph": 0b0001,
+                                            "lex": 0b1000}
+    assert facet_index.to_ids(facet_index.bitset([5, 2, 4])) == [2, 5]
+
+
+@pytest.mark.parametrize("facet2values,ids", [
+    ({}, [1, 2, 3, 5]),
+    ({"level": ["synt"]}, [1, 2]),
+    ({"level": ["morph", "lex"]}, [1, 5]),
+    ({"level": ["synt", "lex"], "in_rus_constructicon": ["True"]}, [1, 5]),
+    ({"level": ["unknown"]}, []),
+])
+def test_filter(facet_index, facet2values, ids):
+    assert facet_index.to_ids(facet_index.filter(facet2values)) == ids
+
+
+def test_filter_unknown_facet(facet_index):
+    with pytest.raises(ValueError):
+        facet_index.filter({"nonexistent": ["x"]})
+
+
+def test_counts(facet_index):
+    counts = facet_index.counts(facet_index.bitset([1, 2, 3]))
+
+    assert counts["level"] == {"synt": 2, "morph": 1, "lex": 0}
+    assert counts["in_rus_constructicon"] == {"True": 2, "False": 1}
+
+
+def test_counts_match_sql(synthetic_db_engine):
+    with synthetic_db_engine.connect() as conn:
+        expected = dict(conn.execute(
+            select(Change.level, func.count(Change.construction_id.distinct()))
+            .group_by(Change.level)
+        ).all())
+
+    assert get_facet_index(synthetic_db_engine).counts()["level"] == expected
+
+
+def test_facets_endpoint(synthetic_db_engine):
+    app = create_app(test_config_obj=TestConfig)
+    app.config["WTF_CSRF_ENABLED"] = False
+    app.engine = synthetic_db_engine
+    client = app.test_client()
+
+    with synthetic_db_engine.connect() as conn:
+        n_constructions = conn.execute(select(func.count(Construction.id))).scalar()
+    everything = client.get("/api/facets").json
+    assert everything["total"] == n_constructions
+
+    synt = client.get("/api/facets?facet-level=synt").json
+    assert synt["total"] == everything["facets"]["level"]["synt"]
+    assert synt["facets"]["level"]["synt"] == synt["total"]
+
+    found = client.post("/api/facets", data={"construction-formula": "NP*",
+                                             "facet-level": "synt"}).json
+    assert 0 < found["total"] <= synt["total"]
+
+    assert client.get("/api/facets?facet-nonexistent=1").status_code == 400
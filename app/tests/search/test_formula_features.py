@@ -0,0 +1,44 @@
+import pytest
+
+from sqlalchemy import select
+
+from app.models import FormulaElement
+from app.search.query_sqlalchemy import SQLFormulaElementPattern, default_sqlquery
+
+
+def search_ids(engine, form):
+    query = default_sqlquery()
+    query.parse_form(form)
+    with engine.connect() as conn:
+        return {row.id for row in conn.execute(query.query())}
+
+
+@pytest.mark.parametrize("value,features", [
+    ("N-Gen", {"pos": "n", "case": "gen"}),
+    ("N-Gen%", {"pos": "n", "case": "gen"}),
+    ("NP-Dat.Sg", {"pos": "np", "case": "dat", "number": "sg"}),
+    ("N-Pl", {"pos": "n", "number": "pl"}),
+    ("NP", None),
+    ("V-Pst", None),
+    ("N-Gen.Foo", None),
+    ("хоть", None),
+])
+def test_parse_gloss(value, features):
+    assert SQLFormulaElementPattern.parse_gloss(value) == features
+
+
+@pytest.mark.parametrize("formula", ["N-Gen*", "N-Dat.Sg", "NP-Nom*"])
+def test_features_match_values(synthetic_db_engine, formula):
+    features = SQLFormulaElementPattern.parse_gloss(formula.replace("*", "%"))
+    with synthetic_db_engine.connect() as conn:
+        expected = {
+            construction_id
+            for construction_id, value in conn.execute(select(
+                FormulaElement.construction_id, FormulaElement.value))
+            if construction_id is not None
+            and FormulaElement.parse_features(value).items() >= features.items()
+        }
+
+    assert expected
+    assert search_ids(
+        synthetic_db_engine, {"construction": {"formula": formula}}) == expected
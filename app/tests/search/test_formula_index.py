@@ -0,0 +1,119 @@
+import pytest
+
+from app.database_utils import bump_data_generation
+from app.search.formula_index import FormulaIndex, get_formula_index
+from app.search.query_sqlalchemy import default_sqlquery
+
+
+# (value, construction_variant_id, construction_id, order)
+ELEMENTS = [
+    ("ни", 1, 1, 0), ("капли", 1, 1, 1), ("N-Gen", 1, 1, 2),
+    ("ни", 2, 2, 0), ("капли", 2, 2, 1), ("не", 2, 2, 2), ("VP", 2, 2, 3),
+    ("NP", 3, 3, 0), ("Cop", 3, 3, 1), ("не", 3, 3, 2), ("NP-Gen", 3, 3, 3),
+    # a variant of construction 3, not its main formula
+    ("ни", 4, None, 0), ("капли", 4, None, 1),
+]
+
+# "NP Cop не (NP-Gen)" of construction 3 if its 3rd element were optional:
+# (construction_variant_id, construction_id, order, next_order)
+LINKS = [
+    (1, 1, 0, 1), (1, 1, 1, 2),
+    (2, 2, 0, 1), (2, 2, 1, 2), (2, 2, 2, 3),
+    (3, 3, 0, 1), (3, 3, 1, 2), (3, 3, 1, 3), (3, 3, 2, 3),
+    (4, None, 0, 1),
+]
+
+
+@pytest.fixture
+def formula_index():
+    return FormulaIndex(ELEMENTS, LINKS)
+
+
+@pytest.mark.parametrize("pattern,terms", [
+    ("капли", ["капли"]),
+    ("Капли", ["капли"]),
+    ("np%", ["np", "np-gen"]),
+    ("%", ["cop", "n-gen", "np", "np-gen", "vp", "капли", "не", "ни"]),
+    ("%p", ["cop", "np", "vp"]),
+    ("n_-gen", ["np-gen"]),
+    ("кап", []),
+])
+def test_expand(formula_index, pattern, terms):
+    assert formula_index.expand(pattern) == terms
+
+
+@pytest.mark.parametrize("patterns,construction_ids", [
+    (["ни", "капли"], {1, 2}),
+    (["капли", "ни"], set()),
+    (["ни", "%", "n%"], {1}),
+    (["%", "не"], {2, 3}),
+    (["%np%"], {3}),
+    (["не", "%"], {2, 3}),
+    (["np-gen", "%"], set()),
+])
+def test_search(formula_index, patterns, construction_ids):
+    assert formula_index.search(patterns) == construction_ids
+
+
+@pytest.mark.parametrize("patterns,construction_ids", [
+    (["ни", "капли"], {1, 2}),
+    (["cop", "np-gen"], {3}),
+    (["np", "cop", "np-gen"], {3}),
+    (["%", "np-gen"], {3}),
+    (["np", "np-gen"], set()),
+    (["капли", "vp"], set()),
+])
+def test_search_skip_optional(formula_index, patterns, construction_ids):
+    assert formula_index.search(patterns, skip_optional=True) == construction_ids
+
+
+def test_match_phrase_variants(formula_index):
+    assert formula_index.match_phrase(["ни", "капли"]) == {
+        (1, 1): [0], (2, 2): [0], (4, None): [0]}
+
+
+def search_ids(engine, formula, formula_index=None, skip_optional=False):
+    query = default_sqlquery(formula_index, skip_optional=skip_optional)
+    query.parse_form({"construction": {"formula": formula}})
+    with engine.connect() as conn:
+        return {row.id for row in conn.execute(query.query())}
+
+
+@pytest.mark.parametrize("formula", [
+    "NP*", "ни капли", "ни * N-Gen", "* Cop *", "Cop", "не * NP", "np-gen",
+    "N_Gen", "хоть куда хоть откуда хоть когда", "* не V* ни * ни * *",
+])
+def test_same_results_as_sql(synthetic_db_engine, formula):
+    formula_index = get_formula_index(synthetic_db_engine)
+
+    assert (search_ids(synthetic_db_engine, formula, formula_index)
+            == search_ids(synthetic_db_engine, formula))
+
+
+@pytest.mark.parametrize("formula", [
+    "что как", "Cop пруд*", "N-Nom знает NP", "не что * NP", "* Cop *",
+])
+def test_skip_optional_same_results_as_sql(synthetic_db_engine, formula):
+    formula_index = get_formula_index(synthetic_db_engine)
+    strict_ids = search_ids(synthetic_db_engine, formula)
+    ids = search_ids(synthetic_db_engine, formula, skip_optional=True)
+
+    assert ids == search_ids(synthetic_db_engine, formula, formula_index,
+                             skip_optional=True)
+    assert strict_ids <= ids
+
+
+def test_skip_optional_finds_formulas_without_optional_elements(synthetic_db_engine):
+    # "NP Cop не что (иное) как NP" is only found with "иное" skipped
+    assert not search_ids(synthetic_db_engine, "что как")
+    assert search_ids(synthetic_db_engine, "что как", skip_optional=True)
+
+
+def test_rebuilt_on_new_generation(synthetic_db_engine):
+    formula_index = get_formula_index(synthetic_db_engine)
+    assert get_formula_index(synthetic_db_engine) is formula_index
+
+    with synthetic_db_engine.begin() as conn:
+        bump_data_generation(conn)
+
+    assert get_formula_index(synthetic_db_engine) is not formula_index
@@ -0,0 +1,74 @@
+import pytest
+
+from sqlalchemy import select
+
+from app.models import Change
+from app.search.query_sqlalchemy import SQLFullTextQuery, default_sqlquery
+
+
+def search(engine, form):
+    query = default_sqlquery()
+    query.parse_form(form)
+    with engine.connect() as conn:
+        return conn.execute(query.query()).mappings().all()
+
+
+def construction_ids_where(engine, *where):
+    with engine.connect() as conn:
+        return set(conn.execute(
+            select(Change.construction_id).where(*where)).scalars())
+
+
+@pytest.mark.parametrize("value,match", [
+    ("растёт", '"растет"'),
+    ("NP-Gen пр*", '"NP-Gen" "пр"*'),
+    ('a "b', '"a" """b"'),
+    ("*", ""),
+])
+def test_make_match(value, match):
+    assert SQLFullTextQuery.make_match(value) == match
+
+
+@pytest.mark.parametrize("form_name", ["changes", "text"])
+@pytest.mark.parametrize("word", ["Ещё", "еще"])
+def test_full_text_search(synthetic_db_engine, form_name, word):
+    form = {form_name: [{"text": word}] if form_name == "changes"
+            else {"text": word}}
+    rows = search(synthetic_db_engine, form)
+
+    expected = construction_ids_where(
+        synthetic_db_engine, Change.comment.contains("ещё"))
+    assert expected
+    assert {row["id"] for row in rows} == expected
+    # indexed as normalized text, snippets of the text as it is
+    assert all("**ещё**" in row["text_snippet"] for row in rows)
+    ranks = [row["text_rank"] for row in rows]
+    assert ranks == sorted(ranks)
+
+
+def test_full_text_search_prefix_and_other_fields(synthetic_db_engine):
+    rows = search(synthetic_db_engine,
+                  {"changes": [{"text": "прес*", "level": "synt"}]})
+
+    expected = construction_ids_where(
+        synthetic_db_engine, Change.comment.contains("прессе"),
+        Change.level == "synt")
+    assert {row["id"] for row in rows} == expected
+
+
+def test_full_text_search_two_changes(synthetic_db_engine):
+    rows = search(synthetic_db_engine,
+                  {"changes": [{"text": "прессе"}, {"text": "корпуса"}]})
+
+    expected = (
+        construction_ids_where(synthetic_db_engine, Change.comment.contains("прессе"))
+        & construction_ids_where(synthetic_db_engine, Change.comment.contains("корпуса"))
+    )
+    assert {row["id"] for row in rows} == expected
+    assert all(row["text_snippet"] and row["text_snippet_2"] for row in rows)
+
+
+def test_snippet_of_source_text(synthetic_db_engine):
+    rows = search(synthetic_db_engine, {"changes": [{"text": "прессе"}]})
+    assert rows
+    assert all(row["text_snippet"] == "ещё встречается в **прессе**" for row in rows)
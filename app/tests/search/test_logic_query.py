@@ -0,0 +1,71 @@
+import pytest
+
+from sqlalchemy import select
+
+from app.models import Construction
+from app.search.query import (
+    Comparison,
+    Conjunction,
+    Disjunction,
+    Negation,
+    Query,
+    canonicalize,
+)
+from app.search.query_sqlalchemy import default_sqlquery
+
+
+def parse_value(value):
+    query = Query()
+    query.parse_form({"construction": {"contemporary_meaning": value}})
+    subform, = query.form.items
+    element, = subform.content.items
+    return element
+
+
+def comparison(value):
+    return Comparison("contemporary_meaning", "eq", value)
+
+
+def test_parse():
+    assert parse_value("Minimizer") == comparison("Minimizer")
+    assert parse_value("-Minimizer") == Negation(comparison("Minimizer"))
+    # `&` binds tighter than `|`
+    assert parse_value("Minimizer | Quantity & -Negation") == Disjunction([
+        comparison("Minimizer"),
+        Conjunction([comparison("Quantity"), Negation(comparison("Negation"))]),
+    ])
+    assert parse_value("Minimizer |") == comparison("Minimizer")
+
+
+def test_double_negation():
+    negated = Negation(Negation(comparison("Minimizer")))
+
+    assert canonicalize(negated) == comparison("Minimizer")
+    assert canonicalize(Negation(comparison(""))).items == []
+
+
+def sql_ids(engine, value):
+    query = default_sqlquery()
+    query.parse_form({"construction": {"contemporary_meaning": value}})
+    with engine.connect() as conn:
+        return {row.id for row in conn.execute(query.query())}
+
+
+def meaning_ids(engine, where):
+    with engine.connect() as conn:
+        return set(conn.execute(
+            select(Construction.id).where(where(Construction.contemporary_meaning))
+        ).scalars())
+
+
+@pytest.mark.parametrize("value,where", [
+    ("Minimizer | Negation", lambda meaning: meaning.in_(["Minimizer", "Negation"])),
+    ("-Minimizer", lambda meaning: meaning.is_distinct_from("Minimizer")),
+    ("Minimizer | -Negation & -Causation",
+     lambda meaning: meaning.not_in(["Negation", "Causation"]) | meaning.is_(None)),
+])
+def test_sql(synthetic_db_engine, value, where):
+    expected = meaning_ids(synthetic_db_engine, where)
+
+    assert expected
+    assert sql_ids(synthetic_db_engine, value) == expected
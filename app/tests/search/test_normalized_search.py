@@ -0,0 +1,60 @@
+import pytest
+
+from sqlalchemy import select
+
+from app.models import Construction, FormulaElement
+from app.search.query_sqlalchemy import default_sqlquery, like_normalized
+
+
+def search_ids(engine, form):
+    query = default_sqlquery()
+    query.parse_form(form)
+    with engine.connect() as conn:
+        return {row.id for row in conn.execute(query.query())}
+
+
+def test_normalized_on_set():
+    element = FormulaElement(value="Ёлки-NP")
+    assert element.value_norm == "елки-np"
+
+    construction = Construction(anchor_ru="хоть")
+    construction.anchor_ru = "ХОТЬ ВСЁ"
+    assert construction.anchor_ru_norm == "хоть все"
+
+
+@pytest.mark.parametrize("pattern,sql", [
+    ("Ни", "formula_element.value_norm = 'ни'"),
+    ("Ни%", "formula_element.value_norm >= 'ни' "
+            "AND formula_element.value_norm < 'ни\U0010ffff'"),
+    ("%ни%", "formula_element.value_norm LIKE '%ни%'"),
+    ("ни%и", "formula_element.value_norm >= 'ни' "
+             "AND formula_element.value_norm < 'ни\U0010ffff' "
+             "AND formula_element.value_norm LIKE 'ни%и'"),
+])
+def test_like_normalized(pattern, sql):
+    condition = like_normalized(FormulaElement.value_norm, pattern)
+    assert str(condition.compile(compile_kwargs={"literal_binds": True})) == sql
+
+
+@pytest.mark.parametrize("form,same_as", [
+    ({"construction": {"formula": "НИ КАПЛИ"}},
+     {"construction": {"formula": "ни капли"}}),
+    ({"construction": {"formula": "Хоть* NP*"}},
+     {"construction": {"formula": "хоть* np*"}}),
+    ({"anchor": {"anchor_ru": "ПРУД"}}, {"anchor": {"anchor_ru": "пруд"}}),
+    ({"construction": {"contemporary_meaning": "MINIMIZER"}},
+     {"construction": {"contemporary_meaning": "Minimizer"}}),
+])
+def test_case_insensitive(synthetic_db_engine, form, same_as):
+    ids = search_ids(synthetic_db_engine, form)
+
+    assert ids
+    assert ids == search_ids(synthetic_db_engine, same_as)
+
+
+def test_anchor_ru_infix(synthetic_db_engine):
+    with synthetic_db_engine.connect() as conn:
+        expected = {construction_id for construction_id, anchor_ru in conn.execute(
+            select(Construction.id, Construction.anchor_ru)) if "пруд" in anchor_ru}
+
+    assert search_ids(synthetic_db_engine, {"anchor": {"anchor_ru": "Пруд"}}) == expected
@@ -0,0 +1,139 @@
+import re
+from collections import Counter
+
+import pytest
+
+from app import create_app
+from app.search.query_sqlalchemy import SQLFullTextQuery
+from app.search.search2 import parse_search_form, search_page
+from config import TestConfig
+
+
+FORMS = [
+    {"construction": {"formula": "*"}},
+    {"construction": {"formula": "NP*"}},
+    {"changes": [{"level": "synt"}]},
+    {"changes": [{"level": "synt"}, {"type_of_change": "source"}]},
+    {"changes": [{"text": "прес*"}]},
+]
+
+
+@pytest.fixture
+def app(synthetic_db_engine):
+    app = create_app(test_config_obj=TestConfig)
+    app.config["WTF_CSRF_ENABLED"] = False
+    app.engine = synthetic_db_engine
+    return app
+
+
+def best_ranks(rows):
+    rank = SQLFullTextQuery.RANK_LABEL
+    construction2rank = {}
+    for row in rows:
+        construction2rank[row["id"]] = min(row[rank], construction2rank.get(row["id"], row[rank]))
+    return construction2rank
+
+
+def as_counter(rows):
+    return Counter(tuple(sorted(dict(row).items())) for row in rows)
+
+
+def walk_pages(form, page_size, only_ids=None):
+    pages, after = [], None
+    while True:
+        page = search_page(parse_search_form(dict(form)), dict(form), after,
+                           page_size, only_ids)
+        pages.append(page)
+        if page.next_after is None:
+            return pages
+        after = page.next_after
+
+
+@pytest.mark.parametrize("backend", ["sql", "memory"])
+@pytest.mark.parametrize("form", FORMS)
+def test_pages_cover_results(app, synthetic_db_engine, backend, form):
+    app.config["SEARCH_BACKEND"] = backend
+    with app.test_request_context():
+        with synthetic_db_engine.connect() as conn:
+            expected = conn.execute(parse_search_form(dict(form)).query()).mappings().all()
+
+        pages = walk_pages(form, page_size=7)
+
+    constructions = [list(page.results_by_constr) for page in pages]
+    ids = sum(constructions, [])
+    # a construction is on one page only, pages are in order of ids, full
+    # text results in order of their best rank (then of ids)
+    assert len(ids) == len(set(ids))
+    # (text is searched by SQL with either backend)
+    if "text" in str(form):
+        construction2rank = best_ranks(expected)
+        assert ids == sorted(ids, key=lambda id_: (construction2rank[id_], id_))
+    else:
+        assert ids == sorted(ids)
+    assert all(len(page_ids) <= 7 for page_ids in constructions)
+    assert all(page.total == len(ids) for page in pages)
+    assert set(ids) == {row["id"] for row in expected}
+    if backend == "sql":
+        assert as_counter(sum((list(page.rows) for page in pages), [])) == as_counter(expected)
+
+
+def test_best_match_first(app, synthetic_db_engine):
+    form = {"changes": [{"text": "ещё"}]}
+    with app.test_request_context():
+        with synthetic_db_engine.connect() as conn:
+            construction2rank = best_ranks(
+                conn.execute(parse_search_form(dict(form)).query()).mappings())
+        best = min(construction2rank, key=construction2rank.get)
+        # the best match is not among the first constructions by id
+        page_size = sorted(construction2rank).index(best)
+        assert page_size > 1
+
+        pages = walk_pages(form, page_size)
+
+    assert list(pages[0].results_by_constr)[0] == best
+    ranks = [construction2rank[id_] for page in pages for id_ in page.results_by_constr]
+    assert ranks == sorted(ranks) and len(ranks) == len(construction2rank)
+
+
+def test_only_ids(app):
+    with app.test_request_context():
+        everything = walk_pages(FORMS[0], page_size=100)[0]
+        only_ids = list(everything.results_by_constr)[::3]
+        pages = walk_pages(FORMS[0], page_size=4, only_ids=only_ids)
+
+    assert sum((list(page.results_by_constr) for page in pages), []) == only_ids
+    assert pages[0].total == len(only_ids)
+
+
+def test_form_cursor(app):
+    client = app.test_client()
+    form = {"construction-formula": "*", "page_size": 5}
+
+    first = client.post("/form", data=form)
+    cursor = re.search(r'name="cursor" value="([^"]+)"', first.text).group(1)
+    second = client.post("/form", data={**form, "cursor": cursor})
+    assert second.status_code == 200
+    assert '<ol start="6">' in second.text
+
+    hrefs = lambda response: set(re.findall(r'href="(/construction/\d+/)"', response.text))
+    assert len(hrefs(first)) == 5
+    assert not hrefs(first) & hrefs(second)
+
+    assert client.post("/form", data={**form, "cursor": cursor + "x"}).status_code == 400
+    other_query = {"construction-formula": "NP*", "cursor": cursor}
+    assert client.post("/form", data=other_query).status_code == 400
+
+
+def test_form_cursor_full_text(app):
+    client = app.test_client()
+    form = {"changes-0-text": "ещё", "page_size": 3}
+
+    first = client.post("/form", data=form)
+    cursor = re.search(r'name="cursor" value="([^"]+)"', first.text).group(1)
+    second = client.post("/form", data={**form, "cursor": cursor})
+    assert second.status_code == 200
+    assert '<ol start="4">' in second.text
+
+    hrefs = lambda response: set(re.findall(r'href="(/construction/\d+/)"', response.text))
+    assert len(hrefs(first)) == 3
+    assert not hrefs(first) & hrefs(second)
@@ -0,0 +1,159 @@
+import pytest
+
+from sqlalchemy import event, func, select
+
+from app import create_app
+from app.models import Change, Construction, FormulaElement
+from app.search.query_sqlalchemy import default_sqlquery, estimate_selectivity
+from app.search.selectivity import DEFAULT_EQ, HISTOGRAM_BOUNDS, get_selectivity_stats
+from config import TestConfig
+
+
+def make_query(form, selectivity=None):
+    query = default_sqlquery(selectivity=selectivity)
+    query.parse_form(form)
+    return query
+
+
+def search_ids(engine, query):
+    with engine.connect() as conn:
+        return set(conn.execute(query.query()).scalars())
+
+
+@pytest.fixture(scope="module")
+def stats(synthetic_db_engine):
+    return get_selectivity_stats(synthetic_db_engine)
+
+
+def test_stats(stats):
+    assert stats.n_rows(Change) and stats.n_rows(Construction)
+    # sqlite_stat1 of an index
+    assert 1 <= stats.rows_per_value[("change", "construction_id")] <= stats.n_rows(Change)
+    # a histogram
+    shares = [stats.eq(Change, "level", level) for level in ("synt", "sem")]
+    assert 0 < shares[0] < 1 and sum(shares) == pytest.approx(1)
+    assert stats.eq(Change, "level", "no such level") == 0
+    assert stats.range(Change, "first_year_hi", lo=10_000) == 0
+    assert stats.eq(Change, "stage", "whatever") == DEFAULT_EQ
+
+
+def test_histogram_bounds(synthetic_db_engine, stats):
+    histogram = stats.histograms[("change", "first_year_hi")]
+    with synthetic_db_engine.connect() as conn:
+        lo, hi, n_not_null = conn.execute(select(
+            func.min(Change.first_year_hi), func.max(Change.first_year_hi),
+            func.count(Change.first_year_hi))).one()
+
+    assert histogram.bounds == sorted(histogram.bounds)
+    assert histogram.bounds[0] == lo and histogram.bounds[-1] == hi
+    assert len(histogram.bounds) == min(HISTOGRAM_BOUNDS, n_not_null) + 1
+    assert histogram.n_not_null == n_not_null
+    assert stats.range(Change, "first_year_hi", lo=lo) == pytest.approx(
+        n_not_null / stats.n_rows(Change))
+
+
+def test_pattern_estimates(synthetic_db_engine, stats):
+    assert stats.like(FormulaElement, "value", "%") == 1
+    with synthetic_db_engine.connect() as conn:
+        n_np = conn.execute(select(func.count()).where(
+            FormulaElement.value_norm.like("np%"))).scalar()
+    assert stats.like(FormulaElement, "value", "np%") == pytest.approx(
+        n_np / stats.n_rows(FormulaElement))
+
+    # a bare wildcard restricts nothing, rare words much
+    anything, = make_query({"construction": {"formula": "*"}}).form.items[0].content.items
+    assert estimate_selectivity(anything, stats, Construction) == 1
+    formula = make_query({"construction": {"formula": "ни капли *"}}).form
+    level = make_query({"changes": [{"level": "synt"}]}).form
+    assert (estimate_selectivity(formula, stats, Construction)
+            < estimate_selectivity(level, stats, Construction))
+
+
+@pytest.mark.parametrize("form", [
+    {"construction": {"formula": "NP*", "num_changes__from": 2}},
+    {"changes": [{"level": "synt"}, {"type_of_change": "source"},
+                 {"first_attested__from": 1800}]},
+    {"construction": {"anchor_ru": "хоть*", "anchor_length__from": 1},
+     "changes": [{"level": "synt", "duration__from": 20}]},
+    {"construction": {"contemporary_meaning": "-Minimizer"}, "changes": [{"text": "прес*"}]},
+])
+def test_same_found(synthetic_db_engine, stats, form):
+    planned = search_ids(synthetic_db_engine, make_query(form, stats))
+    assert planned == search_ids(synthetic_db_engine, make_query(form))
+
+
+def test_most_selective_first(synthetic_db_engine, stats):
+    with synthetic_db_engine.connect() as conn:
+        n_changes = conn.execute(select(func.count(Change.id))).scalar()
+        # later than all but a few changes
+        year = conn.execute(select(Change.first_year_hi).order_by(Change.first_year_hi.desc())
+                            .offset(n_changes // 20).limit(1)).scalar()
+    form = {"changes": [{"level": "synt"}, {"first_attested__from": year}]}
+    level, years = make_query(form).form.items[0].content.items
+    assert (estimate_selectivity(years, stats, Change)
+            < estimate_selectivity(level, stats, Change))
+
+    sql = str(make_query(form, stats).query().compile(synthetic_db_engine))
+    assert sql.index("first_year_hi") < sql.index(".level")
+    # as they are without statistics
+    sql = str(make_query(form).query().compile(synthetic_db_engine))
+    assert sql.index(".level") < sql.index("first_year_hi")
+
+
+@pytest.mark.parametrize("form", [
+    {"changes": [{"level": "synt"}, {"first_attested__from": 1900, "first_attested__to": 1800}]},
+    {"construction": {"num_changes__from": 5, "num_changes__to": 2}},
+    # `≥` and `≤` are merged into one range
+    {"construction": {"anchor_length__from": 3, "anchor_length__to": 1, "formula": "NP*"}},
+])
+def test_empty(synthetic_db_engine, form):
+    query = make_query(form)
+    assert query.is_empty()
+    stmt = query.query()
+    assert " JOIN change" not in str(stmt) and "EXISTS" not in str(stmt)
+    assert search_ids(synthetic_db_engine, query) == set()
+
+
+def test_not_empty():
+    assert not make_query({"changes": [{"first_attested__from": 1800,
+                                        "first_attested__to": 1900}]}).is_empty()
+    assert not make_query({"construction": {"num_changes__from": 5}}).is_empty()
+
+
+def test_empty_search_reads_nothing(synthetic_db_engine):
+    app = create_app(test_config_obj=TestConfig)
+    app.config["WTF_CSRF_ENABLED"] = False
+    app.engine = synthetic_db_engine
+    client = app.test_client()
+    # loaded beforehand, as in a running app
+    get_selectivity_stats(synthetic_db_engine)
+    statements = []
+
+    def collect(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(synthetic_db_engine, "before_cursor_execute", collect)
+    try:
+        found = client.post("/api/search", data={"construction-num_changes__from": 5,
+                                                  "construction-num_changes__to": 2}).json
+    finally:
+        event.remove(synthetic_db_engine, "before_cursor_execute", collect)
+
+    assert found == {"total": 0, "constructions": []}
+    # the data generation of cached statistics only
+    assert all(statement.lstrip().upper().startswith("PRAGMA") for statement in statements)
+
+
+def test_joins(synthetic_db_engine):
+    query = make_query({"construction": {"formula": "NP*"}})
+    assert " JOIN general_info" in str(query.query())
+    assert " JOIN general_info" not in str(make_query({"construction": {"formula": "NP*"}})
+                                           .query_ids())
+
+    # no words to search: the subform restricts nothing, its model isn't joined
+    query = make_query({"text": {"text": "***"}})
+    sql = str(query.query())
+    assert " JOIN change" not in sql and "MATCH" not in sql
+    with synthetic_db_engine.connect() as conn:
+        all_ids = set(conn.execute(select(Construction.id)).scalars())
+    assert search_ids(synthetic_db_engine, query) == all_ids
@@ -0,0 +1,123 @@
+import itertools
+import json
+import socket
+
+import pytest
+
+from sqlalchemy import create_engine, text
+
+from app import create_app
+from app.database_utils import add_query_guard
+from app.metrics import metrics
+from app.query_guard import QueryBudget, QueryBudgetExceeded, is_client_gone, query_budget
+from app.search import search2
+from app.search.streaming import stream_rows
+from config import TestConfig
+
+
+def counting(n):
+    return text("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c "
+                f"WHERE x < {n}) SELECT x FROM c")
+
+
+def count_to(n):
+    return text(f"SELECT count(*) FROM ({counting(n).text})")
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", future=True)
+    add_query_guard(engine)
+    return engine
+
+
+@pytest.mark.parametrize("limits, reason", [
+    (dict(max_steps=100_000), "steps"),
+    # a second per call
+    (dict(max_seconds=5, clock=itertools.count().__next__), "time"),
+    (dict(is_cancelled=lambda: True), "cancelled"),
+])
+def test_aborted(engine, limits, reason):
+    before = metrics.get(f"query_guard.aborted.{reason}")
+
+    with engine.connect() as conn:
+        with pytest.raises(QueryBudgetExceeded) as e:
+            with query_budget(**limits) as budget:
+                conn.execute(count_to(10_000_000)).scalar()
+        # the connection is still fine
+        assert conn.execute(count_to(1000)).scalar() == 1000
+
+    assert e.value.reason == budget.exceeded == reason
+    assert metrics.get(f"query_guard.aborted.{reason}") == before + 1
+
+
+def test_within_budget(engine):
+    with engine.connect() as conn:
+        assert conn.execute(count_to(100_000)).scalar() == 100_000
+        with query_budget(max_steps=100_000_000, max_seconds=60) as budget:
+            assert conn.execute(count_to(100_000)).scalar() == 100_000
+
+    assert budget.exceeded is None and budget.steps > 0
+
+
+def test_stream_cut(engine):
+    budget = QueryBudget(max_steps=200_000)
+    rows = list(stream_rows(engine, counting(10_000_000), yield_per=100, budget=budget))
+
+    assert budget.exceeded == "steps"
+    assert 0 < len(rows) < 10_000_000
+    assert [row["x"] for row in rows] == list(range(1, len(rows) + 1))
+
+
+def test_is_client_gone():
+    server, client = socket.socketpair()
+    environ = {"werkzeug.socket": server}
+    assert not is_client_gone({})
+    assert not is_client_gone(environ)
+    client.close()
+    assert is_client_gone(environ)
+    server.close()
+
+
+@pytest.fixture
+def app(synthetic_db_engine):
+    app = create_app(test_config_obj=TestConfig)
+    app.config["WTF_CSRF_ENABLED"] = False
+    # the database is small: its statements take a few thousand steps
+    app.engine = create_engine(synthetic_db_engine.url, future=True)
+    add_query_guard(app.engine, n_steps=100)
+    return app
+
+
+FORM = {"changes-0-level": "synt"}
+
+
+def test_refine_query(app):
+    app.config["SEARCH_QUERY_MAX_STEPS"] = 1
+    client = app.test_client()
+
+    response = client.post("/form", data=FORM)
+    assert response.status_code == 200
+    assert "уточните запрос" in response.text
+
+    response = client.post("/api/search", data=FORM)
+    assert response.status_code == 422
+    assert response.json["reason"] == "steps"
+
+
+def test_partial_stream(app, monkeypatch):
+    client = app.test_client()
+    found = client.post("/api/search", data=FORM).json
+    assert "partial" not in found
+
+    # enough to count the constructions, not to fetch them
+    monkeypatch.setattr(search2, "stream_budget", lambda: QueryBudget(max_steps=1))
+    partial = json.loads(client.post("/api/search", data=FORM).text)
+    assert partial["partial"] == "steps"
+    assert partial["total"] == found["total"]
+    assert len(partial["constructions"]) < found["total"]
+    assert partial["constructions"] == found["constructions"][:len(partial["constructions"])]
+
+    response = client.post("/form", data={**FORM, "stream": "1"})
+    assert f"Найдено конструкций: {found['total']}" in response.text
+    assert "Показаны не все результаты" in response.text
@@ -0,0 +1,106 @@
+import re
+
+import pytest
+
+from app import create_app
+from app.search.query import Comparison
+from app.search.query_memory import (
+    MemComparison,
+    MemQuery,
+    MemStore,
+    default_memquery,
+    get_memory_store,
+)
+from app.search.query_sqlalchemy import SQLComparison, SQLQuery, default_sqlquery
+from config import TestConfig
+
+
+@pytest.fixture(scope="module")
+def memory_store(synthetic_db_engine):
+    with synthetic_db_engine.connect() as conn:
+        return MemStore.from_connection(conn)
+
+
+def sql_ids(engine, form):
+    query = default_sqlquery()
+    query.parse_form(form)
+    with engine.connect() as conn:
+        return {row.id for row in conn.execute(query.query())}
+
+
+def memory_ids(store, form):
+    query = default_memquery(store)
+    query.parse_form(form)
+    return set(query.query().tolist())
+
+
+def test_registries():
+    assert MemQuery.REGISTRY["Comparison"] is MemComparison
+    assert SQLQuery.REGISTRY["Comparison"] is SQLComparison
+    assert Comparison.REGISTRY["Comparison"] is Comparison
+
+
+@pytest.mark.parametrize("form", [
+    {"construction": {"formula": "NP*"}},
+    {"construction": {"formula": "не * NP*"}},
+    {"construction": {"formula": "не * NP*", "skip_optional": True}},
+    {"construction": {"formula": "N-Gen* Cop"}},
+    {"construction": {"formula": "N-Gen* Cop", "skip_optional": True}},
+    {"construction": {"formula": "хоть"}},
+    {"construction": {"contemporary_meaning": "Minimizer",
+                      "in_rus_constructicon": False}},
+    {"anchor": {"anchor_ru": "хоть*"}},
+    {"anchor": {"anchor_ru": "руд п", "anchor_schema": "part*"}},
+    {"general_info": {"name": "пруд"}},
+    {"construction": {"num_changes__from": 2, "anchor_length__to": 3}},
+    {"construction": {"num_changes__from": 2, "num_changes__to": 4}},
+    {"changes": [{"level": "synt"}, {"type_of_change": "source"}]},
+    {"changes": [{"level": "synt", "type_of_change": "source"}]},
+    {"changes": [{"first_attested__from": 1800, "duration__from": 20}]},
+    {"changes": [{"first_attested__to": 1850}, {"last_attested__from": 1900}]},
+    {"changes": [{"last_attested__from": 1850, "last_attested__to": 1900}]},
+    {"changes": [{"first_attested": "1830-ые"}]},
+    {"construction": {"formula": "NP*", "anchor_length__from": 2},
+     "changes": [{"level": "synt"}]},
+    {"construction": {"contemporary_meaning": "Minimizer | Quantity & -Negation"}},
+    {"anchor": {"synt_function_of_anchor": "-Subject | -Modifier & -Argument"}},
+])
+def test_same_as_sql(synthetic_db_engine, memory_store, form):
+    assert memory_ids(memory_store, form) == sql_ids(synthetic_db_engine, form)
+
+
+def test_full_text_not_supported(memory_store):
+    with pytest.raises(NotImplementedError):
+        memory_ids(memory_store, {"changes": [{"text": "прессе"}]})
+
+
+def test_construction_rows(synthetic_db_engine, memory_store):
+    form = {"construction": {"formula": "NP*"}}
+    query = default_sqlquery()
+    query.parse_form(form)
+    with synthetic_db_engine.connect() as conn:
+        expected = {tuple(row) for row in conn.execute(query.query())}
+
+    rows = memory_store.construction_rows(memory_ids(memory_store, form))
+    assert {(row["id"], row["formula"], row["name"]) for row in rows} == expected
+
+
+def test_store_is_cached(synthetic_db_engine):
+    assert get_memory_store(synthetic_db_engine) is get_memory_store(synthetic_db_engine)
+
+
+def test_form_view(synthetic_db_engine):
+    app = create_app(test_config_obj=TestConfig)
+    app.config["WTF_CSRF_ENABLED"] = False
+    app.engine = synthetic_db_engine
+
+    found = {}
+    for backend in ("sql", "memory"):
+        app.config["SEARCH_BACKEND"] = backend
+        response = app.test_client().post("/form", data={"construction-formula": "NP*"})
+        assert response.status_code == 200
+        found[backend] = set(re.findall(r'href="/construction/(\d+)/"',
+                                        response.data.decode()))
+
+    assert found["sql"]
+    assert found["memory"] == found["sql"]
@@ -0,0 +1,101 @@
+"""The hot queries must keep using the indexes from the migrations
+
+Each query is run through `EXPLAIN QUERY PLAN`: at most one table (the one
+that drives the join) may be scanned, everything else must be a `SEARCH`
+or a scan of an index.
+"""
+import typing as T
+
+import pytest
+from sqlalchemy import event, select
+
+from config import TestConfig
+from app import create_app
+from app.models import Construction
+from app.search.query_sqlalchemy import default_sqlquery
+
+
+def query_plan(engine, sql: str, params) -> T.List[str]:
+    with engine.connect() as conn:
+        return [row[-1] for row in
+                conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def full_scans(plan: T.List[str]) -> T.List[str]:
+    # automatic indexes are built for the single query, from a full scan
+    return [line for line in plan
+            if (line.startswith("SCAN") and "INDEX" not in line)
+            or "AUTOMATIC" in line]
+
+
+def assert_uses_indexes(engine, sql: str, params):
+    plan = query_plan(engine, sql, params)
+    assert len(full_scans(plan)) <= 1, "\n".join([sql] + plan)
+
+
+@pytest.mark.parametrize("form", [
+    {"construction": {"formula": "NP*"}},
+    {"construction": {"formula": "не * NP*"}},
+    {"construction": {"formula": "не * NP*", "skip_optional": True}},
+    {"construction": {"formula": "N-Gen* Cop"}},
+    {"anchor": {"anchor_ru": "хоть*"}},
+    {"anchor": {"anchor_ru": "руд п"}},
+    {"construction": {"contemporary_meaning": "minimizer"}},
+    {"changes": [{"level": "synt"}, {"type_of_change": "source"}]},
+    {"construction": {"num_changes__from": 2, "anchor_length__to": 3}},
+    {"changes": [{"first_attested__from": 1800, "duration__from": 20}]},
+    {"changes": [{"text": "прессе", "level": "synt"}]},
+    {"construction": {"contemporary_meaning": "Minimizer | -Negation"}},
+    {"anchor": {"synt_function_of_anchor": "-Subject"}},
+])
+def test_search_query_plan(synthetic_db_engine, form):
+    query = default_sqlquery()
+    query.parse_form(form)
+    compiled = query.query().compile(synthetic_db_engine)
+
+    # a parameter may be bound more than once, e.g. in correlated subqueries
+    assert_uses_indexes(synthetic_db_engine, str(compiled),
+                        tuple(compiled.params[key] for key in compiled.positiontup))
+
+
+def test_disjunction_branches_use_indexes(synthetic_db_engine):
+    query = default_sqlquery()
+    query.parse_form({"construction": {
+        "contemporary_meaning": "Minimizer | Negation | Causation"}})
+    compiled = query.query().compile(synthetic_db_engine)
+    plan = query_plan(synthetic_db_engine, str(compiled),
+                      tuple(compiled.params[key] for key in compiled.positiontup))
+
+    assert "UNION" in str(compiled)
+    # the branches of the union, each searched by the index
+    branches = [line for line in plan
+                if "ix_construction_contemporary_meaning_norm" in line]
+    assert len(branches) == 3, "\n".join(plan)
+    assert all(line.startswith("SEARCH") for line in branches), "\n".join(plan)
+
+
+def test_construction_page_query_plans(synthetic_db_engine):
+    app = create_app(test_config_obj=TestConfig)
+    app.engine = synthetic_db_engine
+
+    with synthetic_db_engine.connect() as conn:
+        construction_id = conn.execute(select(Construction.id)).scalars().first()
+
+    statements = []
+
+    def collect(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(synthetic_db_engine, "before_cursor_execute", collect)
+    try:
+        response = app.test_client().get(f"/construction/{construction_id}/")
+    finally:
+        event.remove(synthetic_db_engine, "before_cursor_execute", collect)
+
+    assert response.status_code == 200
+    # the selectinloads of the related rows
+    assert len(statements) > 1
+    for statement, parameters in statements:
+        plan = query_plan(synthetic_db_engine, statement, parameters)
+        assert not full_scans(plan), "\n".join([statement] + plan)
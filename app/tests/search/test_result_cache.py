@@ -0,0 +1,114 @@
+import pytest
+
+from app import create_app
+from app.metrics import Metrics, metrics
+from app.search.result_cache import ResultCache
+from app.update_db.update import refresh_after_import
+from config import TestConfig
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(clock):
+    metrics.reset()
+    return ResultCache(max_rows=10, ttl=60, name="test_cache", clock=clock)
+
+
+def test_metrics():
+    counters = Metrics()
+    counters.incr("a.hits")
+    counters.incr("a.hits", 2)
+    counters.incr("b.hits")
+
+    assert counters.get("a.hits") == 3
+    assert counters.snapshot("a.") == {"a.hits": 3}
+    counters.reset()
+    assert counters.snapshot() == {}
+
+
+def test_hit_miss(cache):
+    assert cache.get("q", 1) is None
+    cache.put("q", 1, ["row"], n_rows=1)
+
+    assert cache.get("q", 1) == ["row"]
+    assert metrics.snapshot("test_cache.") == {"test_cache.hits": 1,
+                                               "test_cache.misses": 1}
+
+
+def test_evicts_least_recently_used(cache):
+    cache.put("a", 1, "a", n_rows=4)
+    cache.put("b", 1, "b", n_rows=4)
+    cache.get("a", 1)
+    cache.put("c", 1, "c", n_rows=4)
+
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) == "a" and cache.get("c", 1) == "c"
+    assert cache.n_rows == 8
+    assert metrics.get("test_cache.evictions") == 1
+
+
+def test_too_large_not_cached(cache):
+    cache.put("a", 1, "a", n_rows=4)
+    cache.put("huge", 1, "huge", n_rows=11)
+
+    assert len(cache) == 1 and cache.get("a", 1) == "a"
+
+
+def test_disabled(clock):
+    cache = ResultCache(max_rows=0, clock=clock)
+    cache.put("empty", 1, [], n_rows=0)
+
+    assert len(cache) == 0
+
+
+def test_ttl(cache, clock):
+    cache.put("q", 1, "q", n_rows=1)
+    clock.now = 59
+    assert cache.get("q", 1) == "q"
+
+    clock.now = 60
+    assert cache.get("q", 1) is None
+    assert len(cache) == 0 and cache.n_rows == 0
+    assert metrics.get("test_cache.expirations") == 1
+
+
+def test_new_generation_invalidates(cache):
+    cache.put("q", 1, "q", n_rows=1)
+
+    assert cache.get("q", 2) is None
+    assert len(cache) == 0
+    assert metrics.get("test_cache.invalidations") == 1
+
+
+def test_form_cached(synthetic_db_engine):
+    app = create_app(test_config_obj=TestConfig)
+    app.config["WTF_CSRF_ENABLED"] = False
+    app.engine = synthetic_db_engine
+    client = app.test_client()
+    metrics.reset()
+
+    form = {"construction-formula": "NP*"}
+    first = client.post("/form", data=form)
+    assert first.status_code == 200
+    assert client.post("/form", data=form).data == first.data
+    # the same query, up to canonicalization
+    assert client.post("/form", data={"construction-formula": " NP** "}).status_code == 200
+    assert client.get("/api/metrics?prefix=search_cache.").json == {
+        "search_cache.hits": 2, "search_cache.misses": 1}
+
+    refresh_after_import(synthetic_db_engine)
+    assert client.post("/form", data=form).data == first.data
+    assert metrics.get("search_cache.invalidations") == 1
+    assert metrics.get("search_cache.misses") == 2
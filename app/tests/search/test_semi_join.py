@@ -0,0 +1,83 @@
+from collections import defaultdict
+
+import pytest
+
+from sqlalchemy import select
+
+from app import create_app
+from app.models import Change
+from app.search.query_sqlalchemy import default_sqlquery
+from config import TestConfig
+
+
+def search(engine, form, matched_changes=False):
+    query = default_sqlquery(matched_changes=matched_changes)
+    query.parse_form(form)
+    with engine.connect() as conn:
+        return conn.execute(query.query()).mappings().all()
+
+
+def changes_where(engine, *where):
+    """construction id: ids of its changes matching `where`"""
+    with engine.connect() as conn:
+        rows = conn.execute(select(Change.construction_id, Change.id).where(*where)).all()
+    changes = defaultdict(list)
+    for construction_id, change_id in rows:
+        changes[construction_id].append(change_id)
+    return changes
+
+
+GROUPS = [Change.level == "synt", Change.type_of_change == "source",
+          Change.first_year_hi >= 1800]
+FORM = {"changes": [{"level": "synt"}, {"type_of_change": "source"},
+                    {"first_attested__from": 1800}]}
+
+
+def test_construction_once(synthetic_db_engine):
+    rows = search(synthetic_db_engine, FORM)
+
+    matched = [changes_where(synthetic_db_engine, group) for group in GROUPS]
+    expected = set(matched[0]).intersection(*matched[1:])
+    assert expected
+    # a construction has several changes of each group, but comes in a row
+    assert any(len(matched[0][construction_id]) > 1 for construction_id in expected)
+    ids = [row["id"] for row in rows]
+    assert len(ids) == len(set(ids))
+    assert set(ids) == expected
+
+
+def test_matched_changes(synthetic_db_engine):
+    rows = search(synthetic_db_engine, FORM, matched_changes=True)
+
+    assert rows
+    for label, group in zip(["matched_changes", "matched_changes_2", "matched_changes_3"],
+                            GROUPS):
+        matched = changes_where(synthetic_db_engine, group)
+        assert all(sorted(row[label]) == sorted(matched[row["id"]]) for row in rows)
+
+
+def test_not_joined(synthetic_db_engine):
+    query = default_sqlquery()
+    query.parse_form(FORM)
+    sql = str(query.query().compile(synthetic_db_engine))
+
+    assert " JOIN change" not in sql
+    assert sql.count("EXISTS") == len(GROUPS)
+
+
+def test_api_matched_changes(synthetic_db_engine):
+    app = create_app(test_config_obj=TestConfig)
+    app.config["WTF_CSRF_ENABLED"] = False
+    app.engine = synthetic_db_engine
+    client = app.test_client()
+    data = {"changes-0-level": "synt", "changes-1-type_of_change": "source"}
+
+    found = client.post("/api/search", data=data).json
+    assert all("matched_changes" not in row
+               for construction in found["constructions"] for row in construction["rows"])
+
+    found = client.post("/api/search", data={**data, "matched_changes": "1"}).json
+    assert found["total"] == len(found["constructions"])
+    for construction in found["constructions"]:
+        row, = construction["rows"]
+        assert row["matched_changes"] and row["matched_changes_2"]
@@ -0,0 +1,56 @@
+import pytest
+
+from sqlalchemy import create_engine
+
+from app.metrics import metrics
+from app.models import Change, FormulaElement
+from app.search.query_sqlalchemy import default_sqlquery, pooled_alias
+
+
+def make_stmt(form):
+    query = default_sqlquery()
+    query.parse_form(form)
+    return query.query()
+
+
+@pytest.mark.parametrize("form,other_form", [
+    ({"construction": {"formula": "NP* Cop"}}, {"construction": {"formula": "VP* Adv"}}),
+    ({"construction": {"formula": "не * NP*", "skip_optional": True}},
+     {"construction": {"formula": "да * VP*", "skip_optional": True}}),
+    ({"construction": {"formula": "N-Gen* Cop"}}, {"construction": {"formula": "N-Dat* Adv"}}),
+    ({"anchor": {"anchor_ru": "хоть*"}}, {"anchor": {"anchor_ru": "даже*"}}),
+    ({"construction": {"num_changes__from": 2}}, {"construction": {"num_changes__from": 4}}),
+    ({"changes": [{"level": "synt"}, {"first_attested__from": 1800}]},
+     {"changes": [{"level": "morph"}, {"first_attested__from": 1700}]}),
+    ({"changes": [{"text": "частица"}]}, {"changes": [{"text": "союз"}]}),
+])
+def test_same_shape_compiled_once(synthetic_db_engine, form, other_form):
+    # a fresh compiled cache
+    engine = create_engine(synthetic_db_engine.url, future=True)
+    metrics.reset()
+
+    with engine.connect() as conn:
+        conn.execute(make_stmt(form)).all()
+        conn.execute(make_stmt(other_form)).all()
+        conn.execute(make_stmt(form)).all()
+
+    assert metrics.get("sql_compiled_cache.misses") == 1
+    assert metrics.get("sql_compiled_cache.hits") == 2
+    engine.dispose()
+
+
+def test_aliases_pooled():
+    query = default_sqlquery()
+
+    assert query.take_aliases(Change, 2) == [pooled_alias(Change, 0), pooled_alias(Change, 1)]
+    # not taken twice for one statement
+    assert query.take_aliases(Change, 1) == [pooled_alias(Change, 2)]
+    assert query.take_aliases(FormulaElement, 1) == [pooled_alias(FormulaElement, 0)]
+    assert pooled_alias(Change, 0) is not pooled_alias(FormulaElement, 0)
+
+
+def test_statement_reuses_aliases():
+    form = {"construction": {"formula": "NP Cop Adv"},
+            "changes": [{"level": "synt"}, {"level": "morph"}]}
+
+    assert str(make_stmt(form)) == str(make_stmt(form))
@@ -0,0 +1,107 @@
+import json
+import re
+from collections import Counter
+
+import pytest
+
+from app import create_app
+from app.search.search2 import parse_search_form
+from app.search.streaming import group_consecutive_rows, stream_json, stream_rows
+from config import TestConfig
+
+
+@pytest.fixture
+def app(synthetic_db_engine):
+    app = create_app(test_config_obj=TestConfig)
+    app.config["WTF_CSRF_ENABLED"] = False
+    app.engine = synthetic_db_engine
+    return app
+
+
+def hrefs(text):
+    return re.findall(r'href="(/construction/\d+/)"', text)
+
+
+def test_group_consecutive_rows():
+    rows = [{"id": 1, "v": "a"}, {"id": 1, "v": "b"}, {"id": 2, "v": "c"}, {"id": 3, "v": "d"}]
+
+    assert list(group_consecutive_rows(iter(rows))) == [
+        (1, rows[:2]), (2, rows[2:3]), (3, rows[3:])]
+
+
+def test_stream_rows(synthetic_db_engine):
+    from sqlalchemy import select
+    from app.models import Construction
+
+    stmt = select(Construction.id).order_by(Construction.id)
+    rows = stream_rows(synthetic_db_engine, stmt, yield_per=7)
+    first = next(rows)
+    with synthetic_db_engine.connect() as conn:
+        expected = conn.execute(stmt).scalars().all()
+
+    assert [first["id"]] + [row["id"] for row in rows] == expected
+
+
+def test_stream_json_is_lazy(app):
+    consumed = []
+
+    def items():
+        for i in range(3):
+            consumed.append(i)
+            yield {"i": i}
+
+    with app.test_request_context():
+        response = stream_json({"total": 3}, "items", items())
+        chunks = iter(response.response)
+        next(chunks)
+        assert consumed == []
+        body = next(chunks) + "".join(chunks)
+
+    assert json.loads('{"total": 3, "items": [' + body) == {
+        "total": 3, "items": [{"i": 0}, {"i": 1}, {"i": 2}]}
+
+
+@pytest.mark.parametrize("backend", ["sql", "memory"])
+@pytest.mark.parametrize("form", [
+    {"construction-formula": "*"},
+    {"construction-formula": "NP*"},
+    {"changes-0-level": "synt"},
+    {"changes-0-text": "прес*"},
+])
+def test_form_streamed(app, backend, form):
+    app.config["SEARCH_BACKEND"] = backend
+    client = app.test_client()
+
+    streamed = client.post("/form", data={**form, "stream": "1"})
+    assert streamed.is_streamed
+
+    paged, cursor = [], None
+    while True:
+        page = client.post("/form", data={**form, "page_size": 500,
+                                          **({"cursor": cursor} if cursor else {})})
+        paged += hrefs(page.text)
+        if not (match := re.search(r'name="cursor" value="([^"]+)"', page.text)):
+            break
+        cursor = match.group(1)
+
+    # every construction once, by id
+    assert Counter(hrefs(streamed.text)) == Counter(paged)
+    assert f"Найдено конструкций: {len(paged)}" in streamed.text
+
+
+def test_api_search(app, synthetic_db_engine):
+    client = app.test_client()
+    form = {"changes": [{"level": "synt"}]}
+
+    response = client.post("/api/search", data={"changes-0-level": "synt"})
+    assert response.is_streamed
+    found = response.json
+    with app.test_request_context(), synthetic_db_engine.connect() as conn:
+        expected = conn.execute(parse_search_form(form).query()).mappings().all()
+
+    assert found["total"] == len(found["constructions"]) == len({row["id"] for row in expected})
+    ids = [construction["id"] for construction in found["constructions"]]
+    assert ids == sorted(ids)
+    assert (Counter(tuple(sorted(row.items()))
+                    for construction in found["constructions"] for row in construction["rows"])
+            == Counter(tuple(sorted(dict(row).items())) for row in expected))
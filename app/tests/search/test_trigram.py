@@ -0,0 +1,63 @@
+import pytest
+
+from sqlalchemy import select, update
+
+from app.models import Construction, FormulaElement, GeneralInfo
+from app.search.query_sqlalchemy import default_sqlquery, trigram_prefilter
+
+
+def search_ids(conn, form):
+    query = default_sqlquery()
+    query.parse_form(form)
+    return {row.id for row in conn.execute(query.query())}
+
+
+@pytest.mark.parametrize("sql_model,param,pattern", [
+    (Construction, "anchor_ru", "%ни%"),
+    (Construction, "anchor_ru", "%ни_ни%"),
+    (Construction, "contemporary_meaning", "%Minimizer%"),
+    (FormulaElement, "value", "%капли%"),
+])
+def test_no_prefilter(sql_model, param, pattern):
+    assert trigram_prefilter(sql_model, param, pattern) is None
+
+
+def test_prefilter_match():
+    prefilter = trigram_prefilter(GeneralInfo, "name", '%Ёж "x%пруд%')
+    compiled = prefilter.compile(compile_kwargs={"literal_binds": True})
+    assert "general_info_trigram MATCH " in str(compiled)
+    assert """name : "еж ""x" AND name : "пруд\"""" in str(compiled)
+
+
+@pytest.mark.parametrize("form_name,param,value", [
+    ("anchor", "anchor_ru", "Руд п"),
+    ("anchor", "anchor_ru", "ни"),
+    ("anchor", "anchor_ru", "*хоть*когда*"),
+    ("general_info", "name", "КАПЛИ"),
+])
+def test_same_results_as_scan(synthetic_db_engine, form_name, param, value):
+    model = GeneralInfo if form_name == "general_info" else Construction
+    key = model.construction_id if model is GeneralInfo else model.id
+    pattern = value.lower().replace("*", "%").strip("%")
+    with synthetic_db_engine.connect() as conn:
+        expected = set(conn.execute(
+            select(key).where(getattr(model, param).like(f"%{pattern}%"))
+        ).scalars())
+        ids = search_ids(conn, {form_name: {param: value}})
+
+    assert expected
+    assert ids == expected
+
+
+def test_index_follows_updates(synthetic_db_engine):
+    with synthetic_db_engine.connect() as conn:
+        with conn.begin() as transaction:
+            construction_id = conn.execute(select(Construction.id)).scalars().first()
+            conn.execute(update(Construction)
+                         .where(Construction.id == construction_id)
+                         .values(anchor_ru="ёжиков", anchor_ru_norm="ежиков"))
+
+            assert search_ids(conn, {"anchor": {"anchor_ru": "ЕЖИК"}}) == {construction_id}
+            transaction.rollback()
+
+        assert not search_ids(conn, {"anchor": {"anchor_ru": "ежик"}})
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from sqlalchemy import event, select, update
+
+from app import create_app
+from app.database_utils import bump_data_generation
+from app.models import Change, Construction
+from app.search.vocabulary import (
+    get_vocabulary,
+    load_vocabulary,
+    vocabulary_values,
+    Vocabulary,
+)
+from config import TestConfig
+
+
+@pytest.fixture
+def app(synthetic_db_engine):
+    app = create_app(test_config_obj=TestConfig)
+    app.engine = synthetic_db_engine
+    return app
+
+
+def test_vocabulary(synthetic_db_engine):
+    vocabulary = get_vocabulary(synthetic_db_engine)
+    assert get_vocabulary(synthetic_db_engine) is vocabulary
+
+    with synthetic_db_engine.connect() as conn:
+        types = set(conn.execute(select(Change.type_of_change)).scalars()) - {None}
+    assert vocabulary["types_of_change"] == sorted(types)
+    assert vocabulary["meanings"] and vocabulary["construction_formulas"]
+    assert vocabulary["no such vocabulary"] == []
+
+
+def test_json(synthetic_db_engine, tmp_path):
+    path = str(tmp_path / "vocabulary.json")
+    vocabulary = get_vocabulary(synthetic_db_engine)
+    vocabulary.to_json(path)
+
+    loaded = load_vocabulary(path)
+    assert loaded.values == vocabulary.values
+    assert load_vocabulary(path) is loaded
+
+    Vocabulary({"meanings": ["другое"]}).to_json(path)
+    os.utime(path, (0, os.stat(path).st_mtime + 1))
+    assert load_vocabulary(path)["meanings"] == ["другое"]
+
+
+def test_new_values_shown(app, synthetic_db_engine):
+    client = app.test_client()
+    assert "Новое значение" not in client.get("/search/").text
+
+    with synthetic_db_engine.begin() as conn:
+        conn.execute(update(Construction).where(Construction.id == 1)
+                     .values(contemporary_meaning="Новое значение"))
+        bump_data_generation(conn)
+
+    assert "Новое значение" in client.get("/search/").text
+    with app.app_context():
+        assert "Новое значение" in vocabulary_values("meanings")()
+
+
+def test_from_json_reads_no_database(app, synthetic_db_engine, tmp_path):
+    path = str(tmp_path / "vocabulary.json")
+    Vocabulary({"meanings": ["из файла"], "construction_names": ["NP из файла"]}).to_json(path)
+    app.config["VOCABULARY_PATH"] = path
+    client = app.test_client()
+    statements = []
+
+    def collect(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(synthetic_db_engine, "before_cursor_execute", collect)
+    try:
+        search_page = client.get("/search/").text
+        main_page = client.get("/").text
+    finally:
+        event.remove(synthetic_db_engine, "before_cursor_execute", collect)
+
+    assert statements == []
+    assert '<option value="из файла">' in search_page
+    assert '<option value="NP из файла">' in main_page
@@ -3,6 +3,8 @@ import unittest
 import sys
 import logging
 
+import sqlalchemy.exc
+
 from app.database_utils import init_db, make_database
 from app.update_db.update import parse
 
@@ -74,6 +76,42 @@ class DBCreateTestCase(unittest.TestCase):
     #         )
 
 
+class DBProfileTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.db_name = 'test_profile_diachronicon.db'
+        self.uri = 'sqlite:///' + self.db_name
+        make_database(self.uri, sqlalchemy_echo=False, do_init=True)
+
+    def tearDown(self) -> None:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_name + suffix):
+                os.remove(self.db_name + suffix)
+
+    def test_unknown_profile(self) -> None:
+        with self.assertRaises(ValueError):
+            make_database(self.uri, sqlalchemy_echo=False, profile='no-such')
+
+    def test_serving_pragmas(self) -> None:
+        engine, db_session, Base = make_database(
+            self.uri, sqlalchemy_echo=False, profile='serving')
+
+        with engine.connect() as conn:
+            pragma = lambda name: conn.exec_driver_sql(f'PRAGMA {name}').scalar()
+            self.assertEqual(pragma('journal_mode'), 'wal')
+            self.assertEqual(pragma('query_only'), 1)
+            self.assertEqual(pragma('temp_store'), 2)
+            self.assertGreater(pragma('mmap_size'), 0)
+
+    def test_serving_read_only(self) -> None:
+        engine, db_session, Base = make_database(
+            self.uri, sqlalchemy_echo=False, profile='serving')
+
+        self.assertIn('mode=ro', str(engine.url))
+        with engine.connect() as conn:
+            with self.assertRaises(sqlalchemy.exc.OperationalError):
+                conn.exec_driver_sql('DELETE FROM construction')
+
+
 # class DBUpdateTestCase(unittest.TestCase):
 #     def test_something(self):
 #         pass
@@ -2,6 +2,7 @@ import pytest
 import unittest
 
 from app.models import (
+    Change,
     ConstructionVariant,
     FormulaElement,
 )
@@ -178,6 +179,69 @@ class TestToFormula:
         )
 
 
+@pytest.mark.parametrize("formula,order2next", [
+    ("Prep N-Dat.Sg не", {0: {1}, 1: {2}, 2: set()}),
+    ("NP Cop не что (иное) как NP",
+     {0: {1}, 1: {2}, 2: {3}, 3: {4, 5}, 4: {5}, 5: {6}, 6: set()}),
+    ("(у NP-Gen) руки (Inf)", {0: {1}, 1: {2}, 2: {3}, 3: set()}),
+    ("NP (Cop) (не) что", {0: {1, 2, 3}, 1: {2, 3}, 2: {3}, 3: set()}),
+    ("N-Nom знает ((PronInt) (NP))", {0: {1}, 1: {2, 3}, 2: {3}, 3: set()}),
+    ("не то (чтобы (CCONJ) XP) как", {0: {1}, 1: {2, 5}, 2: {3, 4}, 3: {4},
+                                      4: {5}, 5: set()}),
+])
+def test_formula_adjacency(formula, order2next):
+    assert u.formula_adjacency(formula) == order2next
+
+
+@pytest.mark.parametrize("value,features", [
+    ("N-Gen.Pl", dict(pos="n", case="gen", number="pl", is_lexical=False)),
+    ("NP-Dat", dict(pos="np", case="dat", number=None, is_lexical=False)),
+    ("Cop", dict(pos="cop", case=None, number=None, is_lexical=False)),
+    ("сдаться-Pst", dict(pos=None, case=None, number=None, is_lexical=True)),
+    ("хоть", dict(pos=None, case=None, number=None, is_lexical=True)),
+])
+def test_parse_features(value, features):
+    assert FormulaElement.parse_features(value) == features
+
+
+def test_to_formula_links_elements():
+    elems = u.to_formula("NP Cop не что (иное) как NP")
+
+    links = {(elem.order, link.next_element.order, link.next_value,
+              link.skips_optional)
+             for elem in elems for link in elem.next_links}
+    assert (3, 4, "иное", False) in links
+    assert (3, 5, "как", True) in links
+    assert len(links) == len(elems)
+
+
+@pytest.mark.parametrize("year,year_range", [
+    ("1890", (1890, 1890)),
+    (1890, (1890, 1890)),
+    ("1890-1900", (1890, 1900)),
+    ("1890–1900", (1890, 1900)),
+    ("1950-60", (1950, 1960)),
+    ("1990-05", (1990, 2005)),
+    ("1830-ые", (1830, 1839)),
+    ("1950-60-ые", (1950, 1969)),
+    ("-", (None, None)),
+    (None, (None, None)),
+])
+def test_parse_year_range(year, year_range):
+    assert Change.parse_year_range(year) == year_range
+
+
+def test_process_change_sets_year_ranges():
+    phrase_dict = dict(stage="entire_construction", first_attested="1950—60-ые",
+                       last_attested="1990", morphosyntags=None, semantags=None)
+    change = Change(**phrase_dict)
+    u.process_change(phrase_dict, change)
+
+    assert change.first_attested == "1950-60-ые"
+    assert (change.first_year_lo, change.first_year_hi) == (1950, 1969)
+    assert (change.last_year_lo, change.last_year_hi) == (1990, 1990)
+
+
 if __name__ == "__main__":
     unittest.main()
 
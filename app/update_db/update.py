@@ -3,6 +3,7 @@ import argparse
 from collections import defaultdict
 import logging
 from functools import wraps
+import itertools
 import re
 import traceback
 import typing as T
@@ -14,7 +15,9 @@ import openpyxl
 from openpyxl import load_workbook
 import openpyxl.worksheet
 import openpyxl.worksheet.worksheet
+from sqlalchemy import delete, func, insert, select
 
+from ..database_utils import bump_data_generation
 from ..models import (
     UNKNOWN_SYNT_FUNCTION_OF_ANCHOR,
     SYNT_FUNCTION_OF_ANCHOR_VALUES,
@@ -26,7 +29,14 @@ from ..models import (
     Change,
     Constraint,
     FormulaElement,
+    FormulaElementNext,
     GeneralTag,
+    ConstructionStats,
+    CHANGE_FTS_COLUMNS,
+    change_fts,
+    change_fts_source,
+    fts_source_text,
+    normalize_fts_text,
 )
 
 
@@ -230,9 +240,66 @@ def parse_formula(
             elements.append({"value": token["val"], "order": order})
             order += 1
 
+    for element in elements:
+        element.update(FormulaElement.parse_features(element["value"]))
+
     return elements
 
 
+def formula_adjacency(formula: str) -> Dict[int, T.Set[int]]:
+    """Orders of elements that may follow each element if spans are skipped
+
+    Orders are the ones `parse_formula` gives. Every span (bracketed part)
+    is optional, so the elements after an element are the next one and, for
+    every span that follows, the elements after that span."""
+    orders = itertools.count()
+
+    def number(tokens: List[Dict]) -> List[T.Tuple[str, T.Any]]:
+        items = []
+        for token in tokens:
+            if token.get("type") != "maybe_span":
+                items.append(("element", next(orders)))
+            elif len(token["val"]) == 1:
+                # `flatten_span` makes a single optional element of it
+                items.append(("span", [("element", next(orders))]))
+            else:
+                items.append(("span", number(token["val"])))
+        return items
+
+    order2next: Dict[int, T.Set[int]] = {}
+
+    def follow(items: List[T.Tuple[str, T.Any]], after: T.Set[int]) -> T.Set[int]:
+        """Fill `order2next` for `items`, return the orders `items` may start at"""
+        next_orders = after
+        for kind, item in reversed(items):
+            if kind == "element":
+                order2next[item] = next_orders
+                next_orders = {item}
+            else:
+                next_orders = follow(item, next_orders) | next_orders
+        return next_orders
+
+    follow(number(tokenize_formula(formula)), set())
+    return order2next
+
+
+def link_formula_elements(formula: str, elements: List[FormulaElement]) -> None:
+    """Add `FormulaElementNext` links between `elements` of `formula`"""
+    order2element = {element.order: element for element in elements}
+    for order, next_orders in formula_adjacency(formula).items():
+        element = order2element.get(order)
+        if element is None:
+            continue
+        for next_order in sorted(next_orders):
+            next_element = order2element.get(next_order)
+            if next_element is None:
+                continue
+            element.next_links.append(FormulaElementNext(
+                next_element=next_element, next_value=next_element.value_norm,
+                skips_optional=next_order != order + 1,
+            ))
+
+
 # TODO: special processing for NP (=NP-nom) ?
 def parse_formula_old(
         formula: str,
@@ -388,6 +455,8 @@ def to_formula(
     formula_elements = formula_parser(formula_s)
     formula_elements_vals = [element_model(**el_data)
                              for el_data in formula_elements]
+    if element_model is FormulaElement:
+        link_formula_elements(formula_s, formula_elements_vals)
     return formula_elements_vals
 
 
@@ -470,6 +539,7 @@ def process_construction(
     formula_elements = formula_parser(phrase_dict["formula"])
     formula_elements_vals = [FormulaElement(**el_data)
                              for el_data in formula_elements]
+    link_formula_elements(phrase_dict["formula"], formula_elements_vals)
     if verbose:
         print(FormulaElement, formula_elements_vals)
 
@@ -490,6 +560,7 @@ def process_construction(
         variant_formula_elements = formula_parser(variant)
         variant_formula_elements_vals = [FormulaElement(**el_data)
                                          for el_data in variant_formula_elements]
+        link_formula_elements(variant, variant_formula_elements_vals)
         constr_variant.formula_elements.extend(variant_formula_elements_vals)
         construction_variants_vals.append(constr_variant)
 
@@ -502,7 +573,7 @@ def process_construction(
 def process_change(
     phrase_dict: Dict[str, Union[str, int]], change: Change,
     formula_parser: Callable[[str], List[Dict[str, str]]] = parse_formula,
-    year_sep_re = re.compile(r"-‐–—‒―−"),
+    year_sep_re = re.compile(r"[‐–—‒―−]"),
     verbose=False
 ) -> None:
     """Parse stage formula and add it to construction variants"""
@@ -515,6 +586,9 @@ def process_change(
         year = phrase_dict[year_type]
         if isinstance(year, str):
             phrase_dict[year_type] = year_sep_re.sub("-", year)
+            setattr(change, year_type, phrase_dict[year_type])
+    # searched and rendered instead of the strings above
+    change.set_year_ranges()
 
     stage = phrase_dict["stage"]
     main_stage_variant.formula = stage
@@ -702,6 +776,90 @@ def parse(filename: str, use_old_sheet_names=False, verbose=False):
     return data
 
 
+def count_by_construction(conn, column, *where) -> Dict[int, int]:
+    stmt = select(column, func.count()).where(*where).group_by(column)
+    return dict(conn.execute(stmt).all())
+
+
+def refresh_construction_stats(conn) -> None:
+    """Recompute `ConstructionStats` for all constructions"""
+    num_changes = count_by_construction(conn, Change.construction_id)
+    anchor_length = count_by_construction(
+        conn, FormulaElement.construction_id, FormulaElement.is_lexical == True,
+    )
+    num_variants = count_by_construction(conn, ConstructionVariant.construction_id)
+
+    years = conn.execute(
+        select(Change.construction_id, func.min(Change.first_year_lo),
+               func.max(Change.last_year_hi))
+        .group_by(Change.construction_id)
+    )
+    first_attested, last_attested = {}, {}
+    for construction_id, first, last in years:
+        first_attested[construction_id] = first
+        last_attested[construction_id] = last
+
+    rows = []
+    for construction_id in conn.execute(select(Construction.id)).scalars():
+        first = first_attested.get(construction_id)
+        last = last_attested.get(construction_id)
+        rows.append(dict(
+            construction_id=construction_id,
+            num_changes=num_changes.get(construction_id, 0),
+            anchor_length=anchor_length.get(construction_id, 0),
+            first_attested=first,
+            last_attested=last,
+            duration=last - first if None not in (first, last) else None,
+            num_variants=num_variants.get(construction_id, 0),
+        ))
+
+    conn.execute(delete(ConstructionStats))
+    if rows:
+        conn.execute(insert(ConstructionStats), rows)
+
+
+def refresh_change_fts(conn) -> None:
+    """Rebuild the full-text index of change texts"""
+    change2constraints = defaultdict(list)
+    constraints = conn.execute(select(
+        Constraint.change_id, Constraint.syntactic, Constraint.semantic
+    ).where(Constraint.change_id.is_not(None)).order_by(Constraint.id))
+    for change_id, syntactic, semantic in constraints:
+        change2constraints[change_id].extend(
+            text for text in (syntactic, semantic) if text)
+
+    source_rows, rows = [], []
+    changes = conn.execute(select(
+        Change.id, *[getattr(Change, name) for name in CHANGE_FTS_COLUMNS[:-1]]))
+    for change_id, *texts in changes:
+        texts.append("\n".join(change2constraints[change_id]))
+        source_rows.append(dict(zip(CHANGE_FTS_COLUMNS, map(fts_source_text, texts)),
+                                id=change_id))
+        rows.append(dict(zip(CHANGE_FTS_COLUMNS, map(normalize_fts_text, texts)),
+                         rowid=change_id))
+
+    # the index isn't of its content: it's emptied as a whole, not by rows
+    conn.exec_driver_sql(
+        f"INSERT INTO {change_fts.name}({change_fts.name}) VALUES ('delete-all')")
+    conn.execute(delete(change_fts_source))
+    if rows:
+        conn.execute(insert(change_fts_source), source_rows)
+        conn.execute(insert(change_fts), rows)
+    conn.exec_driver_sql(
+        f"INSERT INTO {change_fts.name}({change_fts.name}) VALUES ('optimize')")
+
+
+def refresh_after_import(engine) -> None:
+    """Bring data derived from the imported rows up to date"""
+    with engine.begin() as conn:
+        refresh_construction_stats(conn)
+        refresh_change_fts(conn)
+        # invalidates in-process caches (e.g. `app.search.formula_index`)
+        bump_data_generation(conn)
+        # planner statistics for the indexes
+        conn.exec_driver_sql("ANALYZE")
+
+
 if __name__ == "__main__":
     from ..database_utils import init_db, make_database
 
@@ -709,7 +867,7 @@ if __name__ == "__main__":
         description="Append data from a suitable .xlsx (.README) to"
                     "an (existing) database that is configured for this app")
 
-    parser.add_argument("file", metavar="F", type=str,
+    parser.add_argument("file", metavar="F", type=str, nargs="?",
                         help="an existing database file path")
     parser.add_argument("--database-url", type=str, default=None,
                         help="an optional sqlalchemy uri to use a different database")
@@ -723,6 +881,9 @@ if __name__ == "__main__":
                         help="whether to print values as they are processed")
     parser.add_argument("-q", "--sql-quiet", action="store_true",
                         help="whether to silence SQL console logging")
+    parser.add_argument("-r", "--refresh-only", action="store_true",
+                        help="only recompute derived data (stats, ANALYZE), "
+                             "e.g. after a migration")
     args = parser.parse_args()
 
     kwargs = (dict(sqlalchemy_echo=False, sqlalchemy_echo_pool=False)
@@ -736,6 +897,12 @@ if __name__ == "__main__":
     if args.init:
         init_db(Base, engine)
 
+    if args.refresh_only:
+        refresh_after_import(engine)
+        raise SystemExit(0)
+    if args.file is None:
+        parser.error("the following arguments are required: F")
+
     data = parse(args.file, use_old_sheet_names=args.old, verbose=args.verbose)
     print(len(data))
 
@@ -747,3 +914,5 @@ if __name__ == "__main__":
     # db_session.commit()
 
     print(f"Commit made!")
+
+    refresh_after_import(engine)
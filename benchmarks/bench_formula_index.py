@@ -0,0 +1,71 @@
+"""Formula search: `formula_element` self-joins vs the positional index
+
+Every query is compiled by `SQLQuery` with and without a `FormulaIndex` and
+executed `--repeat` times; the index is built once beforehand (its build time
+is reported separately), as it is in a running app.
+
+    python -m benchmarks.bench_formula_index --database bench.db
+"""
+import argparse
+import contextlib
+import io
+import logging
+import time
+
+from sqlalchemy import create_engine
+
+from app.search.formula_index import FormulaIndex
+from app.search.query_sqlalchemy import default_sqlquery
+
+
+QUERIES = {
+    3: ["ни капли N-Gen", "NP Cop не", "* Cop *"],
+    5: ["Prep N-Dat.Sg не по адресу", "N-Gen.Pl Cop хоть пруд пруди",
+        "хоть куда хоть откуда *"],
+    8: ["NP-Nom не V-Pst ни сном ни духом о",
+        "NP-Nom Cop хоть куда хоть откуда хоть когда",
+        "* не V* ни * ни * *"],
+}
+
+
+def time_query(engine, formula: str, formula_index, repeat: int):
+    """Best time (s) to build and run the query, and the number of constructions"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        query = default_sqlquery(formula_index)
+        query.parse_form({"construction": {"formula": formula}})
+        with engine.connect() as conn:
+            ids = {row.id for row in conn.execute(query.query())}
+        best = min(best, time.perf_counter() - start)
+    return best, len(ids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--database", type=str, required=True,
+                        help="sqlite database file (see `benchmarks.synthetic_db`)")
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    engine = create_engine(f"sqlite:///{args.database}", future=True)
+
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        formula_index = FormulaIndex.from_connection(conn)
+    print(f"index of {len(formula_index)} terms built in "
+          f"{(time.perf_counter() - start) * 1000:.1f} ms")
+
+    print(f"\n{'tokens':>6} {'formula':<45} {'found':>6} {'sql, ms':>9} "
+          f"{'index, ms':>9}")
+    for n_tokens, formulas in QUERIES.items():
+        for formula in formulas:
+            # the query code prints a lot, which would otherwise be measured
+            with contextlib.redirect_stdout(io.StringIO()):
+                sql_time, sql_found = time_query(engine, formula, None, args.repeat)
+                index_time, index_found = time_query(
+                    engine, formula, formula_index, args.repeat)
+            assert sql_found == index_found, (formula, sql_found, index_found)
+            print(f"{n_tokens:>6} {formula:<45} {sql_found:>6} "
+                  f"{sql_time * 1000:>9.1f} {index_time * 1000:>9.1f}")
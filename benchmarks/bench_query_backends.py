@@ -0,0 +1,80 @@
+"""Search latency: `SQLQuery` vs `MemQuery` (the in-memory backend)
+
+Every form is parsed and run by both backends `--repeat` times, the best time
+is reported. The store of `MemQuery` is loaded once beforehand (its load time
+is reported separately), as it is in a running app.
+
+    python -m benchmarks.bench_query_backends --database bench.db
+"""
+import argparse
+import contextlib
+import io
+import logging
+import time
+
+from sqlalchemy import create_engine
+
+from app.search.query_memory import MemStore, default_memquery
+from app.search.query_sqlalchemy import default_sqlquery
+
+
+FORMS = {
+    "formula": {"construction": {"formula": "NP* Cop"}},
+    "formula, skip": {"construction": {"formula": "не * NP*", "skip_optional": True}},
+    "anchor": {"anchor": {"anchor_ru": "хоть*"}},
+    "stats": {"construction": {"num_changes__from": 2, "anchor_length__to": 3}},
+    "changes": {"changes": [{"level": "synt"}, {"type_of_change": "source"}]},
+    "years": {"changes": [{"first_attested__from": 1800, "duration__from": 20}]},
+    "mixed": {"construction": {"formula": "NP*", "anchor_length__from": 2},
+              "changes": [{"level": "synt"}]},
+}
+
+
+def time_sql(engine, form, repeat: int):
+    """Best time (s) to build and run the query, and the constructions found"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        query = default_sqlquery()
+        query.parse_form(form)
+        with engine.connect() as conn:
+            ids = {row.id for row in conn.execute(query.query())}
+        best = min(best, time.perf_counter() - start)
+    return best, ids
+
+
+def time_memory(store, form, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        query = default_memquery(store)
+        query.parse_form(form)
+        ids = set(query.query().tolist())
+        best = min(best, time.perf_counter() - start)
+    return best, ids
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--database", type=str, required=True,
+                        help="sqlite database file (see `benchmarks.synthetic_db`)")
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    engine = create_engine(f"sqlite:///{args.database}", future=True)
+
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        store = MemStore.from_connection(conn)
+    print(f"store loaded in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    print(f"\n{'form':<15} {'found':>6} {'sql, ms':>9} {'memory, ms':>11}")
+    for name, form in FORMS.items():
+        # the query code prints a lot, which would otherwise be measured
+        with contextlib.redirect_stdout(io.StringIO()):
+            sql_time, sql_ids = time_sql(engine, form, args.repeat)
+            memory_time, memory_ids = time_memory(store, form, args.repeat)
+        assert sql_ids == memory_ids, (name, len(sql_ids), len(memory_ids))
+        print(f"{name:<15} {len(sql_ids):>6} {sql_time * 1000:>9.1f} "
+              f"{memory_time * 1000:>11.1f}")
@@ -0,0 +1,101 @@
+"""Requests per second for `/construction/<id>` and `/form` per engine profile
+
+The app is created once per profile and its `engine` is swapped for one made
+by `make_database(..., profile=...)`, so the numbers differ only by engine
+setup. Requests are made from `--threads` threads through the test client.
+
+    python -m benchmarks.bench_serving --database bench.db
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
+import io
+import logging
+import time
+import typing as T
+
+from sqlalchemy import select
+
+from app import create_app
+from app.database_utils import ENGINE_PROFILES, make_database
+from app.models import Construction
+from config import TestConfig
+
+
+FORM_PAYLOADS = [
+    {"construction-formula": "NP*"},
+    {"construction-formula": "не *", "changes-0-level": "synt"},
+    {"anchor-anchor_length__from": "2", "changes-0-duration__from": "10"},
+]
+
+
+def run_requests(
+    make_request: T.Callable[[T.Any, int], T.Any], app, n_requests: int,
+    n_threads: int
+) -> float:
+    """Make `n_requests` from `n_threads` threads, return requests per second"""
+    def worker(thread_i: int):
+        client = app.test_client()
+        for i in range(thread_i, n_requests, n_threads):
+            response = make_request(client, i)
+            assert response.status_code < 400, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(n_threads) as pool:
+        list(pool.map(worker, range(n_threads)))
+    elapsed = time.perf_counter() - start
+
+    return n_requests / elapsed
+
+
+def bench_profile(database: str, profile: str, n_requests: int, n_threads: int):
+    engine, db_session, _ = make_database(
+        f"sqlite:///{database}", sqlalchemy_echo=False, profile=profile)
+
+    app = create_app(test_config_obj=TestConfig)
+    app.config["WTF_CSRF_ENABLED"] = False
+    app.engine = engine
+
+    with engine.connect() as conn:
+        ids = conn.execute(select(Construction.id)).scalars().all()
+
+    def get_construction(client, i):
+        return client.get(f"/construction/{ids[i % len(ids)]}/")
+
+    def post_form(client, i):
+        return client.post("/form", data=FORM_PAYLOADS[i % len(FORM_PAYLOADS)])
+
+    results = {}
+    for name, make_request in [("/construction/<id>", get_construction),
+                               ("/form", post_form)]:
+        # warm up, as a long running server would be
+        run_requests(make_request, app, n_threads, n_threads)
+        results[name] = run_requests(make_request, app, n_requests, n_threads)
+
+    engine.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--database", type=str, required=True,
+                        help="sqlite database file (see `benchmarks.synthetic_db`)")
+    parser.add_argument("--profiles", nargs="+", default=list(ENGINE_PROFILES))
+    parser.add_argument("-n", "--n-requests", type=int, default=400)
+    parser.add_argument("-t", "--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    # the views print a lot, which would otherwise be most of what is measured
+    with contextlib.redirect_stdout(io.StringIO()):
+        profile2results = {
+            profile: bench_profile(args.database, profile, args.n_requests,
+                                   args.threads)
+            for profile in args.profiles
+        }
+
+    print(f"\n{'profile':<10} {'endpoint':<20} {'req/s':>8}")
+    for profile, results in profile2results.items():
+        for endpoint, rps in results.items():
+            print(f"{profile:<10} {endpoint:<20} {rps:>8.1f}")
@@ -0,0 +1,88 @@
+"""Statement building and compilation on repeated searches by `SQLQuery`
+
+Every form comes in two variants of the same shape (different values). The
+first variant is searched on a fresh engine, then the second one: the two
+share a compiled statement through SQLAlchemy's compiled cache. Searches
+with the cache turned off (`compiled_cache=None`) give the time to compile.
+Best of `--repeat` times is reported.
+
+    python -m benchmarks.bench_statement_cache --database bench.db
+"""
+import argparse
+import contextlib
+import io
+import logging
+import time
+
+from sqlalchemy import create_engine
+
+from app.metrics import metrics
+from app.search.query_sqlalchemy import default_sqlquery
+
+
+# name: the same shape with other values
+FORMS = {
+    "formula": ({"construction": {"formula": "NP* Cop"}},
+                {"construction": {"formula": "VP* Adv"}}),
+    "formula, skip": ({"construction": {"formula": "не * NP*", "skip_optional": True}},
+                      {"construction": {"formula": "да * VP*", "skip_optional": True}}),
+    "anchor": ({"anchor": {"anchor_ru": "хоть*"}}, {"anchor": {"anchor_ru": "даже*"}}),
+    "stats": ({"construction": {"num_changes__from": 2, "anchor_length__to": 3}},
+              {"construction": {"num_changes__from": 1, "anchor_length__to": 5}}),
+    "changes": ({"changes": [{"level": "synt"}, {"type_of_change": "source"}]},
+                {"changes": [{"level": "morph"}, {"type_of_change": "target"}]}),
+    "years": ({"changes": [{"first_attested__from": 1800, "duration__from": 20}]},
+              {"changes": [{"first_attested__from": 1700, "duration__from": 50}]}),
+}
+
+
+def build(form):
+    query = default_sqlquery()
+    query.parse_form(form)
+    return query.query()
+
+
+def time_build(form, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        build(form)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def time_execute(engine, stmt, repeat: int, **execution_options) -> float:
+    best = float("inf")
+    with engine.connect() as conn:
+        conn = conn.execution_options(**execution_options)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(stmt).all()
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--database", type=str, required=True,
+                        help="sqlite database file (see `benchmarks.synthetic_db`)")
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    engine = create_engine(f"sqlite:///{args.database}", future=True)
+
+    print(f"{'form':<15} {'build, ms':>10} {'first, ms':>10} {'other values, ms':>17} "
+          f"{'uncached, ms':>13}")
+    for name, (form, other_form) in FORMS.items():
+        # the query code prints a lot, which would otherwise be measured
+        with contextlib.redirect_stdout(io.StringIO()):
+            build_time = time_build(other_form, args.repeat)
+            first_time = time_execute(engine, build(form), 1)
+            metrics.reset()
+            other_time = time_execute(engine, build(other_form), args.repeat)
+            uncached_time = time_execute(engine, build(other_form), args.repeat,
+                                         compiled_cache=None)
+        assert metrics.get("sql_compiled_cache.misses") == 0, name
+        print(f"{name:<15} {build_time * 1000:>10.2f} {first_time * 1000:>10.2f} "
+              f"{other_time * 1000:>17.2f} {uncached_time * 1000:>13.2f}")
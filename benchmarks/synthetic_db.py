@@ -0,0 +1,140 @@
+"""Synthetic database with the app schema, filled through the importer code
+
+Formulas are taken from the real constructions and shuffled, so that
+formula search, anchors and attestation years have realistic shapes.
+
+    python -m benchmarks.synthetic_db bench.db -n 2000
+"""
+import argparse
+import random
+import typing as T
+
+from app.database_utils import make_database
+from app.models import (
+    Construction,
+    Change,
+    GeneralInfo,
+)
+from app.update_db.update import (
+    process_construction,
+    process_change,
+)
+
+
+FORMULAS = [
+    "N-Gen.Pl Cop (хоть) пруд пруди",
+    "Prep N-Dat.Sg не по адресу",
+    "в точности PronDem",
+    "NumCrd N с гаком",
+    "NP Cop не что (иное) как NP",
+    "NP-Gen не*густо",
+    "(NP) все до одного (NP-Gen)",
+    "ни капли N-Gen",
+    "ни капли не VP",
+    "(у NP-Gen) руки не доходят (Inf)",
+    "на кой NP-Nom (NP-Dat) сдаться-Pst",
+    "NP-Dat Cop до лампочки (NP-Nom)",
+    "не ахти ((PronInt) NP)",
+    "((N-Nom) Cop) без понятия",
+    "N-Nom знает ((PronInt) (NP))",
+    "Фиг NP-Dat",
+    "(N-Nom) ни рыба ни мясо",
+    "ни стыда ни совести",
+    "V-Pst",
+    "айда VP",
+    "(NP-Nom) не V-Pst ни сном ни духом (о NP-Loc)",
+    "NP-Nom Cop хоть куда хоть откуда хоть когда",
+    "Cop без царя в голове",
+    "NP XP ни-ни!",
+    "не то чтобы XP ((CCONJ) XP)",
+]
+MEANINGS = ["Minimizer", "Causation", "Quantity", "Evaluation", "Negation"]
+SYNT_FUNCTIONS = ["Praedicative Expression", "Modifier", "Subject", "Argument"]
+LEVELS = ["synt", "sem"]
+TYPES_OF_CHANGE = ["source", "expansion", "reduction", "substitution"]
+COMMENTS = [None, "ещё встречается в прессе", "частотность растёт",
+            "в основном в разговорной речи", "данные корпуса неполны"]
+YEAR_FORMATS = ["{start}", "{start}-{end}", "{decade}-ые"]
+
+
+def make_year(rng: random.Random, start: int) -> T.Union[int, str]:
+    fmt = rng.choice(YEAR_FORMATS)
+    if fmt == "{start}":
+        return start
+    return fmt.format(start=start, end=start + rng.randint(1, 20),
+                      decade=start // 10 * 10)
+
+
+def make_constructions(
+    n_constructions: int, max_changes: int = 6, seed: int = 0
+) -> T.List[T.Union[Construction, GeneralInfo]]:
+    rng = random.Random(seed)
+    data = []
+    change_id = 1
+
+    for construction_id in range(1, n_constructions + 1):
+        formula = rng.choice(FORMULAS)
+        if rng.random() < 0.5:
+            # reshuffle lexical parts so that formulas are not all the same
+            words = formula.split()
+            rng.shuffle(words)
+            formula = " ".join(words).replace(")", "").replace("(", "")
+
+        phrase_dict = dict(
+            id=construction_id, formula=formula, variation=None,
+            contemporary_meaning=rng.choice(MEANINGS),
+            synt_function_of_anchor=rng.choice(SYNT_FUNCTIONS),
+            in_rus_constructicon=rng.random() < 0.5,
+            anchor_ru=" ".join(w for w in formula.split() if w >= "А"),
+        )
+        constr = Construction(**phrase_dict)
+        process_construction(phrase_dict, constr)
+        data.append(constr)
+        data.append(GeneralInfo(construction_id=construction_id,
+                                name=f"{formula} #{construction_id}",
+                                status="ready"))
+
+        year = rng.randint(1700, 1950)
+        for _ in range(rng.randint(1, max_changes)):
+            last_year = year + rng.randint(0, 60)
+            phrase_dict = dict(
+                id=change_id, construction_id=construction_id,
+                stage=rng.choice(FORMULAS), level=rng.choice(LEVELS),
+                type_of_change=rng.choice(TYPES_OF_CHANGE),
+                first_attested=make_year(rng, year),
+                last_attested=make_year(rng, last_year),
+                first_example=f"и **{formula}** тогда",
+                last_example=f"уже **{formula}** потом",
+                comment=rng.choice(COMMENTS),
+                morphosyntags=None, semantags=None,
+            )
+            change = Change(**phrase_dict)
+            process_change(phrase_dict, change)
+            constr.changes.append(change)
+
+            change_id += 1
+            year = last_year
+
+    return data
+
+
+def make_synthetic_database(sqlalchemy_uri: str, n_constructions: int = 500,
+                            seed: int = 0):
+    engine, db_session, Base = make_database(
+        sqlalchemy_uri, sqlalchemy_echo=False, do_init=True)
+    db_session.add_all(make_constructions(n_constructions, seed=seed))
+    db_session.commit()
+    db_session.remove()
+
+    return engine
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("file", type=str, help="database file to create")
+    parser.add_argument("-n", "--n-constructions", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    make_synthetic_database(f"sqlite:///{args.file}", args.n_constructions,
+                            seed=args.seed)
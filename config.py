@@ -10,11 +10,40 @@ class Config(object):
 
     # DATABASE = os.path.join(app.instance_path, 'app.sqlite')
     SQLALCHEMY_DATABASE_URI_TEMPLATE = 'sqlite:///' + basedir + '{}'
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'diachronicon.db')
+    SQLALCHEMY_DATABASE_URI = (os.environ.get('SQLALCHEMY_DATABASE_URI')
+                               or 'sqlite:///' + os.path.join(basedir, 'diachronicon.db'))
     # sqlalchemy_echo = os.environ.get('SQLA_ECHO')
     # SQLALCHEMY_ECHO = bool(int(os.environ.get('SQLA_ECHO') or 0)) or 'debug'
     SQLALCHEMY_ECHO = os.environ.get('SQLALCHEMY_ECHO') == 'debug' or False
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # one of `app.database_utils.ENGINE_PROFILES`: "default" (read-write)
+    # or "serving" (read-only file, WAL, mmap, bigger cache, pooled connections)
+    SQLALCHEMY_ENGINE_PROFILE = os.environ.get('SQLALCHEMY_ENGINE_PROFILE') or 'default'
+    # how construction formulas are searched: "sql" (`formula_element` joins)
+    # or "index" (in-memory positional index, `app.search.formula_index`)
+    FORMULA_SEARCH_BACKEND = os.environ.get('FORMULA_SEARCH_BACKEND') or 'sql'
+    # what evaluates `/form` searches: "sql" (`SQLQuery`) or "memory" (`MemQuery`
+    # on tables loaded into memory, `app.search.query_memory`), full-text
+    # searches are made by SQL either way
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND') or 'sql'
+    # `/form` results cached (`app.search.result_cache`): at most this many
+    # rows in all, each entry for at most this many seconds; 0 rows disables it
+    SEARCH_CACHE_MAX_ROWS = int(os.environ.get('SEARCH_CACHE_MAX_ROWS') or 20000)
+    SEARCH_CACHE_TTL = float(os.environ.get('SEARCH_CACHE_TTL') or 600)
+    # constructions on a page of `/form` results, by default and at most
+    SEARCH_PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE') or 50)
+    SEARCH_MAX_PAGE_SIZE = int(os.environ.get('SEARCH_MAX_PAGE_SIZE') or 500)
+    # statements of a search (`app.query_guard`) are interrupted after this
+    # many SQLite VM steps or seconds in all (0 is no limit), or when the
+    # client goes away; streamed results are cut at the steps limit only
+    SEARCH_QUERY_MAX_STEPS = int(os.environ.get('SEARCH_QUERY_MAX_STEPS') or 200_000_000)
+    SEARCH_QUERY_MAX_SECONDS = float(os.environ.get('SEARCH_QUERY_MAX_SECONDS') or 10)
+    # `/api/search/explain` (SQL, query plans and timings of searches) outside
+    # of debug mode
+    SEARCH_EXPLAIN_ENABLED = bool(os.environ.get('SEARCH_EXPLAIN_ENABLED'))
+    # values suggested by the search forms (`app.search.vocabulary`) from this
+    # JSON file instead of the database
+    VOCABULARY_PATH = os.environ.get('VOCABULARY_PATH') or None
 
     JINJA_OPTIONS = {
         # "extensions": ["jinja2.ext.autoescape", "jinja2.ext.with_"],
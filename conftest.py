@@ -0,0 +1,20 @@
+"""Test runs write their database and logs to a temporary directory
+
+Set before `config` is imported; a database or log file given in the
+environment is kept."""
+import os
+import tempfile
+
+
+_tmp_dir = tempfile.mkdtemp(prefix="diachronicon-tests-")
+os.environ.setdefault(
+    "SQLALCHEMY_DATABASE_URI", "sqlite:///" + os.path.join(_tmp_dir, "diachronicon.db"))
+os.environ.setdefault("FLASK_LOGGING_FILE", os.path.join(_tmp_dir, "logs", "test.log"))
+
+
+def pytest_configure(config):
+    # an empty database of the current schema, as the app's pages expect
+    from app.database import engine
+    from app.models import Base
+
+    Base.metadata.create_all(bind=engine)
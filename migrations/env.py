@@ -4,6 +4,7 @@ import logging
 from logging.config import fileConfig
 
 from flask import current_app
+from sqlalchemy import create_engine
 
 from alembic import context
 
@@ -20,11 +21,27 @@ logger = logging.getLogger('alembic.env')
 # for 'autogenerate' support
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
-config.set_main_option(
-    'sqlalchemy.url',
-    str(current_app.extensions['migrate'].db.get_engine().url).replace(
-        '%', '%%'))
-target_metadata = current_app.extensions['migrate'].db.metadata
+try:
+    migrate = current_app.extensions['migrate']
+except (RuntimeError, KeyError):
+    # no Flask-Migrate (or no app context): use the app models and config
+    migrate = None
+
+if migrate is not None:
+    config.set_main_option(
+        'sqlalchemy.url',
+        str(migrate.db.get_engine().url).replace('%', '%%'))
+    target_metadata = migrate.db.metadata
+else:
+    from app.models import Base
+    from config import Config
+
+    # `alembic -x sqlalchemy.url=sqlite:///other.db ...` for another database
+    url = (context.get_x_argument(as_dictionary=True).get('sqlalchemy.url')
+           or config.get_main_option('sqlalchemy.url')
+           or Config.SQLALCHEMY_DATABASE_URI)
+    config.set_main_option('sqlalchemy.url', url.replace('%', '%%'))
+    target_metadata = Base.metadata
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
@@ -32,6 +49,18 @@ target_metadata = current_app.extensions['migrate'].db.metadata
 # ... etc.
 
 
+# virtual FTS5 tables (and their shadow tables) are created by DDL, not metadata
+UNMANAGED_TABLE_PREFIXES = ("sqlite_", "change_fts")
+# trigram indexes (`app.models.TRIGRAM_COLUMNS`) and their FTS5 shadow tables
+UNMANAGED_TABLE_INFIX = "_trigram"
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Leave out tables sqlite manages itself (like `sqlite_stat1` of ANALYZE)"""
+    return not (type_ == "table" and (name.startswith(UNMANAGED_TABLE_PREFIXES)
+                                      or UNMANAGED_TABLE_INFIX in name))
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -46,7 +75,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=target_metadata, literal_binds=True
+        url=url, target_metadata=target_metadata, literal_binds=True,
+        render_as_batch=True, include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -71,14 +101,21 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
-    connectable = current_app.extensions['migrate'].db.get_engine()
+    if migrate is not None:
+        connectable = migrate.db.get_engine()
+        configure_args = migrate.configure_args
+    else:
+        connectable = create_engine(config.get_main_option('sqlalchemy.url'))
+        # sqlite can't alter most things in place
+        configure_args = dict(render_as_batch=True)
 
     with connectable.connect() as connection:
         context.configure(
             connection=connection,
             target_metadata=target_metadata,
             process_revision_directives=process_revision_directives,
-            **current_app.extensions['migrate'].configure_args
+            include_object=include_object,
+            **configure_args
         )
 
         with context.begin_transaction():
@@ -0,0 +1,31 @@
+"""change_fts: FTS5 index over texts of changes and their constraints
+
+The index is filled by the importer, after upgrading run
+
+    python -m app.update_db.update --refresh-only
+
+Revision ID: 0b5d3e8a6f14
+Revises: f2a61c0d9e57
+Create Date: 2026-10-18 16:24:53.207715
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0b5d3e8a6f14'
+down_revision = 'f2a61c0d9e57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS change_fts USING fts5("
+        "first_example, last_example, comment, sources, frequency_trend, "
+        "constraints, tokenize='unicode61 remove_diacritics 2')"
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS change_fts")
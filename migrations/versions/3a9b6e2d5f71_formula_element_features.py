@@ -0,0 +1,62 @@
+"""formula_element: pos, case, number and is_lexical parsed from value
+
+Anchor length (`construction_stats`) is now a count of lexical elements,
+after upgrading run
+
+    python -m app.update_db.update --refresh-only
+
+Revision ID: 3a9b6e2d5f71
+Revises: b7e3c05f9a82
+Create Date: 2026-10-18 19:48:06.273915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.models import FormulaElement
+
+
+# revision identifiers, used by Alembic.
+revision = '3a9b6e2d5f71'
+down_revision = 'b7e3c05f9a82'
+branch_labels = None
+depends_on = None
+
+
+FEATURE_COLUMNS = [
+    ('pos', sa.String(length=20)),
+    ('case', sa.String(length=10)),
+    ('number', sa.String(length=10)),
+    ('is_lexical', sa.Boolean()),
+]
+
+
+def upgrade():
+    with op.batch_alter_table('formula_element', schema=None) as batch_op:
+        for name, type_ in FEATURE_COLUMNS:
+            batch_op.add_column(sa.Column(name, type_, nullable=True))
+
+    element = sa.table('formula_element', sa.column('id'), sa.column('value'),
+                       *[sa.column(name) for name, _ in FEATURE_COLUMNS])
+    conn = op.get_bind()
+    rows = conn.execute(sa.select(element.c.id, element.c.value)).all()
+    for element_id, value in rows:
+        conn.execute(
+            element.update().where(element.c.id == element_id)
+            .values(FormulaElement.parse_features(value))
+        )
+
+    op.create_index('ix_formula_element_pos_case_number', 'formula_element',
+                    ['pos', 'case', 'number'], unique=False)
+    op.create_index('ix_formula_element_construction_id_is_lexical',
+                    'formula_element', ['construction_id', 'is_lexical'],
+                    unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_formula_element_construction_id_is_lexical',
+                  table_name='formula_element')
+    op.drop_index('ix_formula_element_pos_case_number', table_name='formula_element')
+    with op.batch_alter_table('formula_element', schema=None) as batch_op:
+        for name, _ in reversed(FEATURE_COLUMNS):
+            batch_op.drop_column(name)
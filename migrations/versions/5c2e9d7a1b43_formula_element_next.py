@@ -0,0 +1,158 @@
+"""formula_element_next: elements that may follow an element, optional spans skipped
+
+Links of existing formulas are made from the formula of each element's
+variant (`construction_variant.formula`), or else of its construction or
+change stage; elements of formulas edited after the import are linked to
+the next element only (re-import to fix).
+
+Revision ID: 5c2e9d7a1b43
+Revises: 0b5d3e8a6f14
+Create Date: 2026-10-18 17:02:11.384519
+
+"""
+from collections import defaultdict
+import itertools
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c2e9d7a1b43'
+down_revision = '0b5d3e8a6f14'
+branch_labels = None
+depends_on = None
+
+
+# `tokenize_formula` and `formula_adjacency` of `app.update_db.update` as of
+# this revision, frozen so that later changes to the importer don't change it
+class EOF(object): ...
+
+
+ELEMS_SEP, SPAN_START, SPAN_END = " ", "(", ")"
+VARIANTS_SEPS = ("/", "|")
+
+
+def tokenize_formula(formula):
+    special = [ELEMS_SEP, SPAN_START, SPAN_END, *VARIANTS_SEPS, EOF]
+    parts = cur_part = []
+    queue = [parts]
+    formula_it = iter(formula)
+
+    while True:
+        symbol = next(formula_it, EOF)
+        if symbol not in special:
+            chars = [symbol]
+            for symbol in itertools.chain(formula_it, [EOF]):
+                if symbol in special:
+                    break
+                chars.append(symbol)
+            cur_part.append({"val": "".join(chars)})
+
+        if symbol == SPAN_START:
+            cur_part = []
+            queue.append(cur_part)
+        elif symbol == SPAN_END:
+            span = {"type": "maybe_span", "val": queue.pop()}
+            cur_part = queue[-1]
+            cur_part.append(span)
+        elif symbol is EOF:
+            break
+
+    return parts
+
+
+def formula_adjacency(formula):
+    """Orders of elements that may follow each element if spans are skipped"""
+    orders = itertools.count()
+
+    def number(tokens):
+        items = []
+        for token in tokens:
+            if token.get("type") != "maybe_span":
+                items.append(("element", next(orders)))
+            elif len(token["val"]) == 1:
+                items.append(("span", [("element", next(orders))]))
+            else:
+                items.append(("span", number(token["val"])))
+        return items
+
+    order2next = {}
+
+    def follow(items, after):
+        next_orders = after
+        for kind, item in reversed(items):
+            if kind == "element":
+                order2next[item] = next_orders
+                next_orders = {item}
+            else:
+                next_orders = follow(item, next_orders) | next_orders
+        return next_orders
+
+    follow(number(tokenize_formula(formula)), set())
+    return order2next
+
+
+def upgrade():
+    formula_element_next = op.create_table('formula_element_next',
+    sa.Column('element_id', sa.Integer(), nullable=False),
+    sa.Column('next_element_id', sa.Integer(), nullable=False),
+    sa.Column('next_value', sa.String(length=100), nullable=True),
+    sa.Column('skips_optional', sa.Boolean(), nullable=True),
+    sa.ForeignKeyConstraint(['element_id'], ['formula_element.id'], ),
+    sa.ForeignKeyConstraint(['next_element_id'], ['formula_element.id'], ),
+    sa.PrimaryKeyConstraint('element_id', 'next_element_id'),
+    sqlite_with_rowid=False,
+    )
+
+    element = sa.table('formula_element', sa.column('id'), sa.column('value'),
+                       sa.column('order'), sa.column('construction_id'),
+                       sa.column('construction_variant_id'))
+    construction = sa.table('construction', sa.column('id'), sa.column('formula'))
+    variant = sa.table('construction_variant', sa.column('id'),
+                       sa.column('formula'), sa.column('change_id'))
+    change = sa.table('change', sa.column('id'), sa.column('stage'))
+
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.select(element.c.id, element.c.value, element.c.order,
+                  element.c.construction_variant_id, variant.c.formula,
+                  construction.c.formula, change.c.stage)
+        .outerjoin(construction, element.c.construction_id == construction.c.id)
+        .outerjoin(variant, element.c.construction_variant_id == variant.c.id)
+        .outerjoin(change, variant.c.change_id == change.c.id)
+    ).all()
+
+    variant2elements = defaultdict(dict)
+    variant2formula = {}
+    for (element_id, value, order, variant_id, variant_formula,
+         construction_formula, stage) in rows:
+        variant2elements[variant_id][order] = (element_id, value)
+        # main variants of constructions have no formula of their own
+        variant2formula[variant_id] = variant_formula or construction_formula or stage
+
+    links = []
+    for variant_id, order2element in variant2elements.items():
+        formula = variant2formula[variant_id]
+        order2next = formula_adjacency(formula) if formula else {}
+        if set(order2next) != set(order2element):
+            # the formula is unknown or was edited after the import
+            order2next = {order: {order + 1} for order in order2element}
+
+        for order, next_orders in order2next.items():
+            for next_order in next_orders:
+                if next_order not in order2element:
+                    continue
+                next_element_id, next_value = order2element[next_order]
+                links.append(dict(
+                    element_id=order2element[order][0],
+                    next_element_id=next_element_id, next_value=next_value,
+                    skips_optional=next_order != order + 1,
+                ))
+
+    if links:
+        op.bulk_insert(formula_element_next, links)
+
+
+def downgrade():
+    op.drop_table('formula_element_next')
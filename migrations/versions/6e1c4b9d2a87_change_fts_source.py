@@ -0,0 +1,44 @@
+"""change_fts: content of the index in change_fts_source, snippets of the texts as they are
+
+The index is of normalized texts (ё as е), snippets were made of them.
+It is refilled by the importer, after upgrading run
+
+    python -m app.update_db.update --refresh-only
+
+Revision ID: 6e1c4b9d2a87
+Revises: 3a9b6e2d5f71
+Create Date: 2026-10-18 21:12:40.518236
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '6e1c4b9d2a87'
+down_revision = '3a9b6e2d5f71'
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = ("first_example, last_example, comment, sources, frequency_trend, "
+           "constraints")
+
+
+def upgrade():
+    op.execute("DROP TABLE IF EXISTS change_fts")
+    op.execute(f"CREATE TABLE IF NOT EXISTS change_fts_source("
+               f"id INTEGER PRIMARY KEY, {COLUMNS})")
+    op.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS change_fts USING fts5({COLUMNS}, "
+        "content='change_fts_source', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')"
+    )
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS change_fts")
+    op.execute("DROP TABLE IF EXISTS change_fts_source")
+    op.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS change_fts USING fts5({COLUMNS}, "
+        "tokenize='unicode61 remove_diacritics 2')"
+    )
@@ -0,0 +1,84 @@
+"""normalized (casefolded, ё as е) copies of searched text columns
+
+SQLite's `LIKE` only folds the case of ASCII; search goes by these copies
+and their indexes instead. `formula_element_next.next_value` becomes a copy
+of `formula_element.value_norm`.
+
+Revision ID: 8d4f1a6c3e20
+Revises: 5c2e9d7a1b43
+Create Date: 2026-10-18 18:11:45.602137
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.models import normalize_search_text
+
+
+# revision identifiers, used by Alembic.
+revision = '8d4f1a6c3e20'
+down_revision = '5c2e9d7a1b43'
+branch_labels = None
+depends_on = None
+
+
+# table, key column, normalized column, length
+NORMALIZED_COLUMNS = [
+    ('general_info', 'construction_id', 'name', 200),
+    ('construction', 'id', 'contemporary_meaning', 200),
+    ('construction', 'id', 'anchor_ru', 200),
+    ('formula_element', 'id', 'value', 100),
+]
+
+
+def upgrade():
+    conn = op.get_bind()
+    for table_name, key, column, length in NORMALIZED_COLUMNS:
+        norm_column = f'{column}_norm'
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            batch_op.add_column(sa.Column(norm_column, sa.String(length=length),
+                                          nullable=True))
+
+        table = sa.table(table_name, sa.column(key), sa.column(column),
+                         sa.column(norm_column))
+        rows = conn.execute(sa.select(table.c[key], table.c[column])).all()
+        for key_value, value in rows:
+            conn.execute(
+                table.update().where(table.c[key] == key_value)
+                .values({norm_column: normalize_search_text(value)})
+            )
+        op.create_index(f'ix_{table_name}_{norm_column}', table_name,
+                        [norm_column], unique=False)
+
+    op.drop_index('ix_formula_element_construction_id_order_value',
+                  table_name='formula_element')
+    op.create_index('ix_formula_element_construction_id_order_value_norm',
+                    'formula_element', ['construction_id', 'order', 'value_norm'],
+                    unique=False)
+
+    op.execute(
+        'UPDATE formula_element_next SET next_value = ('
+        'SELECT value_norm FROM formula_element '
+        'WHERE formula_element.id = formula_element_next.next_element_id)'
+    )
+    op.execute('ANALYZE')
+
+
+def downgrade():
+    op.execute(
+        'UPDATE formula_element_next SET next_value = ('
+        'SELECT value FROM formula_element '
+        'WHERE formula_element.id = formula_element_next.next_element_id)'
+    )
+
+    op.drop_index('ix_formula_element_construction_id_order_value_norm',
+                  table_name='formula_element')
+    op.create_index('ix_formula_element_construction_id_order_value',
+                    'formula_element', ['construction_id', 'order', 'value'],
+                    unique=False)
+
+    for table_name, key, column, length in reversed(NORMALIZED_COLUMNS):
+        norm_column = f'{column}_norm'
+        op.drop_index(f'ix_{table_name}_{norm_column}', table_name=table_name)
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            batch_op.drop_column(norm_column)
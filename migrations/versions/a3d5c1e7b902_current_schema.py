@@ -0,0 +1,166 @@
+"""current schema: constructions, changes, formula elements, tags
+
+Replaces the unrelated `phrase` table of the first revision with the tables
+of `app.models` as they were before any performance work. A database made
+earlier by `init_db` already has them, so mark it with
+`alembic -c migrations/alembic.ini stamp a3d5c1e7b902` instead of upgrading.
+
+Revision ID: a3d5c1e7b902
+Revises: f9f6e68d08c8
+Create Date: 2026-10-18 13:05:12.104877
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d5c1e7b902'
+down_revision = 'f9f6e68d08c8'
+branch_labels = None
+depends_on = None
+
+
+SYNT_FUNCTION_OF_ANCHOR_VALUES = (
+    "<unknown>", "Argument", "Coordinator", "Discourse Particle", "Government",
+    "Matrix Predicate", "Modifier", "Nominal Quantifier", "Object",
+    "Parenthetical", "Praedicative Expression", "Subject", "Subordinator",
+    "Verb Predicate", "Word-Formation",
+)
+
+
+def upgrade():
+    op.drop_table('phrase')
+
+    op.create_table('construction',
+    sa.Column('orig_id', sa.String(length=30), nullable=True),
+    sa.Column('contemporary_meaning', sa.String(length=200), nullable=True),
+    sa.Column('variation', sa.String(length=400), nullable=True),
+    sa.Column('in_rus_constructicon', sa.Boolean(), nullable=True),
+    sa.Column('rus_constructicon_id', sa.Integer(), nullable=True),
+    sa.Column('synt_function_of_anchor', sa.Enum(
+        *SYNT_FUNCTION_OF_ANCHOR_VALUES, name='synt_function_of_anchor',
+        create_constraint=True), nullable=True),
+    sa.Column('anchor_schema', sa.String(length=200), nullable=True),
+    sa.Column('anchor_ru', sa.String(length=200), nullable=True),
+    sa.Column('anchor_eng', sa.String(length=200), nullable=True),
+    sa.Column('morphosyntags', sa.String(length=200), nullable=True),
+    sa.Column('semantags', sa.String(length=200), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('formula', sa.String(length=200), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('tag',
+    sa.Column('kind', sa.Enum('sem', 'synt', name='tag_kind',
+                              create_constraint=True), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('change',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('construction_id', sa.Integer(), nullable=True),
+    sa.Column('stage', sa.String(length=200), nullable=True),
+    sa.Column('former_change', sa.String(length=50), nullable=True),
+    sa.Column('level', sa.String(length=10), nullable=True),
+    sa.Column('type_of_change', sa.String(length=50), nullable=True),
+    sa.Column('subtype_of_change', sa.String(length=100), nullable=True),
+    sa.Column('morphosyntags', sa.String(length=200), nullable=True),
+    sa.Column('semantags', sa.String(length=200), nullable=True),
+    sa.Column('first_attested', sa.Integer(), nullable=True),
+    sa.Column('last_attested', sa.Integer(), nullable=True),
+    sa.Column('first_example', sa.String(length=500), nullable=True),
+    sa.Column('last_example', sa.String(length=500), nullable=True),
+    sa.Column('comment', sa.String(length=500), nullable=True),
+    sa.Column('frequency_trend', sa.String(length=400), nullable=True),
+    sa.Column('sources', sa.String(length=500), nullable=True),
+    sa.ForeignKeyConstraint(['construction_id'], ['construction.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('construction_to_tags',
+    sa.Column('construction_id', sa.Integer(), nullable=False),
+    sa.Column('tag_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['construction_id'], ['construction.id'], ),
+    sa.ForeignKeyConstraint(['tag_id'], ['tag.id'], ),
+    sa.PrimaryKeyConstraint('construction_id', 'tag_id')
+    )
+    op.create_table('general_info',
+    sa.Column('construction_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=200), nullable=True),
+    sa.Column('supervisor', sa.String(length=60), nullable=True),
+    sa.Column('author_name', sa.String(length=60), nullable=True),
+    sa.Column('author_surname', sa.String(length=60), nullable=True),
+    sa.Column('group_number', sa.Integer(), nullable=True),
+    sa.Column('annotated_sample', sa.String(length=200), nullable=True),
+    sa.Column('term_paper', sa.String(length=200), nullable=True),
+    sa.Column('status', sa.String(length=30), nullable=True),
+    sa.ForeignKeyConstraint(['construction_id'], ['construction.id'], ),
+    sa.PrimaryKeyConstraint('construction_id')
+    )
+    op.create_table('change_to_previous_changes',
+    sa.Column('change_id', sa.Integer(), nullable=False),
+    sa.Column('previous_change_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['change_id'], ['change.id'], ),
+    sa.ForeignKeyConstraint(['previous_change_id'], ['change.id'], ),
+    sa.PrimaryKeyConstraint('change_id', 'previous_change_id')
+    )
+    op.create_table('change_to_tags',
+    sa.Column('change_id', sa.Integer(), nullable=False),
+    sa.Column('tag_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['change_id'], ['change.id'], ),
+    sa.ForeignKeyConstraint(['tag_id'], ['tag.id'], ),
+    sa.PrimaryKeyConstraint('change_id', 'tag_id')
+    )
+    op.create_table('constraint',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('change_id', sa.Integer(), nullable=True),
+    sa.Column('construction_id', sa.Integer(), nullable=True),
+    sa.Column('element', sa.String(length=30), nullable=True),
+    sa.Column('syntactic', sa.String(length=300), nullable=True),
+    sa.Column('semantic', sa.String(length=300), nullable=True),
+    sa.ForeignKeyConstraint(['change_id'], ['change.id'], ),
+    sa.ForeignKeyConstraint(['construction_id'], ['construction.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('construction_variant',
+    sa.Column('construction_id', sa.Integer(), nullable=True),
+    sa.Column('change_id', sa.Integer(), nullable=True),
+    sa.Column('is_main', sa.Boolean(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('formula', sa.String(length=200), nullable=True),
+    sa.ForeignKeyConstraint(['change_id'], ['change.id'], ),
+    sa.ForeignKeyConstraint(['construction_id'], ['construction.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('formula_element',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('formula_id', sa.Integer(), nullable=True),
+    sa.Column('construction_id', sa.Integer(), nullable=True),
+    sa.Column('construction_variant_id', sa.Integer(), nullable=True),
+    sa.Column('value', sa.String(length=100), nullable=True),
+    sa.Column('order', sa.Integer(), nullable=True),
+    sa.Column('depth', sa.Integer(), nullable=True),
+    sa.Column('is_optional', sa.Boolean(), nullable=True),
+    sa.Column('has_variants', sa.Boolean(), nullable=True),
+    sa.ForeignKeyConstraint(['construction_id'], ['construction.id'], ),
+    sa.ForeignKeyConstraint(['construction_variant_id'], ['construction_variant.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('formula_id')
+    )
+
+
+def downgrade():
+    for table in ('formula_element', 'construction_variant', 'constraint',
+                  'change_to_tags', 'change_to_previous_changes', 'general_info',
+                  'construction_to_tags', 'change', 'tag', 'construction'):
+        op.drop_table(table)
+
+    op.create_table('phrase',
+    sa.Column('phrase_id', sa.Integer(), nullable=False),
+    sa.Column('ru', sa.String(length=300), nullable=True),
+    sa.Column('khanty', sa.String(length=300), nullable=True),
+    sa.Column('khanty_cyr', sa.String(length=300), nullable=True),
+    sa.Column('subject', sa.String(length=100), nullable=True),
+    sa.Column('category', sa.String(length=100), nullable=True),
+    sa.PrimaryKeyConstraint('phrase_id')
+    )
@@ -0,0 +1,46 @@
+"""FTS5 trigram indexes of infix-searched text columns, kept by triggers
+
+See `app.models.TRIGRAM_COLUMNS`: construction formula and anchors,
+construction variant formula, general info name.
+
+Revision ID: b7e3c05f9a82
+Revises: 8d4f1a6c3e20
+Create Date: 2026-10-18 19:02:37.118240
+
+"""
+from alembic import op
+
+from app.models import (
+    TRIGRAM_COLUMNS,
+    make_trigram_ddl,
+    trigram_table,
+)
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e3c05f9a82'
+down_revision = '8d4f1a6c3e20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for model, columns in TRIGRAM_COLUMNS.items():
+        for statement in make_trigram_ddl(model):
+            op.execute(statement)
+
+        key = model.__table__.primary_key.columns.keys()[0]
+        texts = ", ".join(f"replace(replace({name}, 'ё', 'е'), 'Ё', 'Е')"
+                          for name in columns)
+        op.execute(
+            f"INSERT INTO {trigram_table(model).name}(rowid, {', '.join(columns)}) "
+            f"SELECT {key}, {texts} FROM {model.__tablename__}"
+        )
+
+
+def downgrade():
+    for model in TRIGRAM_COLUMNS:
+        index = trigram_table(model).name
+        for trigger in ("ai", "ad", "au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {index}_{trigger}")
+        op.execute(f"DROP TABLE IF EXISTS {index}")
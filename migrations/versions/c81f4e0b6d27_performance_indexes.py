@@ -0,0 +1,81 @@
+"""performance indexes, WITHOUT ROWID association tables, ANALYZE
+
+Indexes follow the queries the app actually runs: token search joins
+`formula_element` by (construction_id, order) and filters by value, the
+construction page `selectinload`s changes, variants, constraints, formula
+elements of variants, previous/next changes and tags by foreign key.
+
+Revision ID: c81f4e0b6d27
+Revises: a3d5c1e7b902
+Create Date: 2026-10-18 13:21:40.551302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c81f4e0b6d27'
+down_revision = 'a3d5c1e7b902'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_change_construction_id', 'change', ['construction_id']),
+    ('ix_constraint_change_id', 'constraint', ['change_id']),
+    ('ix_constraint_construction_id', 'constraint', ['construction_id']),
+    ('ix_construction_variant_change_id', 'construction_variant', ['change_id']),
+    ('ix_construction_variant_construction_id', 'construction_variant',
+     ['construction_id']),
+    ('ix_formula_element_construction_id_order_value', 'formula_element',
+     ['construction_id', 'order', 'value']),
+    ('ix_formula_element_construction_variant_id_order', 'formula_element',
+     ['construction_variant_id', 'order']),
+]
+
+# association table, (first key, referenced table), (second key, referenced table)
+ASSOCIATION_TABLES = [
+    ('construction_to_tags', ('construction_id', 'construction'), ('tag_id', 'tag')),
+    ('change_to_tags', ('change_id', 'change'), ('tag_id', 'tag')),
+    ('change_to_previous_changes', ('change_id', 'change'),
+     ('previous_change_id', 'change')),
+]
+
+
+def recreate_association_table(name, first_key, second_key, with_rowid):
+    """Copy the table into one with(out) rowid, index the reverse side"""
+    tmp_name = f'_{name}_tmp'
+    op.create_table(tmp_name,
+    sa.Column(first_key[0], sa.Integer(), nullable=False),
+    sa.Column(second_key[0], sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint([first_key[0]], [f'{first_key[1]}.id'], ),
+    sa.ForeignKeyConstraint([second_key[0]], [f'{second_key[1]}.id'], ),
+    sa.PrimaryKeyConstraint(first_key[0], second_key[0]),
+    sqlite_with_rowid=with_rowid,
+    )
+    op.execute(f'INSERT INTO {tmp_name} SELECT {first_key[0]}, {second_key[0]} '
+               f'FROM {name}')
+    op.drop_table(name)
+    op.rename_table(tmp_name, name)
+
+    if not with_rowid:
+        op.create_index(f'ix_{name}_{second_key[0]}', name, [second_key[0]])
+
+
+def upgrade():
+    for index_name, table, columns in INDEXES:
+        op.create_index(index_name, table, columns)
+
+    for name, first_key, second_key in ASSOCIATION_TABLES:
+        recreate_association_table(name, first_key, second_key, with_rowid=False)
+
+    op.execute('ANALYZE')
+
+
+def downgrade():
+    for name, first_key, second_key in ASSOCIATION_TABLES:
+        recreate_association_table(name, first_key, second_key, with_rowid=True)
+
+    for index_name, table, columns in INDEXES:
+        op.drop_index(index_name, table_name=table)
@@ -0,0 +1,48 @@
+"""construction_stats: per construction aggregates for search filters
+
+The table is filled by the importer, after upgrading run
+
+    python -m app.update_db.update --refresh-only
+
+Revision ID: e4b7a92f1c38
+Revises: c81f4e0b6d27
+Create Date: 2026-10-18 14:02:11.380164
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7a92f1c38'
+down_revision = 'c81f4e0b6d27'
+branch_labels = None
+depends_on = None
+
+
+INDEXED_COLUMNS = ['num_changes', 'anchor_length', 'first_attested',
+                   'last_attested', 'duration']
+
+
+def upgrade():
+    op.create_table('construction_stats',
+    sa.Column('construction_id', sa.Integer(), nullable=False),
+    sa.Column('num_changes', sa.Integer(), nullable=True),
+    sa.Column('anchor_length', sa.Integer(), nullable=True),
+    sa.Column('first_attested', sa.Integer(), nullable=True),
+    sa.Column('last_attested', sa.Integer(), nullable=True),
+    sa.Column('duration', sa.Integer(), nullable=True),
+    sa.Column('num_variants', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['construction_id'], ['construction.id'], ),
+    sa.PrimaryKeyConstraint('construction_id')
+    )
+    for column in INDEXED_COLUMNS:
+        op.create_index(f'ix_construction_stats_{column}', 'construction_stats',
+                        [column])
+
+
+def downgrade():
+    for column in INDEXED_COLUMNS:
+        op.drop_index(f'ix_construction_stats_{column}',
+                      table_name='construction_stats')
+    op.drop_table('construction_stats')
@@ -0,0 +1,51 @@
+"""change: first/last attestation as integer year ranges
+
+Revision ID: f2a61c0d9e57
+Revises: e4b7a92f1c38
+Create Date: 2026-10-18 15:10:27.918402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from app.models import Change
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a61c0d9e57'
+down_revision = 'e4b7a92f1c38'
+branch_labels = None
+depends_on = None
+
+
+YEAR_COLUMNS = ['first_year_lo', 'first_year_hi', 'last_year_lo', 'last_year_hi']
+
+
+def upgrade():
+    with op.batch_alter_table('change', schema=None) as batch_op:
+        for column in YEAR_COLUMNS:
+            batch_op.add_column(sa.Column(column, sa.Integer(), nullable=True))
+            batch_op.create_index(f'ix_change_{column}', [column], unique=False)
+
+    change = sa.table('change', sa.column('id'), sa.column('first_attested'),
+                      sa.column('last_attested'),
+                      *[sa.column(column) for column in YEAR_COLUMNS])
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.select(change.c.id, change.c.first_attested, change.c.last_attested)
+    ).all()
+    for change_id, first_attested, last_attested in rows:
+        first_lo, first_hi = Change.parse_year_range(first_attested)
+        last_lo, last_hi = Change.parse_year_range(last_attested)
+        conn.execute(
+            change.update().where(change.c.id == change_id).values(
+                first_year_lo=first_lo, first_year_hi=first_hi,
+                last_year_lo=last_lo, last_year_hi=last_hi)
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('change', schema=None) as batch_op:
+        for column in YEAR_COLUMNS:
+            batch_op.drop_index(f'ix_change_{column}')
+            batch_op.drop_column(column)